@@ -1,3 +1,349 @@
-from django.test import TestCase
+import asyncio
+import json
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+import guest.views
+from guest.views import cart_marker_key
+from hotelportal.board import serialize_requests
+from hotelportal.menu_cache import get_menu_html, get_menu_tree
+from hotelportal.models import Cart, CartItem, Category, IdempotencyKey, Item, Request, RequestEvent, Stay
+from hotelportal.tests import make_hotel, mute_overview
+from website.models import User
+
+
+class IdempotentSubmitTests(TestCase):
+    """A retried guest submit (same Idempotency-Key) gets the original answer and creates nothing."""
+
+    def setUp(self):
+        self.hotel = make_hotel()
+        self.room = self.hotel.room_set.first()
+        self.dosa = Item.objects.get(hotel=self.hotel, name="Dosa")
+        self.towel = Item.objects.get(hotel=self.hotel, name="Towel")
+        self.base = f"/h/{self.hotel.id}/r/{self.room.id}"
+
+    def _add(self):
+        self.client.post(self.base + "/cart/add/", {"item_id": self.dosa.id, "qty": 2})
+
+    def _submit(self, key):
+        return self.client.post(self.base + "/order/submit/", HTTP_IDEMPOTENCY_KEY=key).json()
+
+    def _service(self, key):
+        return self.client.post(
+            self.base + "/service/request/", {"item_id": self.towel.id}, HTTP_IDEMPOTENCY_KEY=key
+        ).json()
+
+    def _lost_race(self):
+        """First key lookup misses, as when a concurrent retry hasn't committed yet."""
+        real = guest.views._replayed_submit
+        calls = []
+
+        def lookup(hotel, key):
+            calls.append(key)
+            return None if len(calls) == 1 else real(hotel, key)
+
+        return mock.patch.object(guest.views, "_replayed_submit", side_effect=lookup)
+
+    def test_retried_order_is_replayed(self):
+        self._add()
+        first = self._submit("k1")
+        again = self._submit("k1")
+
+        self.assertEqual(again, {"ok": True, "request_id": first["request_id"], "replayed": True})
+        self.assertEqual(Request.objects.count(), 1)
+        self.assertEqual(IdempotencyKey.objects.get(key="k1").replays, 1)
+
+    def test_order_losing_the_race_replays_the_winner(self):
+        self._add()
+        first = self._submit("k1")
+        events = RequestEvent.objects.count()
+        self._add()
+
+        with self._lost_race():
+            again = self._submit("k1")
+
+        self.assertEqual(again, {"ok": True, "request_id": first["request_id"], "replayed": True})
+        self.assertEqual(Request.objects.count(), 1)
+        self.assertEqual(RequestEvent.objects.count(), events)
+        # the loser's transaction rolled back: its cart is still there
+        cart = self.client.get(self.base + "/cart/view/", HTTP_ACCEPT="application/json").json()
+        self.assertEqual(cart["count"], 2)
+
+    def test_service_losing_the_race_replays_the_winner(self):
+        first = self._service("s1")
+        Request.objects.filter(pk=first["request_id"]).update(status="COMPLETED")
+
+        with self._lost_race():
+            again = self._service("s1")
+
+        self.assertEqual(again, {"ok": True, "request_id": first["request_id"], "replayed": True})
+        self.assertEqual(Request.objects.filter(kind="SERVICE").count(), 1)
+
+
+class DraftCartPruneTests(TestCase):
+    """
+    prune_draft_carts only removes carts the guest stopped touching, and
+    their cache markers; a stale marker never hides a cart from a submit.
+    """
+
+    def setUp(self):
+        self.hotel = make_hotel()
+        self.room = self.hotel.room_set.first()
+        self.dosa = Item.objects.get(hotel=self.hotel, name="Dosa")
+        self.base = f"/h/{self.hotel.id}/r/{self.room.id}"
+        self.client.post(self.base + "/cart/add/", {"item_id": self.dosa.id})
+        self.cart = Cart.objects.get(room=self.room)
+
+    def _age(self):
+        Cart.objects.filter(pk=self.cart.pk).update(updated_at=timezone.now() - timedelta(hours=72))
+
+    def _prune(self):
+        call_command("prune_draft_carts", stdout=StringIO())
+
+    def test_add_and_update_keep_the_cart(self):
+        self._age()
+        self.client.post(self.base + "/cart/add/", {"item_id": self.dosa.id})
+        self._prune()
+        self.assertTrue(Cart.objects.filter(pk=self.cart.pk).exists())
+
+        self._age()
+        self.client.post(self.base + "/cart/update/", {"item_id": self.dosa.id, "qty": 5})
+        self._prune()
+        self.assertTrue(Cart.objects.filter(pk=self.cart.pk).exists())
+
+    def test_submit_ignores_a_stale_no_cart_marker(self):
+        # another process's view of this room (LocMem): "no cart"
+        key = cart_marker_key(self.room.id)
+        cache.set(key, 0)
+
+        response = self.client.post(self.base + "/order/submit/").json()
+
+        self.assertTrue(response["ok"])
+        self.assertEqual(Request.objects.get(pk=response["request_id"]).lines.get().item, self.dosa)
+        self.assertFalse(Cart.objects.filter(pk=self.cart.pk).exists())
+
+    def test_abandoned_cart_and_marker_are_removed(self):
+        key = cart_marker_key(self.room.id)
+        self.assertEqual(cache.get(key), self.cart.id)
+        self._age()
+
+        self._prune()
+
+        self.assertFalse(Cart.objects.filter(pk=self.cart.pk).exists())
+        self.assertIsNone(cache.get(key))
+        cart = self.client.get(self.base + "/cart/view/", HTTP_ACCEPT="application/json").json()
+        self.assertEqual(cart["count"], 0)
+
+
+class OrderLinesSummaryTests(TestCase):
+    """A placed order carries the line summary the board used to join from RequestLine."""
+
+    def setUp(self):
+        cache.clear()  # the menu cached for a rolled-back hotel with the same id
+
+    def test_summary_matches_the_request_lines(self):
+        hotel = make_hotel()
+        room = hotel.room_set.first()
+        dosa = Item.objects.get(hotel=hotel, name="Dosa")
+        tea = Item.objects.create(
+            hotel=hotel, category=Category.objects.get(hotel=hotel, kind="FOOD"), name="Tea", price=20
+        )
+        base = f"/h/{hotel.id}/r/{room.id}"
+        self.client.post(base + "/cart/add/", {"item_id": dosa.id, "qty": 2})
+        self.client.post(base + "/cart/add/", {"item_id": tea.id, "qty": 3})
+
+        req = Request.objects.get(pk=self.client.post(base + "/order/submit/").json()["request_id"])
+
+        joined = [{"name": ln.name_snapshot, "qty": ln.qty} for ln in req.lines.order_by("id")]
+        self.assertEqual(joined, [{"name": "Dosa", "qty": 2}, {"name": "Tea", "qty": 3}])
+        self.assertEqual(req.lines_summary, joined)
+        self.assertEqual(req.item_count, 5)
+        self.assertEqual(serialize_requests([req], hotel=hotel)[0]["lines"], joined)
+
+
+class GuestStreamTests(TestCase):
+    """The guest SSE stream: a summary first, then request updates, and it ends at check-out."""
+
+    def setUp(self):
+        mute_overview(self)
+        self.hotel = make_hotel()
+        self.room = self.hotel.room_set.first()
+        self.stay = Stay.objects.create(hotel=self.hotel, room=self.room, guest_name="Asha", phone="99")
+        self.towel = Request.objects.create(
+            hotel=self.hotel, room=self.room, stay=self.stay, kind="SERVICE",
+            service_item=Item.objects.get(hotel=self.hotel, name="Towel"),
+        )
+        self.staff = Client()
+        self.staff.force_login(User.objects.get(username=f"staff-{self.hotel.id}"))
+        self.url = f"/h/{self.hotel.id}/r/{self.room.id}/stream/"
+
+    def _staff_post(self, name, data, args=()):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.staff.post(reverse(name, args=args), data).json()
+
+    async def _next(self, frames):
+        frame = (await asyncio.wait_for(anext(frames), 5)).decode()
+        return json.loads(frame.removeprefix("data: ")) if frame.startswith("data: ") else frame
+
+    async def test_summary_update_then_end_at_checkout(self):
+        self.async_client.cookies["s2s_phone"] = "99"
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        frames = aiter(response.streaming_content)
+
+        self.assertTrue((await self._next(frames)).startswith("retry: "))
+        summary = await self._next(frames)
+        self.assertEqual(summary["type"], "summary")
+        self.assertEqual([r["request_id"] for r in summary["services"]], [self.towel.id])
+
+        await sync_to_async(self._staff_post)("live_action", {"action": "accept"}, [self.towel.id])
+        update = await self._next(frames)
+        self.assertEqual(update["type"], "request_update")
+        self.assertEqual((update["request"]["request_id"], update["request"]["status"]), (self.towel.id, "ACCEPTED"))
+
+        await sync_to_async(self._staff_post)("portal_stay_checkout_confirm", {"room_id": self.room.id})
+        self.assertEqual(await self._next(frames), {"type": "stay_closed"})
+        with self.assertRaises(StopAsyncIteration):
+            await anext(frames)
+        # EventSource reconnects: the stay is over, so it is refused
+        self.assertEqual((await self.async_client.get(self.url)).status_code, 403)
+
+    async def test_unverified_guest_is_refused(self):
+        self.assertEqual((await self.async_client.get(self.url)).status_code, 403)
+
+
+class MenuCacheTests(TestCase):
+    """The cached menu renders the page; what a guest adds is priced and checked from the DB."""
+
+    def setUp(self):
+        cache.clear()  # menu cached for a rolled-back hotel with the same id
+        mute_overview(self)
+        self.hotel = make_hotel()
+        self.room = self.hotel.room_set.first()
+        self.dosa = Item.objects.get(hotel=self.hotel, name="Dosa")
+        self.towel = Item.objects.get(hotel=self.hotel, name="Towel")
+        self.base = f"/h/{self.hotel.id}/r/{self.room.id}"
+
+    def _tree_items(self):
+        return {i.id: (i.name, i.price) for i in get_menu_tree(self.hotel.id)["items"].values()}
+
+    def test_add_reads_price_and_availability_from_the_db(self):
+        get_menu_tree(self.hotel.id)
+        # queryset updates send no signal: the cached tree still has the old row
+        Item.objects.filter(pk=self.dosa.pk).update(price=80)
+        self.assertEqual(self._tree_items()[self.dosa.id], ("Dosa", 50))
+
+        self.client.post(self.base + "/cart/add/", {"item_id": self.dosa.id})
+        self.assertEqual(CartItem.objects.get(item=self.dosa).price_snapshot, 80)
+
+        Item.objects.filter(pk__in=[self.dosa.pk, self.towel.pk]).update(is_available=False)
+        self.assertEqual(self.client.post(self.base + "/cart/add/", {"item_id": self.dosa.id}).status_code, 404)
+        self.assertEqual(self.client.post(self.base + "/service/request/", {"item_id": self.towel.id}).status_code, 404)
+        self.assertEqual(self.client.post(self.base + "/cart/add/", {"item_id": "x"}).status_code, 404)
+
+    def test_catalog_edits_invalidate_the_tree(self):
+        version = get_menu_tree(self.hotel.id)["version"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dosa.price = 60
+            self.dosa.save()
+        self.assertNotEqual(get_menu_tree(self.hotel.id)["version"], version)
+        self.assertEqual(self._tree_items()[self.dosa.id], ("Dosa", 60))
+
+        admin = Client()
+        admin.force_login(User.objects.get(username=f"admin-{self.hotel.id}"))
+        with self.captureOnCommitCallbacks(execute=True):
+            admin.post(reverse("item_toggle_available", args=[self.towel.pk]))
+        self.assertNotIn(self.towel.id, self._tree_items())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CartItem.objects.filter(item=self.dosa).delete()
+            self.dosa.delete()
+        self.assertEqual(self._tree_items(), {})
+
+    def test_catalog_edits_rerender_the_menu_html(self):
+        html = get_menu_html(self.hotel.id)
+        self.assertIn('<h6 class="card-title mb-1">Dosa</h6>', html["sections"])
+        self.assertIn("₹ 50.00", html["sections"])
+        self.assertIn("<span>Food</span>", html["bars"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dosa.name, self.dosa.price = "Masala Dosa", 65
+            self.dosa.save()
+        html = get_menu_html(self.hotel.id)
+        self.assertIn('<h6 class="card-title mb-1">Masala Dosa</h6>', html["sections"])
+        self.assertIn("₹ 65.00", html["sections"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dosa.category.name = "Breakfast"
+            self.dosa.category.save()
+        html = get_menu_html(self.hotel.id)
+        self.assertIn("<span>Breakfast</span>", html["bars"])
+        self.assertNotIn("<span>Food</span>", html["bars"])
+        # and the room page serves the new markup
+        self.assertContains(self.client.get(self.base + "/"), "<span>Breakfast</span>")
+
+
+class CartJsonTests(TestCase):
+    """Cart endpoints with Accept: application/json answer with the line and the cart totals."""
+
+    def setUp(self):
+        cache.clear()  # menu / cart markers cached for a rolled-back hotel with the same id
+        self.hotel = make_hotel()
+        self.room = self.hotel.room_set.first()
+        self.dosa = Item.objects.get(hotel=self.hotel, name="Dosa")
+        self.tea = Item.objects.create(
+            hotel=self.hotel, category=self.dosa.category, name="Tea", price="12.50"
+        )
+        self.base = f"/h/{self.hotel.id}/r/{self.room.id}"
+
+    def _post(self, path, **data):
+        return self.client.post(self.base + path, data, HTTP_ACCEPT="application/json").json()
+
+    def test_add_update_and_view_shapes(self):
+        self.assertEqual(self._post("/cart/add/", item_id=self.dosa.id, qty=2), {
+            "ok": True, "count": 2, "total": "100.00",
+            "line": {"item_id": self.dosa.id, "name": "Dosa", "qty": 2, "price": "50.00", "line_total": "100.00"},
+        })
+        self._post("/cart/add/", item_id=self.tea.id)
+        self.assertEqual(self._post("/cart/update/", item_id=self.tea.id, qty=3), {
+            "ok": True, "count": 5, "total": "137.50",
+            "line": {"item_id": self.tea.id, "name": "Tea", "qty": 3, "price": "12.50", "line_total": "37.50"},
+        })
+        view = self.client.get(self.base + "/cart/view/", HTTP_ACCEPT="application/json").json()
+        self.assertEqual(view, {
+            "ok": True, "count": 5, "total": "137.50",
+            "lines": [
+                {"item_id": self.dosa.id, "name": "Dosa", "qty": 2, "price": "50.00", "line_total": "100.00"},
+                {"item_id": self.tea.id, "name": "Tea", "qty": 3, "price": "12.50", "line_total": "37.50"},
+            ],
+        })
+
+    def test_qty_zero_removes_the_line(self):
+        self._post("/cart/add/", item_id=self.dosa.id, qty=2)
+        self._post("/cart/add/", item_id=self.tea.id)
+
+        body = self._post("/cart/update/", item_id=self.dosa.id, qty=0)
+
+        self.assertEqual((body["line"]["qty"], body["line"]["line_total"], body["count"], body["total"]), (0, "0.00", 1, "12.50"))
+        self.assertFalse(CartItem.objects.filter(item=self.dosa).exists())
+
+    def test_update_query_count(self):
+        self._post("/cart/add/", item_id=self.dosa.id)
+        # room (+ hotel, stay), the line (+ cart, item), UPDATE qty, totals
+        with self.assertNumQueries(4):
+            self._post("/cart/update/", item_id=self.dosa.id, qty=4)
+
+        # a cart not touched for a while also gets its updated_at moved
+        Cart.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        with self.assertNumQueries(5):
+            self._post("/cart/update/", item_id=self.dosa.id, qty=5)
+        self.assertGreater(Cart.objects.get().updated_at, timezone.now() - timedelta(minutes=1))
@@ -23,6 +23,7 @@ urlpatterns = [
 
 # Guest summary (orders & services combined)
     path("h/<int:hotel_id>/r/<int:room_id>/summary/", views.guest_summary, name="guest_summary"),
+    path("h/<int:hotel_id>/r/<int:room_id>/stream/", views.guest_stream, name="guest_stream"),
 
     path("cart/mini/", views.cart_mini, name="cart_mini"),
 
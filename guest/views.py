@@ -3,20 +3,28 @@
 from collections import defaultdict
 from decimal import Decimal
 
+from django.core.cache import cache
 from django.db import transaction, IntegrityError
-from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse, HttpResponseForbidden
+from django.db.models import DecimalField, F, Sum
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed, JsonResponse, HttpResponseForbidden
 from django.shortcuts import render, get_object_or_404
 from django.template.loader import render_to_string
 from django.views.decorators.http import require_GET, require_POST
 
-from hotelportal.models import Hotel, Room, Category, Item, Cart, CartItem, Request, RequestLine
+from hotelportal.models import Hotel, Room, Cart, CartItem, IdempotencyKey, Item, Request, RequestLine
 
 from django.utils import timezone
 from django.views.decorators.csrf import ensure_csrf_cookie
  #from .views import _get_or_create_cart, _badge_count 
 # guest/views.py
 
-from hotelportal.views_live import _broadcast_live_board  # 11.3A – realtime push to portal
+from hotelportal import realtime  # 11.3A – realtime push to portal
+from hotelportal.board import serialize_guest_request
+from hotelportal.menu_cache import get_menu_html
+from hotelportal.broadcaster import guest_stay_group
+from hotelportal.sse import group_event_stream, sse_frame, sse_response
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
 
 
 from website.models import Hotel
@@ -55,6 +63,15 @@ def _current_stay_if_verified(request, room):
     return None
 
 
+def _guest_room_or_404(hotel_id, room_id):
+    """(hotel, room) of an active hotel's active room, with its current stay: one query."""
+    room = get_object_or_404(
+        Room.objects.select_related("hotel", "current_stay"),
+        id=room_id, hotel_id=hotel_id, hotel__status="ACTIVE", is_active=True,
+    )
+    return room.hotel, room
+
+
 def _require_phone_ok(request, hotel, room):
     """
     If the room has an active stay, block the action when cookie != stay.phone.
@@ -70,9 +87,63 @@ def _require_phone_ok(request, hotel, room):
     return None
 
 
+def _menu_item_or_404(hotel, item_id):
+    """
+    Available item of this hotel, read from the DB: the guest is charged
+    its price, so it never comes from the cached menu (that one only
+    renders the page, and can trail an edit made in another process).
+    """
+    if not str(item_id).isdigit():
+        raise Http404("No such item")
+    return get_object_or_404(
+        Item.objects.select_related("category"), id=item_id, hotel=hotel, is_available=True
+    )
+
+
+# Carts are created lazily, on the first cart_add only: page views and
+# cart peeks never write. The cache remembers, per room (+ stay), the
+# DRAFT cart's id or 0 = "no cart", so the common empty read skips the DB.
+# That is only a rendering shortcut (the marker is per process with LocMem):
+# submits and cart writes always look the cart up (for_write=True).
+# cart_add / cart_update touch the cart's updated_at, which is what
+# prune_draft_carts ages carts by; it drops the markers of what it deletes.
+# (cart_update only when the last touch is CART_TOUCH_INTERVAL old: pruning
+# counts in hours, a guest tapping +/- shouldn't cost a write per tap.)
+CART_MARKER_TIMEOUT = 24 * 3600
+CART_TOUCH_INTERVAL = timezone.timedelta(minutes=10)
+
+
+def cart_marker_key(room_id, stay_id=None):
+    return f"guest_cart:{room_id}:{stay_id or 0}"
+
+
+def _cart_marker_key(room, stay=None):
+    return cart_marker_key(room.id, stay.id if stay else None)
+
+
+def _find_cart(hotel, room, stay=None, for_write=False):
+    """
+    The current DRAFT cart, or None. Never creates one.
+    If stay is provided, only the cart linked to that stay. Rendering
+    trusts a "no cart" marker; ``for_write`` always asks the DB.
+    """
+    key = _cart_marker_key(room, stay)
+    marker = cache.get(key)
+    if marker == 0 and not for_write:
+        return None
+    cart = Cart.objects.filter(hotel=hotel, room=room, stay=stay, status="DRAFT").first()
+    found = cart.id if cart else 0
+    if marker is None:
+        # add(), not set(): never overwrite a cart_add that just created one
+        cache.add(key, found, CART_MARKER_TIMEOUT)
+    elif marker != found:
+        cache.set(key, found, CART_MARKER_TIMEOUT)  # pruned, or a stale "no cart"
+    return cart
+
+
 def _get_or_create_cart(hotel, room, stay=None):
     """
-    Single place to create/fetch the current cart.
+    Single place to create/fetch the current cart (cart_add only).
     If stay is provided, cart is linked to that stay.
     """
     cart, _ = Cart.objects.get_or_create(
@@ -81,15 +152,93 @@ def _get_or_create_cart(hotel, room, stay=None):
         stay=stay,
         status="DRAFT",
     )
+    cache.set(_cart_marker_key(room, stay), cart.id, CART_MARKER_TIMEOUT)
     return cart
 
 
+def _forget_cart(room, stay=None):
+    """The room's cart is gone (order placed)."""
+    cache.set(_cart_marker_key(room, stay), 0, CART_MARKER_TIMEOUT)
+
+
+def _touch_cart(cart_id):
+    """Guest activity: keeps the cart out of prune_draft_carts. False if it was pruned."""
+    return Cart.objects.filter(pk=cart_id).update(updated_at=timezone.now()) > 0
+
+
 def _badge_count(cart: Cart) -> int:
+    if cart is None:
+        return 0
     return sum(ci.qty for ci in cart.items.all())
 
 
+# Idempotent submits: order_submit_stub / service_request take an optional
+# client key (Idempotency-Key header or idempotency_key field). The key is
+# stored with the new Request in the same transaction; a retry with the
+# same key gets {"ok": true, "request_id": <original>, "replayed": true}
+# and writes / broadcasts nothing.
+def _idempotency_key(request):
+    key = (request.headers.get("Idempotency-Key") or request.POST.get("idempotency_key") or "").strip()
+    return key[:64] or None
+
+
+def _replayed_submit(hotel, key):
+    """The original answer for an already used key, else None."""
+    if not key:
+        return None
+    row = IdempotencyKey.objects.filter(hotel=hotel, key=key).values_list("id", "request_id").first()
+    if row is None:
+        return None
+    IdempotencyKey.objects.filter(pk=row[0]).update(replays=F("replays") + 1)
+    return JsonResponse({"ok": True, "request_id": row[1], "replayed": True})
+
+
+def _remember_submit(hotel, key, req):
+    """Call inside the submit's transaction; raises IntegrityError if a concurrent retry won."""
+    if key:
+        IdempotencyKey.objects.create(hotel=hotel, key=key, request=req)
+
+
+# JSON cart API: the same endpoints answer with JSON instead of the
+# _cart_body.html fragment when the client sends Accept: application/json.
+# add / update return only the changed line plus new totals; the guest JS
+# patches the cart DOM itself.
+#
+#   {"ok": true, "line": {"item_id", "name", "qty", "price", "line_total"},
+#    "count": 3, "total": "240.00"}                         (qty 0 = removed)
+#   cart_view → {"ok": true, "lines": [...], "count", "total"}
+def _wants_json(request):
+    return "application/json" in request.headers.get("Accept", "")
+
+
+def _cart_totals(cart_id):
+    """(item count, total amount) of a cart, in one query."""
+    if not cart_id:
+        return 0, Decimal("0.00")
+    agg = CartItem.objects.filter(cart_id=cart_id).aggregate(
+        count=Sum("qty"),
+        total=Sum(F("qty") * F("price_snapshot"), output_field=DecimalField(max_digits=12, decimal_places=2)),
+    )
+    return agg["count"] or 0, (agg["total"] or Decimal("0.00")).quantize(Decimal("0.01"))
+
+
+def _cart_line(item_id, name, qty, price):
+    return {
+        "item_id": item_id,
+        "name": name,
+        "qty": qty,
+        "price": str(price),
+        "line_total": str((price * qty).quantize(Decimal("0.01"))),
+    }
+
+
+def _cart_json(cart_id, line=None):
+    count, total = _cart_totals(cart_id)
+    return JsonResponse({"ok": True, "line": line, "count": count, "total": str(total)})
+
+
 def _render_cart_fragment(cart: Cart) -> HttpResponse:
-    items = list(cart.items.select_related("item"))
+    items = list(cart.items.select_related("item")) if cart else []
     total = sum((ci.price_snapshot * ci.qty for ci in items), Decimal("0.00"))
 
     html = render_to_string(
@@ -98,7 +247,7 @@ def _render_cart_fragment(cart: Cart) -> HttpResponse:
     )
     resp = HttpResponse(html)
     # Total items
-    resp["X-Cart-Count"] = str(_badge_count(cart))
+    resp["X-Cart-Count"] = str(sum(ci.qty for ci in items))
     # Total amount (for mini cart bar)
     resp["X-Cart-Total"] = str(total.quantize(Decimal("0.01")))
     return resp
@@ -148,32 +297,9 @@ def room_view(request, hotel_id, room_id):
     hotel = get_object_or_404(Hotel, id=hotel_id, status="ACTIVE")
     room = get_object_or_404(Room, id=room_id, hotel=hotel, is_active=True)
 
-    cats = Category.objects.filter(
-        hotel=hotel,
-        is_active=True,
-    ).select_related("parent").order_by("position", "name")
-
-    items = Item.objects.filter(
-        hotel=hotel,
-        is_available=True,
-    ).select_related("category", "image").order_by("position", "name")
-
-    from collections import defaultdict
-    items_by_cat = defaultdict(list)
-    for it in items:
-        items_by_cat[it.category_id].append(it)
-
-    children = defaultdict(list)
-    top_food, top_service = [], []
-    for c in cats:
-        if c.parent_id:
-            children[c.parent_id].append(c)
-        else:
-            (top_food if c.kind == "FOOD" else top_service).append(c)
-
-    # 👇 NEW: flattened lists for bottom category bar (food / service)
-    food_categories = [c for c in cats if c.kind == "FOOD"]
-    service_categories = [c for c in cats if c.kind == "SERVICE"]
+    # menu markup rendered once per hotel + catalog version (menu_cache);
+    # only the header, phone gate and cart badge below are per room / stay
+    menu_html = get_menu_html(hotel.id)
 
     # ----- Day-7 phone gate -----
     stay = getattr(room, "current_stay", None)
@@ -188,18 +314,13 @@ def room_view(request, hotel_id, room_id):
     elif phone_verified and stay and getattr(stay, "name", None):
         guest_name = stay.name
 
-    # cart: stay-bound if verified
-    cart = _get_or_create_cart(hotel, room, stay=stay if phone_verified else None)
+    # cart: stay-bound if verified (None until the first cart_add)
+    cart = _find_cart(hotel, room, stay=stay if phone_verified else None)
 
     ctx = dict(
         hotel=hotel,
         room=room,
-        top_food=top_food,
-        top_service=top_service,
-        children=children,
-        items_by_cat=items_by_cat,
-        food_categories=food_categories,      # 👈 NEW
-        service_categories=service_categories,  # 👈 NEW
+        menu_html=menu_html,
         cart_count=_badge_count(cart),
         needs_phone=needs_phone,
         phone_verified=phone_verified,
@@ -222,7 +343,19 @@ def cart_view(request, hotel_id, room_id):
 
     # if verified, load stay-bound cart
     stay = _current_stay_if_verified(request, room)
-    cart = _get_or_create_cart(hotel, room, stay=stay)
+    cart = _find_cart(hotel, room, stay=stay)
+    if _wants_json(request):
+        rows = []
+        if cart is not None:
+            rows = CartItem.objects.filter(cart=cart).values_list("item_id", "item__name", "qty", "price_snapshot")
+        lines = [_cart_line(*row) for row in rows]
+        total = sum((Decimal(ln["line_total"]) for ln in lines), Decimal("0.00"))
+        return JsonResponse({
+            "ok": True,
+            "lines": lines,
+            "count": sum(ln["qty"] for ln in lines),
+            "total": str(total),
+        })
     return _render_cart_fragment(cart)
 
 
@@ -243,13 +376,15 @@ def cart_add(request, hotel_id, room_id):
     if qty < 1:
         qty = 1
 
-    item = get_object_or_404(Item, id=item_id, hotel=hotel, is_available=True)
+    item = _menu_item_or_404(hotel, item_id)
 
     # if verified → tie cart to stay
     stay = _current_stay_if_verified(request, room)
     cart = _get_or_create_cart(hotel, room, stay=stay)
 
     with transaction.atomic():
+        if not _touch_cart(cart.id):
+            cart = _get_or_create_cart(hotel, room, stay=stay)  # pruned meanwhile
         ci, created = CartItem.objects.select_for_update().get_or_create(
             cart=cart,
             item=item,
@@ -259,13 +394,14 @@ def cart_add(request, hotel_id, room_id):
             ci.qty += qty
             ci.save(update_fields=["qty"])
 
+    if _wants_json(request):
+        return _cart_json(cart.id, _cart_line(item.id, item.name, ci.qty, ci.price_snapshot))
     return _render_cart_fragment(cart)
 
 
 @require_POST
 def cart_update(request, hotel_id, room_id):
-    hotel = get_object_or_404(Hotel, id=hotel_id, status="ACTIVE")
-    room = get_object_or_404(Room, id=room_id, hotel=hotel, is_active=True)
+    hotel, room = _guest_room_or_404(hotel_id, room_id)
 
     # 7.6 guard
     blocked = _require_phone_ok(request, hotel, room)
@@ -277,18 +413,28 @@ def cart_update(request, hotel_id, room_id):
     if not item_id:
         return HttpResponseBadRequest("Missing item_id")
 
+    # line + its cart in one query (no separate cart lookup)
     stay = _current_stay_if_verified(request, room)
-    cart = _get_or_create_cart(hotel, room, stay=stay)
-
-    ci = get_object_or_404(CartItem, cart=cart, item_id=item_id)
+    ci = get_object_or_404(
+        CartItem.objects.select_related("cart", "item"),
+        cart__hotel=hotel,
+        cart__room=room,
+        cart__stay=stay,
+        cart__status="DRAFT",
+        item_id=item_id,
+    )
 
     if qty <= 0:
-        ci.delete()
+        CartItem.objects.filter(pk=ci.pk).delete()
+        qty = 0
     else:
-        ci.qty = qty
-        ci.save(update_fields=["qty"])
+        CartItem.objects.filter(pk=ci.pk).update(qty=qty)
+    if ci.cart.updated_at < timezone.now() - CART_TOUCH_INTERVAL:
+        _touch_cart(ci.cart_id)
 
-    return _render_cart_fragment(cart)
+    if _wants_json(request):
+        return _cart_json(ci.cart_id, _cart_line(ci.item_id, ci.item.name, qty, ci.price_snapshot))
+    return _render_cart_fragment(ci.cart)
 
 
 @require_POST
@@ -302,8 +448,11 @@ def cart_clear(request, hotel_id, room_id):
         return blocked
 
     stay = _current_stay_if_verified(request, room)
-    cart = _get_or_create_cart(hotel, room, stay=stay)
-    cart.items.all().delete()
+    cart = _find_cart(hotel, room, stay=stay, for_write=True)
+    if cart is not None:
+        cart.items.all().delete()
+    if _wants_json(request):
+        return _cart_json(None)
     return _render_cart_fragment(cart)
 
 
@@ -327,6 +476,12 @@ def order_submit_stub(request, hotel_id, room_id):
     if blocked:
         return blocked
 
+    # retried submit → original answer (before the cart check: the cart is gone by now)
+    idem_key = _idempotency_key(request)
+    replayed = _replayed_submit(hotel, idem_key)
+    if replayed:
+        return replayed
+
     # tie to verified stay
     stay = _current_stay_if_verified(request, room)
 
@@ -335,32 +490,35 @@ def order_submit_stub(request, hotel_id, room_id):
     if len(note_txt) > 200:
         note_txt = note_txt[:200]
 
-    cart = Cart.objects.filter(
-        hotel=hotel,
-        room=room,
-        stay=stay,
-        status="DRAFT",
-    ).first()
+    cart = _find_cart(hotel, room, stay=stay, for_write=True)
     if not cart or not cart.items.exists():
         return JsonResponse({"ok": False, "error": "empty_cart"}, status=400)
 
-    with transaction.atomic():
-        subtotal = Decimal("0.00")
-        for ci in cart.items.all():
-            subtotal += ci.price_snapshot * ci.qty
+    try:
+        return _place_food_order(hotel, room, stay, cart, note_txt, idem_key)
+    except IntegrityError:
+        # a concurrent retry with the same key committed first
+        replayed = _replayed_submit(hotel, idem_key)
+        if replayed:
+            return replayed
+        raise
+
 
-        req = Request.objects.create(
+def _place_food_order(hotel, room, stay, cart, note_txt, idem_key):
+    with transaction.atomic():
+        req = Request(
             hotel=hotel,
             room=room,
             stay=stay,          # request belongs to this stay (7.4)
             kind="FOOD",
             status="NEW",
-            subtotal=subtotal,
             note=note_txt or "",  # store guest note (empty string is fine for CharField)
         )
 
+        subtotal = Decimal("0.00")
         lines = []
         for ci in cart.items.select_related("item"):
+            subtotal += ci.price_snapshot * ci.qty
             lines.append(
                 RequestLine(
                     request=req,
@@ -371,14 +529,21 @@ def order_submit_stub(request, hotel_id, room_id):
                     line_total=ci.price_snapshot * ci.qty,
                 )
             )
+
+        # lines summary travels with the Request row (live board reads it)
+        req.subtotal = subtotal
+        req.set_lines_summary(lines)
+        req.save()
         RequestLine.objects.bulk_create(lines)
+        _remember_submit(hotel, idem_key, req)
+        realtime.request_created(req, lines)
 
         # clear / mark cart
         cart.items.all().delete()
         cart.delete()
+        transaction.on_commit(lambda: _forget_cart(room, stay))
         #cart.status = "SUBMITTED"
         #cart.save(update_fields=["status"])
-    _broadcast_live_board(hotel)
     return JsonResponse({"ok": True, "request_id": req.id})
 
 
@@ -403,11 +568,16 @@ def service_request(request, hotel_id, room_id):
     if blocked:
         return blocked
 
+    idem_key = _idempotency_key(request)
+    replayed = _replayed_submit(hotel, idem_key)
+    if replayed:
+        return replayed
+
     item_id = request.POST.get("item_id")
     if not item_id:
         return HttpResponseBadRequest("Missing item_id")
 
-    item = get_object_or_404(Item, id=item_id, hotel=hotel, is_available=True)
+    item = _menu_item_or_404(hotel, item_id)
     if item.category.kind != "SERVICE":
         return JsonResponse({"ok": False, "error": "not_a_service"}, status=400)
 
@@ -431,17 +601,26 @@ def service_request(request, hotel_id, room_id):
         note_txt = note_txt[:200]
 
     price = item.price if item.price is not None else Decimal("0.00")
-    req = Request.objects.create(
-        hotel=hotel,
-        room=room,
-        stay=stay,
-        kind="SERVICE",
-        status="NEW",
-        subtotal=price,
-        service_item=item,     # this carries the service identity
-        note=note_txt or "",   # this is the guest’s note (no longer item name)
-    )
-    _broadcast_live_board(hotel)
+    try:
+        with transaction.atomic():
+            req = Request.objects.create(
+                hotel=hotel,
+                room=room,
+                stay=stay,
+                kind="SERVICE",
+                status="NEW",
+                subtotal=price,
+                service_item=item,     # this carries the service identity
+                note=note_txt or "",   # this is the guest’s note (no longer item name)
+            )
+            _remember_submit(hotel, idem_key, req)
+            realtime.request_created(req)
+    except IntegrityError:
+        # a concurrent retry with the same key committed first
+        replayed = _replayed_submit(hotel, idem_key)
+        if replayed:
+            return replayed
+        raise
     return JsonResponse({"ok": True, "request_id": req.id})
 
 
@@ -450,6 +629,13 @@ def service_request(request, hotel_id, room_id):
 # ----------------------------------------------------------------------
 
 
+def _summary_rows(qs):
+    food, services = [], []
+    for r in qs:
+        (food if r.kind == "FOOD" else services).append(serialize_guest_request(r))
+    return {"food": food, "services": services}
+
+
 @require_GET
 def guest_summary(request, hotel_id, room_id):
     hotel = get_object_or_404(Hotel, id=hotel_id, status="ACTIVE")
@@ -462,44 +648,64 @@ def guest_summary(request, hotel_id, room_id):
         # ✅ guest is verified for THIS stay → show ONLY this stay
         qs = (Request.objects
               .filter(hotel=hotel, room=room, stay=stay)
-              .select_related("room", "service_item")
-              .prefetch_related("lines")
+              .select_related("service_item")
               .order_by("-created_at")[:100])
     else:
         # fallback (old behaviour)
         since = timezone.now() - timezone.timedelta(days=1)
         qs = (Request.objects
               .filter(hotel=hotel, room=room, created_at__gte=since)
-              .select_related("room", "service_item")
-              .prefetch_related("lines")
+              .select_related("service_item")
               .order_by("-created_at")[:100])
 
-    food, services = [], []
-    for r in qs:
-        if r.kind == "FOOD":
-            food.append({
-                "request_id": r.id,
-                "status": r.status,
-                "created_at": r.created_at.isoformat(),
-                "accepted_at": r.accepted_at.isoformat() if r.accepted_at else None,
-                "completed_at": r.completed_at.isoformat() if r.completed_at else None,
-                "cancelled_at": r.cancelled_at.isoformat() if r.cancelled_at else None,
-                "subtotal": float(r.subtotal or 0),
-                "lines": [{"name": ln.name_snapshot, "qty": ln.qty} for ln in r.lines.all()],
-            })
-        else:
-            nm = (r.service_item.name if r.service_item else (r.note or "Service"))
-            services.append({
-                "request_id": r.id,
-                "name": nm,
-                "status": r.status,
-                "created_at": r.created_at.isoformat(),
-                "accepted_at": r.accepted_at.isoformat() if r.accepted_at else None,
-                "completed_at": r.completed_at.isoformat() if r.completed_at else None,
-                "cancelled_at": r.cancelled_at.isoformat() if r.cancelled_at else None,
-            })
-
-    return JsonResponse({"ok": True, "food": food, "services": services})
+    return JsonResponse({"ok": True, **_summary_rows(qs)})
+
+
+# ----------------------------------------------------------------------
+# GUEST STREAM (SSE) — live status of this stay's requests
+# ----------------------------------------------------------------------
+
+
+def _stream_stay(request, hotel_id, room_id):
+    """Verified stay for the stream, or None (same cookie check as 7.6)."""
+    room = (Room.objects.select_related("current_stay")
+            .filter(id=room_id, hotel_id=hotel_id, hotel__status="ACTIVE", is_active=True)
+            .first())
+    return _current_stay_if_verified(request, room) if room else None
+
+
+def _stay_summary(stay):
+    qs = (Request.objects
+          .filter(stay=stay)
+          .select_related("service_item")
+          .order_by("-created_at")[:100])
+    return {"type": "summary", **_summary_rows(qs)}
+
+
+async def guest_stream(request, hotel_id, room_id):
+    """
+    Server-Sent Events for the guest page: one "summary" frame on connect
+    (same rows as guest_summary), then a "request_update" each time one of
+    this stay's requests is created or changes status, and a last
+    "stay_closed" when the stay checks out (the stream ends). Lives under
+    /h/<hotel>/r/<room>/ so the path-scoped s2s_phone cookie is sent.
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+
+    stay = await sync_to_async(_stream_stay)(request, hotel_id, room_id)
+    if not stay:
+        return JsonResponse({"ok": False, "error": "PHONE_REQUIRED"}, status=403)
+
+    async def opening():
+        return [sse_frame(await database_sync_to_async(_stay_summary)(stay))]
+
+    def render(message):
+        if message.get("type") != "guest.push":
+            return None
+        return sse_frame(message.get("payload") or {})
+
+    return sse_response(group_event_stream(guest_stay_group(stay.id), opening, render))
 
 
 # ----------------------------------------------------------------------
@@ -0,0 +1,385 @@
+# hotelportal/board.py
+"""
+Live board data: row serializers, the board_state snapshot and the delta
+protocol spoken on ``hotel_portal_live_<hotel_id>``.
+
+A socket gets one full ``board_state`` when it connects (or when it asks
+for one with {"type": "snapshot_request"}), then only small deltas:
+
+    request_created         {"request": <row>}
+    request_status_changed  {"request": <row>, "prev_status": "NEW"}
+    room_status_changed     {"room": <room>, "prev_status": "BUSY"}
+    counters_changed        {"counts": {...}}
+    rooms_reset             {} rooms were added in bulk: re-fetch the snapshot
+
+Every message carries the hotel's board ``version``; each delta bumps it by
+exactly one. A client that sees a version other than last + 1 has missed
+something and sends {"type": "resume", "version": <last applied>} (or
+reconnects with ?version=<last applied>): ``board_resume`` answers with
+just the missed deltas from the replay buffer (board_replay.py), or a
+snapshot when it fell too far behind. Screens that only want some floors /
+kinds / lanes subscribe to filtered sub-groups instead (board_filters.py).
+
+Snapshots are cached per hotel (``get_board_snapshot``) under the pair
+(data_version, version): data_version moves on every Request / Room / Stay
+write, so live_board, live_poll and every socket connect share one build
+until something actually changes.
+
+Guests get their own, much smaller feed: every created / changed request
+that belongs to a stay is also pushed to ``hotel_portal_guest_<stay_id>`` as a
+``request_update``, and check-out sends a final ``stay_closed`` (see
+guest_stream in guest/views.py).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .board_filters import (
+    counters_group,
+    filter_snapshot,
+    has_filtered_subscribers,
+    request_event_groups,
+    room_event_groups,
+    subscription_groups,
+)
+from .board_queries import hotel_tiles, request_lanes, room_lanes, today_counts
+from .board_replay import missed_deltas, remember_delta
+from .broadcaster import guest_stay_group, hotel_group, live_broadcaster
+from .models import DailyRequestCounter, LiveBoardState
+
+
+# -----------------------------
+# Row serializers
+# -----------------------------
+def serialize_requests(qs, hotel=None):
+    """
+    Serialize Request queryset for Live Board / polling.
+
+    Day-14 addition:
+      - include hotel_id
+      - include hotel_staff_group_code (for external WhatsApp sender script)
+
+    Lines come from the denormalized Request.lines_summary, so no
+    RequestLine query is made. Pass ``hotel`` for single-hotel lists;
+    otherwise select_related("hotel") on qs.
+    """
+    out = []
+    for r in qs:
+        h = hotel or r.hotel
+        out.append(
+            {
+                "id": r.id,
+                "room": r.room.number if r.room else "",
+                "floor": r.room.floor if r.room else "",
+                "kind": r.kind,
+                "status": r.status,
+                "subtotal": float(r.subtotal or 0),
+                "created_at": r.created_at.isoformat(),
+                "accepted_at": r.accepted_at.isoformat() if r.accepted_at else None,
+                "completed_at": r.completed_at.isoformat() if r.completed_at else None,
+                "cancelled_at": r.cancelled_at.isoformat() if r.cancelled_at else None,
+                "note": r.note or "",
+                "lines": r.lines_summary or [],
+                "item_count": r.item_count,
+                # 👇 extra for the bot script
+                "hotel_id": r.hotel_id,
+                "hotel_name": h.name,
+                "hotel_staff_group_code": getattr(h, "staff_whatsapp_group_code", "") or "",
+            }
+        )
+    return out
+
+
+def serialize_guest_request(r):
+    """One row of the guest "My services" summary (food or service)."""
+    row = {
+        "request_id": r.id,
+        "kind": r.kind,
+        "status": r.status,
+        "created_at": r.created_at.isoformat(),
+        "accepted_at": r.accepted_at.isoformat() if r.accepted_at else None,
+        "completed_at": r.completed_at.isoformat() if r.completed_at else None,
+        "cancelled_at": r.cancelled_at.isoformat() if r.cancelled_at else None,
+    }
+    if r.kind == "FOOD":
+        row["subtotal"] = float(r.subtotal or 0)
+        row["lines"] = r.lines_summary or []
+    else:
+        row["name"] = r.service_item.name if r.service_item else (r.note or "Service")
+    return row
+
+
+def serialize_rooms(qs):
+    # expect qs = Room.objects.filter(hotel=...).select_related("current_stay")
+    out = []
+    for rm in qs:
+        st = rm.current_stay
+        out.append({
+            "id": rm.id,
+            "number": rm.number,
+            "floor": rm.floor,
+            "status": rm.status,  # FREE / BUSY / CLEANING
+            "guest_name": st.guest_name if st else "",
+            "guest_phone": st.phone if st else "",
+
+            # Billing info for live board (Day-10)
+            "stay_id": st.id if st else None,
+            "total_due": float(st.total_due or 0) if st else 0.0,
+            "is_paid": bool(st.is_paid) if st else False,
+        })
+    return out
+
+
+# -----------------------------
+# Today's counters (read side: board_queries.today_counts)
+# -----------------------------
+def bump_daily_counter(hotel_id, field):
+    """
+    +1 on today's "completed" or "cancelled" counter. Call inside the
+    transaction that makes the transition.
+    """
+    today = timezone.localdate()
+    updated = DailyRequestCounter.objects.filter(hotel_id=hotel_id, day=today).update(
+        **{field: F(field) + 1}
+    )
+    if not updated:
+        counter, created = DailyRequestCounter.objects.get_or_create(
+            hotel_id=hotel_id, day=today, defaults={field: 1}
+        )
+        if not created:
+            DailyRequestCounter.objects.filter(pk=counter.pk).update(**{field: F(field) + 1})
+
+
+# -----------------------------
+# Versions
+# -----------------------------
+def current_board_version(hotel_id):
+    if not hotel_id:
+        return 0
+    return (
+        LiveBoardState.objects.filter(hotel_id=hotel_id)
+        .values_list("version", flat=True)
+        .first()
+    ) or 0
+
+
+def board_versions(hotel_id):
+    """(data_version, version) for the hotel, in one query."""
+    row = (
+        LiveBoardState.objects.filter(hotel_id=hotel_id)
+        .values_list("data_version", "version")
+        .first()
+    )
+    return row or (0, 0)
+
+
+def bump_data_version(hotel_id):
+    """Invalidate the hotel's cached snapshot. Called from model signals."""
+    if not hotel_id:
+        return
+    updated = LiveBoardState.objects.filter(hotel_id=hotel_id).update(
+        data_version=F("data_version") + 1
+    )
+    if not updated:
+        LiveBoardState.objects.get_or_create(hotel_id=hotel_id, defaults={"data_version": 1})
+
+
+def next_board_version(hotel_id):
+    """Atomically bump and return the hotel's board version."""
+    with transaction.atomic():
+        state, _ = LiveBoardState.objects.select_for_update().get_or_create(hotel_id=hotel_id)
+        state.version += 1
+        state.save(update_fields=["version"])
+    return state.version
+
+
+# -----------------------------
+# Snapshot
+# -----------------------------
+def build_board_payload(hotel_id, version=None):
+    """
+    Build a fresh board_state snapshot for one hotel (or all hotels when
+    hotel_id is None). The version is read BEFORE the data, so any delta
+    not reflected in the rows is guaranteed to carry a higher version.
+    Three queries after that (see board_queries), whatever the hotel's size.
+    """
+    if version is None:
+        version = current_board_version(hotel_id)
+
+    lanes = request_lanes(hotel_id)
+    return {
+        "type": "board_state",
+        "version": version,
+        "data": {
+            "new": serialize_requests(lanes["NEW"]),
+            "accepted": serialize_requests(lanes["ACCEPTED"]),
+            "counts": today_counts(hotel_id),
+            "rooms": room_lanes(hotel_id),
+        }
+    }
+
+
+def board_etag(hotel_id, versions=None):
+    """
+    HTTP validator for the hotel's board. Costs one single-row read, never
+    the request/room queries. The day is part of it (and of the cache key)
+    so "today" counters roll over at midnight.
+    """
+    data_version, version = versions or board_versions(hotel_id)
+    return f'"{hotel_id}-{timezone.localdate():%Y%m%d}-{data_version}-{version}"'
+
+
+def get_board_snapshot(hotel_id, versions=None):
+    """
+    Shared board_state for one hotel, built at most once per change.
+    The all-hotels board (hotel_id=None) is not cached.
+    """
+    if not hotel_id:
+        return build_board_payload(None)
+
+    versions = versions or board_versions(hotel_id)
+    version = versions[1]
+    key = "live_board:" + board_etag(hotel_id, versions).strip('"')
+    payload = cache.get(key)
+    if payload is None:
+        payload = build_board_payload(hotel_id, version=version)
+        cache.set(key, payload, getattr(settings, "LIVE_BOARD_CACHE_TIMEOUT", 300))
+    return payload
+
+
+def board_resume(hotel_id, since, board_filter=None):
+    """
+    Messages that bring a screen at version ``since`` up to date: the missed
+    deltas when the replay buffer still has all of them (only those of the
+    filter's sub-groups for a filtered screen), else one board_state.
+    """
+    versions = board_versions(hotel_id)
+    groups = subscription_groups(hotel_id, board_filter) if board_filter else None
+    deltas = missed_deltas(hotel_id, since, versions[1], groups)
+    if deltas is not None:
+        return deltas
+    return [filter_snapshot(get_board_snapshot(hotel_id, versions), board_filter)]
+
+
+# -----------------------------
+# Platform overview (one tile per hotel, never the rows)
+# -----------------------------
+def build_overview_payload():
+    return {"type": "overview_state", "tiles": list(hotel_tiles().values())}
+
+
+def get_hotel_tile(hotel_id):
+    """One hotel's overview tile, cached under the same counters as its snapshot."""
+    key = "live_tile:" + board_etag(hotel_id).strip('"')
+    tile = cache.get(key)
+    if tile is None:
+        tile = hotel_tiles([hotel_id]).get(hotel_id)
+        if tile is None:
+            return None
+        cache.set(key, tile, getattr(settings, "LIVE_BOARD_CACHE_TIMEOUT", 300))
+    return tile
+
+
+# -----------------------------
+# Deltas
+# -----------------------------
+def _publish_delta(hotel_id, delta_type, body, sub_groups=()):
+    """
+    Bump the version and push one delta to the hotel's sockets once the
+    surrounding transaction (if any) commits: the full hotel group plus,
+    while the hotel has filtered screens, the sub-groups it matches (see
+    board_filters). The delta is also kept in the replay buffer, under
+    every group, for reconnecting screens.
+    """
+    if not hotel_id:
+        return None
+
+    version = next_board_version(hotel_id)
+    payload = {"type": delta_type, "version": version, "hotel_id": hotel_id}
+    payload.update(body)
+
+    message = {"type": "board.push", "payload": payload}
+    groups = [hotel_group(hotel_id), *sorted(sub_groups)]
+
+    def send():
+        remember_delta(hotel_id, payload, groups)
+        for group in groups if has_filtered_subscribers(hotel_id) else groups[:1]:
+            live_broadcaster.publish(group, message)
+
+    live_broadcaster.on_commit(send)
+    return version
+
+
+def publish_guest_request(req):
+    """
+    Push the request's guest row to its stay's guest stream (hotel_portal_guest_<id>),
+    after commit. Requests without a stay have no guest listener.
+    """
+    if not req.stay_id:
+        return
+    message = {
+        "type": "guest.push",
+        "payload": {"type": "request_update", "request": serialize_guest_request(req)},
+    }
+    group = guest_stay_group(req.stay_id)
+    live_broadcaster.on_commit(lambda: live_broadcaster.publish(group, message))
+
+
+def publish_stay_closed(stay_id):
+    """Last frame of the stay's guest stream, after commit; the stream ends with it."""
+    message = {"type": "guest.push", "payload": {"type": "stay_closed"}, "close": True}
+    group = guest_stay_group(stay_id)
+    live_broadcaster.on_commit(lambda: live_broadcaster.publish(group, message))
+
+
+def publish_request_created(req):
+    row = serialize_requests([req], hotel=req.hotel)[0]
+    publish_guest_request(req)
+    return _publish_delta(
+        req.hotel_id, "request_created", {"request": row}, request_event_groups(req)
+    )
+
+
+def publish_request_status_changed(req, prev_status):
+    row = serialize_requests([req], hotel=req.hotel)[0]
+    publish_guest_request(req)
+    version = _publish_delta(
+        req.hotel_id,
+        "request_status_changed",
+        {"request": row, "prev_status": prev_status},
+        request_event_groups(req, prev_status),
+    )
+    if req.status in ("COMPLETED", "CANCELLED"):
+        publish_counters_changed(req.hotel_id)
+    return version
+
+
+def publish_room_status_changed(room, prev_status):
+    row = serialize_rooms([room])[0]
+    return _publish_delta(
+        room.hotel_id,
+        "room_status_changed",
+        {"room": row, "prev_status": prev_status},
+        room_event_groups(room, prev_status),
+    )
+
+
+def publish_rooms_reset(hotel_id, rooms):
+    """
+    Rooms added in bulk (room generator): ONE delta, one version, instead
+    of one per room. It carries no rows; boards answer it with a single
+    snapshot fetch, which bump_data_version has already invalidated.
+    """
+    groups = set()
+    for room in rooms:
+        groups |= room_event_groups(room)
+    return _publish_delta(hotel_id, "rooms_reset", {}, groups)
+
+
+def publish_counters_changed(hotel_id):
+    counts = today_counts(hotel_id)
+    return _publish_delta(
+        hotel_id, "counters_changed", {"counts": counts}, [counters_group(hotel_id)]
+    )
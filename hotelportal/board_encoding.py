@@ -0,0 +1,139 @@
+# hotelportal/board_encoding.py
+"""
+Wire encodings for /ws/portal/live/, negotiated per socket with a
+WebSocket subprotocol (or ?enc= for clients that can't set one):
+
+    (none) / ?enc=json                   plain JSON, every row a dict (default)
+    scan2service.compact.v1    compact   column-oriented JSON, see below
+    scan2service.deflate.v1    deflate   compact; frames over
+                                         LIVE_WS_DEFLATE_MIN_BYTES go out as
+                                         binary zlib frames
+    scan2service.msgpack.v1    msgpack   compact board / plain bot messages
+                                         as MessagePack binary frames
+                                         (needs ``pip install msgpack``)
+
+Daphne doesn't negotiate the permessage-deflate extension, so "deflate"
+is done per frame here; browsers inflate with DecompressionStream.
+
+Compact: the key header is sent ONCE per socket, right after accept,
+
+    {"type": "encoding", "enc": "compact",
+     "cols": {"request": ["id", "room", ...], "room": ["id", "number", ...]}}
+
+then rows are arrays in that column order, and the hotel fields every
+request row repeats move to the top of the board_state (taken from the
+socket's hotel, so they are there even with no open request):
+
+    {"type": "board_state", "version": 12, "enc": "compact",
+     "hotel": {"hotel_id": 8, "hotel_name": "...", "hotel_staff_group_code": "..."},
+     "data": {"new": [[...], ...], "accepted": [...], "counts": {...},
+              "rooms": {"free": [[...]], "busy": [...], "cleaning": [...]}}}
+
+Deltas carry ``"request": [...]`` / ``"room": [...]`` arrays. Anything else (counters, overview tiles, pings, bot
+request_events) is unchanged.
+"""
+import json
+import zlib
+
+from django.conf import settings
+
+try:
+    import msgpack
+except ImportError:  # optional: only the msgpack encoding needs it
+    msgpack = None
+
+SUBPROTOCOLS = {
+    "scan2service.compact.v1": "compact",
+    "scan2service.deflate.v1": "deflate",
+    "scan2service.msgpack.v1": "msgpack",
+}
+
+REQUEST_COLS = (
+    "id", "room", "floor", "kind", "status", "subtotal", "created_at",
+    "accepted_at", "completed_at", "cancelled_at", "note", "lines", "item_count",
+)
+ROOM_COLS = (
+    "id", "number", "floor", "status", "guest_name", "guest_phone",
+    "stay_id", "total_due", "is_paid",
+)
+
+
+def available(encoding):
+    if encoding == "msgpack":
+        return msgpack is not None
+    return encoding in ("json", "compact", "deflate")
+
+
+def negotiate(subprotocols, query_enc=None):
+    """
+    (encoding, subprotocol to accept or None). The first offered
+    subprotocol we support wins; ?enc= is the fallback.
+    """
+    for proto in subprotocols or ():
+        encoding = SUBPROTOCOLS.get(proto)
+        if encoding and available(encoding):
+            return encoding, proto
+    if query_enc and available(query_enc):
+        return query_enc, None
+    return "json", None
+
+
+def header(encoding):
+    """The once-per-socket column header, or None for plain JSON."""
+    if encoding == "json":
+        return None
+    return {"type": "encoding", "enc": encoding, "cols": {"request": REQUEST_COLS, "room": ROOM_COLS}}
+
+
+def hotel_header(hotel):
+    """The hotel fields of a request row (see board.serialize_requests) for ``hotel``."""
+    return {
+        "hotel_id": hotel.id,
+        "hotel_name": hotel.name,
+        "hotel_staff_group_code": getattr(hotel, "staff_whatsapp_group_code", "") or "",
+    }
+
+
+def _row(row, cols):
+    return [row.get(c) for c in cols]
+
+
+def compact(payload, hotel=None):
+    """
+    Column-oriented copy of a board message (never mutates ``payload``).
+    ``hotel``: hotel_header() of the board's hotel, for the board_state.
+    """
+    kind = payload.get("type")
+    if kind == "board_state":
+        data = payload.get("data") or {}
+        out = {k: v for k, v in payload.items() if k != "data"}
+        out["enc"] = "compact"
+        out["hotel"] = hotel
+        out["data"] = {
+            "new": [_row(r, REQUEST_COLS) for r in data.get("new") or []],
+            "accepted": [_row(r, REQUEST_COLS) for r in data.get("accepted") or []],
+            "counts": data.get("counts"),
+            "rooms": {
+                lane: [_row(r, ROOM_COLS) for r in rows]
+                for lane, rows in (data.get("rooms") or {}).items()
+            },
+        }
+        return out
+    if kind in ("request_created", "request_status_changed"):
+        return {**payload, "request": _row(payload["request"], REQUEST_COLS)}
+    if kind == "room_status_changed":
+        return {**payload, "room": _row(payload["room"], ROOM_COLS)}
+    return payload
+
+
+def encode_frame(payload, encoding="json", hotel=None):
+    """(text_data, bytes_data) for one outgoing message; exactly one is set."""
+    if encoding == "json":
+        return json.dumps(payload), None
+    if encoding == "msgpack":
+        return None, msgpack.packb(compact(payload, hotel), use_bin_type=True)
+
+    text = json.dumps(compact(payload, hotel), separators=(",", ":"))
+    if encoding == "deflate" and len(text) >= getattr(settings, "LIVE_WS_DEFLATE_MIN_BYTES", 1024):
+        return None, zlib.compress(text.encode(), 6)
+    return text, None
@@ -0,0 +1,218 @@
+# hotelportal/board_filters.py
+"""
+Filtered live-board subscriptions (floor / kind / lane).
+
+A client that only cares about part of the board sends
+
+    {"type": "subscribe", "floors": ["3", "4"], "kinds": ["FOOD"], "lanes": ["new"]}
+
+(or the same as ?floors=3,4&kinds=FOOD&lanes=new on the socket / stream /
+poll URL). Any dimension left out means "all". Kinds are FOOD, SERVICE and
+ROOM (room cards); lanes are new, accepted, free, busy, cleaning.
+
+Instead of the full ``hotel_portal_live_<id>`` group, such a client joins
+one sub-group per combination, e.g.
+
+    hotel_portal_live_8.f33.food.new      floor "3", FOOD, NEW lane
+    hotel_portal_live_8.any.any.cleaning  every floor, every kind, CLEANING
+
+plus ``hotel_portal_live_8.counters``. Every delta is published to the full
+group and to the (at most 12) sub-groups that can match it: its own floor /
+kind / lane and "any" in each position, for both the old and the new lane,
+so a card leaving a lane still reaches the screens that showed it.
+
+Filtered clients receive a subset of the hotel's deltas, so board versions
+there only ever increase (no gap check); a reconnect is replayed only the
+buffered deltas of its own sub-groups (board_replay.py).
+
+Most hotels have no filtered screen at all, so clients count themselves in
+(``filtered_joined`` / ``filtered_left``, before joining and after leaving
+the sub-groups) and a delta only goes to the sub-groups while the count is
+above zero. The count lives in the cache, which reaches exactly as far as
+the channel layer (REDIS_URL switches both). A worker that dies without
+disconnecting leaves it too high, which only costs the full fan-out.
+"""
+from itertools import product
+
+from django.core.cache import cache
+
+from .broadcaster import hotel_group
+
+ANY = "any"
+KINDS = ("FOOD", "SERVICE", "ROOM")
+LANES = ("new", "accepted", "free", "busy", "cleaning")
+REQUEST_LANES = {"NEW": "new", "ACCEPTED": "accepted"}
+
+MAX_FLOORS = 20
+MAX_GROUPS = 60
+
+
+class FilterError(ValueError):
+    pass
+
+
+def _values(raw):
+    """List from a JSON list, a comma string or parse_qs / QueryDict values."""
+    if raw is None:
+        return []
+    if isinstance(raw, str):
+        raw = [raw]
+    out = []
+    for v in raw:
+        out.extend(p.strip() for p in str(v).split(",") if p.strip())
+    return out
+
+
+def parse_filter(data):
+    """
+    Normalize a subscribe message or query dict into
+    {"floors": set|None, "kinds": set|None, "lanes": set|None}.
+    Returns None when nothing is filtered (= full board).
+    """
+    get = data.get
+    floors = _values(get("floors"))
+    kinds = [k.upper() for k in _values(get("kinds"))]
+    lanes = [l.lower() for l in _values(get("lanes"))]
+
+    if len(floors) > MAX_FLOORS or any(len(f) > 10 for f in floors):
+        raise FilterError("bad_floors")
+    if any(k not in KINDS for k in kinds):
+        raise FilterError("bad_kinds")
+    if any(l not in LANES for l in lanes):
+        raise FilterError("bad_lanes")
+
+    flt = {
+        "floors": set(floors) or None,
+        "kinds": set(kinds) or None,
+        "lanes": set(lanes) or None,
+    }
+    if not any(flt.values()):
+        return None
+    if len(subscription_groups(0, flt)) > MAX_GROUPS + 1:
+        raise FilterError("too_many_combinations")
+    return flt
+
+
+def describe(flt):
+    """JSON-friendly echo of a filter (sorted lists, None = all)."""
+    if not flt:
+        return None
+    return {k: sorted(v) if v else None for k, v in flt.items()}
+
+
+# -----------------------------
+# Group names
+# -----------------------------
+def _floor_token(floor):
+    # floors are free text; hex keeps group names within [a-z0-9._-]
+    return "f" + (floor or "").encode().hex()
+
+
+def sub_group(hotel_id, floor_token, kind_token, lane_token):
+    return f"{hotel_group(hotel_id)}.{floor_token}.{kind_token}.{lane_token}"
+
+
+def counters_group(hotel_id):
+    return f"{hotel_group(hotel_id)}.counters"
+
+
+def subscription_groups(hotel_id, flt):
+    """Groups a filtered client joins (sub-groups + counters)."""
+    floors = [_floor_token(f) for f in sorted(flt["floors"])] if flt["floors"] else [ANY]
+    kinds = [k.lower() for k in sorted(flt["kinds"])] if flt["kinds"] else [ANY]
+    lanes = sorted(flt["lanes"]) if flt["lanes"] else [ANY]
+    groups = [sub_group(hotel_id, *combo) for combo in product(floors, kinds, lanes)]
+    groups.append(counters_group(hotel_id))
+    return groups
+
+
+def _filtered_key(hotel_id):
+    return f"live_filtered:{hotel_id}"
+
+
+async def filtered_joined(hotel_id):
+    await cache.aadd(_filtered_key(hotel_id), 0, None)
+    await cache.aincr(_filtered_key(hotel_id))
+
+
+async def filtered_left(hotel_id):
+    try:
+        await cache.adecr(_filtered_key(hotel_id))
+    except ValueError:  # evicted / cache cleared: nothing to undo
+        pass
+
+
+def has_filtered_subscribers(hotel_id):
+    return (cache.get(_filtered_key(hotel_id)) or 0) > 0
+
+
+def event_groups(hotel_id, floor, kind, lanes):
+    """
+    Sub-groups a delta must reach: every mix of its exact value and "any"
+    for floor and kind, over each lane it leaves or enters.
+    """
+    groups = set()
+    for lane in filter(None, lanes):
+        for combo in product(
+            (_floor_token(floor), ANY),
+            (kind.lower(), ANY),
+            (lane, ANY),
+        ):
+            groups.add(sub_group(hotel_id, *combo))
+    return groups
+
+
+def request_event_groups(req, prev_status=None):
+    lanes = {REQUEST_LANES.get(req.status), REQUEST_LANES.get(prev_status)}
+    floor = req.room.floor if req.room_id else ""
+    return event_groups(req.hotel_id, floor, req.kind, lanes)
+
+
+def room_event_groups(room, prev_status=None):
+    lanes = {(room.status or "").lower(), (prev_status or "").lower()}
+    return event_groups(room.hotel_id, room.floor, "ROOM", lanes & set(LANES))
+
+
+# -----------------------------
+# Snapshots
+# -----------------------------
+def filter_snapshot(payload, flt):
+    """
+    Cut a (shared, cached) board_state down to what the filter matches.
+    Never mutates ``payload``.
+    """
+    if not flt:
+        return payload
+
+    data = payload["data"]
+    lanes = flt["lanes"]
+
+    def lane_rows(name, rows, ok):
+        if lanes and name not in lanes:
+            return []
+        return [r for r in rows if ok(r)]
+
+    rooms_ok = not flt["kinds"] or "ROOM" in flt["kinds"]
+
+    def room_ok(r):
+        return rooms_ok and (not flt["floors"] or (r.get("floor") or "") in flt["floors"])
+
+    def req_ok(r):
+        return (
+            (not flt["floors"] or r.get("floor", "") in flt["floors"])
+            and (not flt["kinds"] or r["kind"] in flt["kinds"])
+        )
+
+    return {
+        **payload,
+        "filter": describe(flt),
+        "data": {
+            "new": lane_rows("new", data["new"], req_ok),
+            "accepted": lane_rows("accepted", data["accepted"], req_ok),
+            "counts": data["counts"],
+            "rooms": {
+                lane: lane_rows(lane, data["rooms"][lane], room_ok)
+                for lane in ("free", "busy", "cleaning")
+            },
+        },
+    }
@@ -0,0 +1,179 @@
+# hotelportal/board_queries.py
+"""
+Board query layer: everything a board_state snapshot reads, in a fixed
+number of queries however many rooms and requests a hotel has.
+
+    request_lanes(hotel_id)  1 query   NEW + ACCEPTED lanes (window-ranked)
+    room_lanes(hotel_id)     1 query   FREE / BUSY / CLEANING, values() only
+    today_counts(hotel_id)   1 query   one aggregate over DailyRequestCounter
+
+hotel_id=None means every hotel.
+
+The platform-admin overview uses ``hotel_tiles`` instead: two grouped
+aggregates (requests, rooms) plus the hotel names, one small tile per
+hotel, never the rows themselves.
+"""
+from django.db.models import Case, Count, F, Min, Q, Sum, When, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from website.models import Hotel
+
+from .models import DailyRequestCounter, Request, Room
+
+LANE_LIMIT = 100
+
+# Only what serialize_requests reads (plus the hotel columns it prints)
+REQUEST_FIELDS = (
+    "id", "hotel_id", "room_id", "kind", "status", "subtotal", "note",
+    "created_at", "updated_at", "accepted_at", "completed_at", "cancelled_at",
+    "lines_summary", "item_count",
+    "room__number", "room__floor",
+    "hotel__name", "hotel__staff_whatsapp_group_code",
+)
+
+ROOM_FIELDS = (
+    "id", "number", "floor", "status",
+    "current_stay_id",
+    "current_stay__guest_name",
+    "current_stay__phone",
+    "current_stay__total_due",
+    "current_stay__is_paid",
+)
+
+
+def request_lanes(hotel_id, limit=LANE_LIMIT):
+    """
+    {"NEW": [...], "ACCEPTED": [...]} Request objects, newest first
+    (NEW by created_at, ACCEPTED by updated_at), at most ``limit`` each.
+    One query: ROW_NUMBER() per status, filtered on the window.
+    """
+    qs = Request.objects.filter(status__in=("NEW", "ACCEPTED"))
+    if hotel_id:
+        qs = qs.filter(hotel_id=hotel_id)
+
+    lane_time = Case(
+        When(status="NEW", then=F("created_at")),
+        default=F("updated_at"),
+    )
+    qs = (
+        qs.select_related("room", "hotel")
+        .only(*REQUEST_FIELDS)
+        .annotate(lane_rank=Window(
+            RowNumber(),
+            partition_by=[F("status")],
+            order_by=lane_time.desc(),
+        ))
+        .filter(lane_rank__lte=limit)
+        .order_by("lane_rank")
+    )
+
+    lanes = {"NEW": [], "ACCEPTED": []}
+    for r in qs:
+        lanes[r.status].append(r)
+    return lanes
+
+
+def room_lanes(hotel_id):
+    """
+    {"free": [...], "busy": [...], "cleaning": [...]} board room dicts
+    (same shape as serialize_rooms), ordered by floor, number.
+    """
+    qs = Room.objects.all()
+    if hotel_id:
+        qs = qs.filter(hotel_id=hotel_id)
+
+    lanes = {"free": [], "busy": [], "cleaning": []}
+    for row in qs.order_by("floor", "number").values(*ROOM_FIELDS):
+        lane = lanes.get((row["status"] or "").lower())
+        if lane is None:
+            continue
+        has_stay = row["current_stay_id"] is not None
+        lane.append({
+            "id": row["id"],
+            "number": row["number"],
+            "floor": row["floor"],
+            "status": row["status"],
+            "guest_name": row["current_stay__guest_name"] if has_stay else "",
+            "guest_phone": row["current_stay__phone"] if has_stay else "",
+            "stay_id": row["current_stay_id"],
+            "total_due": float(row["current_stay__total_due"] or 0) if has_stay else 0.0,
+            "is_paid": bool(row["current_stay__is_paid"]) if has_stay else False,
+        })
+    return lanes
+
+
+def today_counts(hotel_id):
+    """
+    completed_today / cancelled_today from DailyRequestCounter: one row
+    per hotel, whatever the size of its Request history.
+    """
+    qs = DailyRequestCounter.objects.filter(day=timezone.localdate())
+    if hotel_id:
+        qs = qs.filter(hotel_id=hotel_id)
+    agg = qs.aggregate(completed=Sum("completed"), cancelled=Sum("cancelled"))
+    return {
+        "completed_today": agg["completed"] or 0,
+        "cancelled_today": agg["cancelled"] or 0,
+    }
+
+
+def hotel_tiles(hotel_ids=None):
+    """
+    Overview tiles {hotel_id: tile} for the given hotels (None = every
+    active hotel):
+
+        {"hotel_id", "name", "new", "accepted", "oldest_new_at",
+         "rooms": {"free", "busy", "cleaning"}}
+    """
+    hotels = Hotel.objects.all()
+    if hotel_ids is None:
+        hotels = hotels.filter(status="ACTIVE")
+    else:
+        hotels = hotels.filter(id__in=hotel_ids)
+
+    tiles = {
+        h["id"]: {
+            "hotel_id": h["id"],
+            "name": h["name"],
+            "new": 0,
+            "accepted": 0,
+            "oldest_new_at": None,
+            "rooms": {"free": 0, "busy": 0, "cleaning": 0},
+        }
+        for h in hotels.order_by("name").values("id", "name")
+    }
+    if not tiles:
+        return tiles
+
+    req_rows = (
+        Request.objects.filter(hotel_id__in=tiles, status__in=("NEW", "ACCEPTED"))
+        .values("hotel_id")
+        .annotate(
+            new=Count("id", filter=Q(status="NEW")),
+            accepted=Count("id", filter=Q(status="ACCEPTED")),
+            oldest_new_at=Min("created_at", filter=Q(status="NEW")),
+        )
+        .order_by()
+    )
+    for row in req_rows:
+        tile = tiles[row["hotel_id"]]
+        tile["new"] = row["new"]
+        tile["accepted"] = row["accepted"]
+        tile["oldest_new_at"] = row["oldest_new_at"].isoformat() if row["oldest_new_at"] else None
+
+    room_rows = (
+        Room.objects.filter(hotel_id__in=tiles)
+        .values("hotel_id")
+        .annotate(
+            free=Count("id", filter=Q(status="FREE")),
+            busy=Count("id", filter=Q(status="BUSY")),
+            cleaning=Count("id", filter=Q(status="CLEANING")),
+        )
+        .order_by()
+    )
+    for row in room_rows:
+        tiles[row["hotel_id"]]["rooms"] = {
+            "free": row["free"], "busy": row["busy"], "cleaning": row["cleaning"],
+        }
+    return tiles
@@ -0,0 +1,66 @@
+# hotelportal/board_replay.py
+"""
+Replay buffer for the live board: the last LIVE_BOARD_REPLAY_SIZE deltas
+of each hotel, kept in the cache so a reconnecting screen can catch up
+without a full board_state.
+
+Every delta is stored (after commit, by _publish_delta) in the slot
+``live_delta:<hotel>:<version % size>`` together with the groups it was
+published to. Versions are unique per hotel, so each slot has exactly one
+writer and there is no read-modify-write on a shared list.
+
+A client that comes back with the last version it applied gets
+
+    the deltas version+1 .. current   when every one of them is still here
+    None                              otherwise (too far behind, evicted,
+                                      another process' locmem cache, ...)
+
+and the caller falls back to the (cached) snapshot, see board.board_resume.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+
+def replay_size():
+    return getattr(settings, "LIVE_BOARD_REPLAY_SIZE", 200)
+
+
+def _slot_key(hotel_id, version):
+    return f"live_delta:{hotel_id}:{version % replay_size()}"
+
+
+def remember_delta(hotel_id, payload, groups):
+    """Store one published delta (payload carries its version)."""
+    cache.set(
+        _slot_key(hotel_id, payload["version"]),
+        {"payload": payload, "groups": list(groups)},
+        getattr(settings, "LIVE_BOARD_REPLAY_TIMEOUT", 900),
+    )
+
+
+def missed_deltas(hotel_id, since, current, groups=None):
+    """
+    Payloads of versions since+1 .. current, in order, or None when the
+    buffer can't cover that range. With ``groups`` (a filtered screen's
+    sub-groups) only the deltas published to one of them are returned.
+    """
+    if since is None or since < 0 or since > current:
+        return None
+    if current - since > replay_size():
+        return None
+    if current == since:
+        return []
+
+    versions = range(since + 1, current + 1)
+    keys = {v: _slot_key(hotel_id, v) for v in versions}
+    found = cache.get_many(list(keys.values()))
+
+    wanted = set(groups) if groups else None
+    out = []
+    for v in versions:
+        entry = found.get(keys[v])
+        if not entry or entry["payload"].get("version") != v:
+            return None  # evicted, overwritten by a newer lap, or never stored
+        if wanted is None or wanted.intersection(entry["groups"]):
+            out.append(entry["payload"])
+    return out
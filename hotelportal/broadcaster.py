@@ -0,0 +1,235 @@
+# hotelportal/broadcaster.py
+"""
+Coalescing live-board broadcaster.
+
+Views call ``live_broadcaster.mark_dirty(hotel_id)`` after a change and
+return straight away. The first signal for a hotel arms a short timer
+(``LIVE_BOARD_BROADCAST_WINDOW`` seconds); every further signal inside
+that window is merged into the same flush, which builds ONE overview tile
+(open requests, oldest NEW, room counts) per hotel and sends it to the
+platform-admin group ``hotel_portal_live_all``. Per-hotel board sockets are
+kept current by the small deltas sent through ``publish()`` (see
+hotelportal/board.py), which go out immediately and in order.
+
+The flush runs as an asyncio task on the ASGI server's event loop when the
+caller is a sync view running under Daphne (so the channel layer is used
+from the loop that owns it), otherwise on a private background loop.
+
+Group names (one scheme, all defined here):
+
+    hotel_portal_live_<hotel_id>[.<filter>]   staff board sockets / SSE
+    hotel_portal_live_all                     platform overview tiles
+    hotel_portal_kitchen_<hotel_id>           kitchen screens
+    hotel_portal_guest_<stay_id>              guest request stream
+    hotel_portal_events                       staff WhatsApp bot (outbox)
+
+Everything published inside ``live_broadcaster.event(name)`` (including
+what is deferred with ``live_broadcaster.on_commit``) is counted under
+that domain event; see hotelportal/realtime.py and ``event_stats()``.
+"""
+import asyncio
+import contextlib
+import contextvars
+import functools
+import logging
+import threading
+from collections import defaultdict
+
+from asgiref.sync import SyncToAsync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+ALL_HOTELS_GROUP = "hotel_portal_live_all"
+EVENTS_GROUP = "hotel_portal_events"
+
+# Domain event being published on this thread / task (for the counters)
+_current_event = contextvars.ContextVar("live_event", default="other")
+
+
+def hotel_group(hotel_id):
+    return f"hotel_portal_live_{hotel_id}"
+
+
+def kitchen_group(hotel_id):
+    return f"hotel_portal_kitchen_{hotel_id}"
+
+
+def guest_stay_group(stay_id):
+    return f"hotel_portal_guest_{stay_id}"
+
+
+class LiveBoardBroadcaster:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = set()      # hotel ids waiting for the next flush (None = platform)
+        self._armed = False
+        self._loop = None          # private loop, only used outside ASGI
+        self._tails = {}           # loop -> last queued publish task (keeps order)
+        self._stats = {"signals": 0, "merged": 0, "flushes": 0, "builds": 0, "errors": 0}
+        self._events = defaultdict(lambda: {"events": 0, "messages": 0})
+
+    @property
+    def window(self):
+        return float(getattr(settings, "LIVE_BOARD_BROADCAST_WINDOW", 0.5))
+
+    # -----------------------------
+    # Public API (any thread)
+    # -----------------------------
+    def mark_dirty(self, hotel_id):
+        """
+        Record that this hotel's board changed. Never blocks on the DB or
+        the channel layer.
+        """
+        with self._lock:
+            self._stats["signals"] += 1
+            if hotel_id in self._pending:
+                self._stats["merged"] += 1
+            self._pending.add(hotel_id)
+            if self._armed:
+                return
+            self._armed = True
+
+        # Fresh context: the flush task must not inherit the calling view's
+        # asgiref executor state (it would deadlock on the sync thread).
+        loop = self._target_loop()
+        loop.call_soon_threadsafe(self._arm, loop, context=contextvars.Context())
+
+    @contextlib.contextmanager
+    def event(self, name):
+        """Count one ``name`` event and every message published for it."""
+        with self._lock:
+            self._events[name]["events"] += 1
+        token = _current_event.set(name)
+        try:
+            yield
+        finally:
+            _current_event.reset(token)
+
+    def on_commit(self, fn):
+        """``transaction.on_commit`` that keeps the current event for the counters."""
+        ctx = contextvars.copy_context()
+        transaction.on_commit(lambda: ctx.run(fn))
+
+    def publish(self, group, message):
+        """
+        Queue one group_send and return immediately. Messages published
+        from the same process are delivered in the order they were queued.
+        """
+        with self._lock:
+            self._events[_current_event.get()]["messages"] += 1
+        loop = self._target_loop()
+        loop.call_soon_threadsafe(
+            self._enqueue, loop, group, message, context=contextvars.Context()
+        )
+
+    def stats(self):
+        """
+        Counters since process start. ``merged`` is the number of snapshot
+        builds saved by folding a signal into an already pending flush.
+        Platform admins see them at live/stats/ (views_live.live_stats).
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def event_stats(self):
+        """Per domain event: how many happened and how many group messages they fanned out to."""
+        with self._lock:
+            return {name: dict(counts) for name, counts in self._events.items()}
+
+    # -----------------------------
+    # Event-loop side
+    # -----------------------------
+    def _arm(self, loop):
+        loop.call_later(self.window, lambda: loop.create_task(self._flush()))
+
+    def _enqueue(self, loop, group, message):
+        prev = self._tails.get(loop)
+        task = loop.create_task(self._send(prev, group, message))
+        self._tails[loop] = task
+        task.add_done_callback(functools.partial(self._forget, loop))
+
+    def _forget(self, loop, task):
+        if self._tails.get(loop) is task:
+            del self._tails[loop]
+
+    async def _send(self, prev, group, message):
+        if prev is not None:
+            await asyncio.wait([prev])
+        layer = get_channel_layer()
+        if not layer:
+            return
+        try:
+            await layer.group_send(group, message)
+        except Exception:
+            logger.exception("live board publish to %s failed", group)
+
+    async def _flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, set()
+            self._armed = False
+            self._stats["flushes"] += 1
+
+        layer = get_channel_layer()
+        if not layer:
+            return  # channel layer misconfigured or disabled
+
+        from .board import build_overview_payload, get_hotel_tile
+
+        for hotel_id in batch:
+            try:
+                # Platform overview: one tile per changed hotel
+                # (None = change without a hotel → all tiles again)
+                if hotel_id is None:
+                    payload = await database_sync_to_async(build_overview_payload)()
+                else:
+                    tile = await database_sync_to_async(get_hotel_tile)(hotel_id)
+                    if tile is None:
+                        continue
+                    payload = {"type": "hotel_tile", "tile": tile}
+                await layer.group_send(
+                    ALL_HOTELS_GROUP, {"type": "board.push", "payload": payload}
+                )
+            except Exception:
+                logger.exception("live board broadcast failed for hotel %s", hotel_id)
+                with self._lock:
+                    self._stats["errors"] += 1
+                continue
+
+            with self._lock:
+                self._stats["builds"] += 1
+
+        logger.debug("live board flush: %s, events: %s", self.stats(), self.event_stats())
+
+    def _target_loop(self):
+        # Already inside a running loop (async consumer / async view)
+        try:
+            return asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+
+        # Sync view under Daphne: asgiref records the server loop on the
+        # worker thread's threadlocal (the same lookup async_to_sync does).
+        loop = getattr(SyncToAsync.threadlocal, "main_event_loop", None)
+        if loop is not None and loop.is_running():
+            return loop
+
+        return self._background_loop()
+
+    def _background_loop(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever,
+                    name="live-board-broadcaster",
+                    daemon=True,
+                ).start()
+                self._loop = loop
+            return self._loop
+
+
+live_broadcaster = LiveBoardBroadcaster()
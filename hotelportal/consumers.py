@@ -1,15 +1,46 @@
 # hotelportal/consumers.py
+import asyncio
+import logging
+
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
-from asgiref.sync import sync_to_async
-from django.utils import timezone
 
 from urllib.parse import parse_qs          # 14.1A
 from django.conf import settings          # 14.1A
 
-from .models import Request, Room
+from website.models import Hotel
+
+from .board import (
+    board_resume,
+    build_overview_payload,
+    current_board_version,
+    get_board_snapshot,
+)
+from .broadcaster import ALL_HOTELS_GROUP, hotel_group
+from .board_encoding import encode_frame, header, hotel_header, negotiate
+from .board_filters import (
+    FilterError,
+    filter_snapshot,
+    filtered_joined,
+    filtered_left,
+    parse_filter,
+    subscription_groups,
+)
+from .outbox import (
+    EVENTS_GROUP,
+    REPLAY_BATCH,
+    ack_cursor,
+    event_message,
+    events_after,
+    get_cursor,
+)
+from .live_db import live_db
+from .send_queue import SendQueue, count as count_send_stat
+from .singleflight import board_snapshots
 
 import os
 
+logger = logging.getLogger(__name__)
+
 
 
 
@@ -26,21 +57,40 @@ class HotelLiveConsumer(AsyncJsonWebsocketConsumer):
     Live board WebSocket for hotel portal.
 
     Modes:
-    - Browser mode: authenticated HOTEL_ADMIN/STAFF/PLATFORM_ADMIN, bound to one hotel.
-    - Bot mode: external script connects with ?bot_key=... and listens to ALL hotels
-      in group "hotel_portal_live_all".
+    - Browser mode: authenticated HOTEL_ADMIN/STAFF, bound to one hotel.
+      May narrow the board to floors / kinds / lanes ("subscribe", see board_filters).
+      Reconnects with ?version=N (last applied) get only the missed deltas
+      from the replay buffer, or a snapshot if they fell too far behind.
+      Fan-out goes through a per-socket SendQueue (send_queue.py) and the
+      socket is pinged; clients answer {"type": "pong"} or get reaped.
+    - Platform mode: PLATFORM_ADMIN gets per-hotel overview tiles
+      (overview_state, then hotel_tile updates) and loads one hotel's full
+      board only on drill-down.
+    - Bot mode: external script connects with ?bot_key=... and gets the request
+      event outbox for ALL hotels (group "hotel_portal_events"), replayed from
+      ?cursor=... or its last acknowledged cursor, then streamed live.
+
+    Wire format: JSON by default; a client may negotiate the compact /
+    deflate / msgpack encodings with a subprotocol or ?enc= (board_encoding).
     """
 
+    encoding = "json"
+
     async def connect(self):
         # Default flags
         self.is_bot = False
+        self.is_platform = False
         self.hotel_id = None
+        self.wire_hotel = None  # compact board_state header (board_encoding)
 
         # -------------------------
         # Try BOT mode first (query param ?bot_key=...)
         # -------------------------
         raw_qs = self.scope.get("query_string", b"").decode()  # e.g. "bot_key=abc"
         params = parse_qs(raw_qs)
+        self.encoding, subprotocol = negotiate(
+            self.scope.get("subprotocols"), (params.get("enc") or [None])[0]
+        )
         bot_key = (params.get("bot_key") or [None])[0]
 
         # You can later move this to env var; for now we hard-match what script uses
@@ -50,20 +100,22 @@ class HotelLiveConsumer(AsyncJsonWebsocketConsumer):
         )
 
         if bot_key and bot_key == expected_key:
-            # ✅ BOT MODE
+            # ✅ BOT MODE — cursor-based event feed, no board snapshots
             self.is_bot = True
-            # Bot listens to ALL hotels at once
-            self.group_name = "hotel_portal_live_all"
+            self.bot_name = (params.get("bot_name") or ["staff_bot"])[0][:50]
+            self.group_name = EVENTS_GROUP
 
+            # Join first: live events queue up while we replay and are
+            # de-duplicated against sent_cursor afterwards.
             await self.channel_layer.group_add(self.group_name, self.channel_name)
-            await self.accept()
-
-            # Send initial board snapshot
-            data = await self._build_board_state()
-            await self.send_json({
-                "type": "board_state",
-                "data": data,
-            })
+            await self.accept(subprotocol)
+
+            cursor = (params.get("cursor") or [""])[0]
+            if cursor.isdigit():
+                cursor = int(cursor)
+            else:
+                cursor = await live_db(get_cursor)(self.bot_name)
+            await self._replay_events(cursor)
             return
 
         # -------------------------
@@ -80,120 +132,251 @@ class HotelLiveConsumer(AsyncJsonWebsocketConsumer):
             return
 
         # Get hotel safely
-        hotel = await sync_to_async(
-            lambda u: getattr(u, "hotel", None),
-            thread_sensitive=True
-        )(user)
+        hotel = await live_db(lambda u: getattr(u, "hotel", None))(user)
 
         if hotel is None and role != "PLATFORM_ADMIN":
             # Staff/Admin must be tied to a hotel
             await self.close()
             return
 
-        self.hotel_id = hotel.id if hotel else None
-
-        # Group per hotel; PLATFORM_ADMIN sees all
+        # PLATFORM_ADMIN: overview tiles of every hotel, or ONE hotel's board
+        # after a drill-down (?hotel=N on connect, or {"type": "drill_down"}).
+        self.is_platform = hotel is None
+        if self.is_platform:
+            hotel = await self._existing_hotel((params.get("hotel") or [None])[0])
+        self._set_hotel(hotel)
+
+        # Optional filter straight from the URL (?floors=3,4&kinds=FOOD&lanes=new)
+        # so a narrow screen never gets the full board, not even once.
+        self.board_filter = None
+        self.groups_joined = []
+        self.counted_filtered = False  # in board_filters' per-hotel count
+        self.missed_pongs = 0
+        self._out = SendQueue(
+            self.send_json,
+            self._send_board_state,
+            getattr(settings, "LIVE_SEND_QUEUE_MAX", 50),
+        )
         if self.hotel_id:
-            self.group_name = f"hotel_portal_live_{self.hotel_id}"
+            try:
+                self.board_filter = parse_filter(params)
+            except FilterError:
+                self.board_filter = None
+
+        await self._join_board_groups()
+        await self.accept(subprotocol)
+        self._heartbeat = asyncio.ensure_future(self._heartbeat_loop())
+        if header(self.encoding):
+            await self.send_json(header(self.encoding))
+
+        # Initial board state (or overview_state for the platform view);
+        # a reconnect that says where it left off only gets what it missed.
+        since = (params.get("version") or [""])[0]
+        if self.hotel_id and since.isdigit():
+            await self._resume_board(int(since))
         else:
-            self.group_name = "hotel_portal_live_all"
+            await self._send_board_state()
 
-        await self.channel_layer.group_add(self.group_name, self.channel_name)
-        await self.accept()
+    async def receive_json(self, content, **kwargs):
+        """
+        Client -> server messages.
+          {"type": "resume", "version": N}   board: missed deltas after N (or a snapshot)
+          {"type": "snapshot_request"}       board: full snapshot
+          {"type": "pong", "seq": N}         board: heartbeat answer
+          {"type": "ack", "cursor": N}       bot: events up to N are processed
+          {"type": "resume", "cursor": N}    bot: replay everything after N
+        """
+        msg_type = (content or {}).get("type")
+
+        if self.is_bot:
+            try:
+                cursor = int(content.get("cursor"))
+            except (TypeError, ValueError):
+                return
+            if msg_type == "ack":
+                await live_db(ack_cursor)(self.bot_name, cursor)
+            elif msg_type == "resume":
+                await self._replay_events(cursor)
+            return
 
-        # Initial board state
-        data = await self._build_board_state()
-        await self.send_json({
-            "type": "board_state",
-            "data": data,
-        })
+        if msg_type == "pong":
+            self.missed_pongs = 0
+            self._out.resume()
+        elif msg_type == "resume" and self.hotel_id:
+            try:
+                since = int(content.get("version"))
+            except (TypeError, ValueError):
+                since = None
+            await self._resume_board(since)
+        elif msg_type in ("snapshot_request", "resume"):
+            await self._send_board_state()
+        elif msg_type in ("drill_down", "drill_up") and self.is_platform:
+            # {"type": "drill_down", "hotel_id": 8}  /  {"type": "drill_up"}
+            hotel = None
+            if msg_type == "drill_down":
+                hotel = await self._existing_hotel(content.get("hotel_id"))
+                if not hotel:
+                    await self.send_json({"type": "error", "error": "unknown_hotel"})
+                    return
+            self._set_hotel(hotel)
+            self.board_filter = None
+            self._out.clear()
+            await self._join_board_groups()
+            await self._send_board_state()
+        elif msg_type == "subscribe":
+            # {"type": "subscribe", "floors": [...], "kinds": [...], "lanes": [...]}
+            if not self.hotel_id:
+                await self.send_json({"type": "error", "error": "filters_need_hotel"})
+                return
+            try:
+                self.board_filter = parse_filter(content)
+            except FilterError as e:
+                await self.send_json({"type": "error", "error": str(e)})
+                return
+            self._out.clear()
+            await self._join_board_groups()
+            await self._send_board_state()
+
+    async def send_json(self, content, close=False):
+        """Every outgoing message, in the socket's negotiated encoding."""
+        text_data, bytes_data = encode_frame(content, self.encoding, self.wire_hotel)
+        await self.send(text_data=text_data, bytes_data=bytes_data, close=close)
 
     async def disconnect(self, close_code):
-        if hasattr(self, "group_name"):
-            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        if getattr(self, "_heartbeat", None) is not None:
+            self._heartbeat.cancel()
+        if getattr(self, "_out", None) is not None:
+            self._out.close()
+        for group in getattr(self, "groups_joined", None) or [getattr(self, "group_name", None)]:
+            if group:
+                await self.channel_layer.group_discard(group, self.channel_name)
+        if getattr(self, "counted_filtered", False):
+            await filtered_left(self.hotel_id)
+
+    async def _join_board_groups(self):
+        """Full hotel group, or the filter's sub-groups; leaves the rest."""
+        if self.board_filter:
+            wanted = subscription_groups(self.hotel_id, self.board_filter)
+            if not self.counted_filtered:  # counted in before joining
+                await filtered_joined(self.hotel_id)
+                self.counted_filtered = True
+        elif self.hotel_id:
+            wanted = [hotel_group(self.hotel_id)]
+        else:
+            wanted = [ALL_HOTELS_GROUP]
+        for group in set(self.groups_joined) - set(wanted):
+            await self.channel_layer.group_discard(group, self.channel_name)
+        for group in wanted:
+            if group not in self.groups_joined:
+                await self.channel_layer.group_add(group, self.channel_name)
+        self.groups_joined = wanted
+        if self.counted_filtered and not self.board_filter:  # counted out after leaving
+            await filtered_left(self.hotel_id)
+            self.counted_filtered = False
+        self.joined_at = asyncio.get_running_loop().time()
 
     # === Group event handler ===
     async def board_push(self, event):
         """
         Called when views send group_send with type="board.push".
-        Forwards payload as JSON to browser/bot.
+        Queues the payload on this socket's SendQueue (bounded, coalescing).
         """
         payload = event.get("payload") or {}
-        await self.send_json(payload)
-
-    # === Internal: build board snapshot (same shape as live_poll) ===
-    @sync_to_async
-    def _build_board_state(self):
-        hotel_id = self.hotel_id  # None => all hotels
-
-        qs = Request.objects.all().select_related("room", "hotel").prefetch_related("lines")
-        room_qs = Room.objects.all().select_related("current_stay")
-
-        if hotel_id:
-            qs = qs.filter(hotel_id=hotel_id)
-            room_qs = room_qs.filter(hotel_id=hotel_id)
-
-        new_qs = qs.filter(status="NEW").order_by("-created_at")[:100]
-        acc_qs = qs.filter(status="ACCEPTED").order_by("-updated_at")[:100]
-
-        today = timezone.localdate()
-        counts = {
-            "completed_today": qs.filter(status="COMPLETED", completed_at__date=today).count(),
-            "cancelled_today": qs.filter(status="CANCELLED", cancelled_at__date=today).count(),
-        }
-
-        def _serialize_requests_inner(qs_):
-            out = []
-            for r in qs_:
-                h = getattr(r, "hotel", None)
-                out.append({
-                    "id": r.id,
-                    "room": r.room.number if r.room else "",
-                    "kind": r.kind,
-                    "status": r.status,
-                    "subtotal": float(r.subtotal or 0),
-                    "created_at": r.created_at.isoformat(),
-                    "accepted_at": r.accepted_at.isoformat() if r.accepted_at else None,
-                    "completed_at": r.completed_at.isoformat() if r.completed_at else None,
-                    "cancelled_at": r.cancelled_at.isoformat() if r.cancelled_at else None,
-                    "note": r.note or "",
-                    "lines": [
-                        {
-                            "name": ln.name_snapshot,
-                            "qty": ln.qty,
-                        } for ln in r.lines.all()
-                    ],
-                    "hotel_id": h.id if h else None,
-                    "hotel_name": h.name if h else "",
-                })
-            return out
-
-        def _serialize_rooms_inner(qs_):
-            out = []
-            for rm in qs_:
-                st = rm.current_stay
-                out.append({
-                    "id": rm.id,
-                    "number": rm.number,
-                    "floor": rm.floor,
-                    "status": rm.status,  # FREE / BUSY / CLEANING
-                    "guest_name": st.guest_name if st else "",
-                    "guest_phone": st.phone if st else "",
-                })
-            return out
-
-        room_qs = room_qs.order_by("floor", "number")
-        free_rooms = [r for r in room_qs if r.status == "FREE"]
-        busy_rooms = [r for r in room_qs if r.status == "BUSY"]
-        cleaning_rooms = [r for r in room_qs if r.status == "CLEANING"]
-
-        return {
-            "new": _serialize_requests_inner(new_qs),
-            "accepted": _serialize_requests_inner(acc_qs),
-            "counts": counts,
-            "rooms": {
-                "free": _serialize_rooms_inner(free_rooms),
-                "busy": _serialize_rooms_inner(busy_rooms),
-                "cleaning": _serialize_rooms_inner(cleaning_rooms),
-            }
-        }
+        self._out.put(payload)
+
+    async def _heartbeat_loop(self):
+        """
+        {"type": "ping"} every LIVE_PING_INTERVAL seconds. One unanswered
+        ping pauses the fan-out (slow client: its backlog coalesces in the
+        SendQueue); LIVE_PING_MISSES unanswered pings close the socket,
+        which drops it from its groups.
+        """
+        interval = getattr(settings, "LIVE_PING_INTERVAL", 20)
+        misses = getattr(settings, "LIVE_PING_MISSES", 2)
+        seq = 0
+        while True:
+            await asyncio.sleep(interval)
+            if self.missed_pongs >= misses:
+                count_send_stat("reaped")
+                logger.info("live socket reaped after %s missed pings (hotel %s)", misses, self.hotel_id)
+                await self.close(code=4408)
+                return
+            if self.missed_pongs:
+                self._out.pause()
+            self.missed_pongs += 1
+            seq += 1
+            await self.send_json({"type": "ping", "seq": seq})
+
+    async def outbox_event(self, event):
+        """
+        Called for group_send type="outbox.event" (bot mode). Skips anything
+        the replay already delivered.
+        """
+        message = event.get("message") or {}
+        if message.get("cursor", 0) <= self.sent_cursor:
+            return
+        self.sent_cursor = message["cursor"]
+        await self.send_json(message)
+
+    async def _replay_events(self, cursor):
+        self.sent_cursor = cursor
+        while True:
+            batch = await live_db(events_after)(self.sent_cursor)
+            for ev in batch:
+                await self.send_json(event_message(ev))
+                self.sent_cursor = ev.seq
+            if len(batch) < REPLAY_BATCH:
+                break
+
+    # === Internal: shared board snapshot (same one live_board / live_poll serve) ===
+    async def _send_board_state(self):
+        """
+        board_state (or overview_state). Concurrent connects for the same
+        hotel share one in-flight build (single-flight) instead of queueing
+        one each; different hotels build side by side on the live_db pool.
+        """
+        if not self.hotel_id:
+            overview, _ = await board_snapshots.run("overview", live_db(build_overview_payload))
+            await self._send_direct(overview)
+            return
+
+        hotel_id = self.hotel_id
+        snapshot, started_at = await board_snapshots.run(
+            hotel_id, lambda: live_db(get_board_snapshot)(hotel_id)
+        )
+        await self._send_direct(filter_snapshot(snapshot, self.board_filter))
+        if started_at < self.joined_at:
+            # That build began before we joined the groups: a delta published
+            # in between would never reach us. One shared version read tells.
+            current, _ = await board_snapshots.run(
+                ("version", hotel_id),
+                lambda: live_db(current_board_version)(hotel_id),
+                not_before=self.joined_at,
+            )
+            if current > snapshot["version"]:
+                await self._resume_board(snapshot["version"])
+
+    async def _resume_board(self, since):
+        # Joined the groups already: anything published meanwhile is queued
+        # behind these and dropped client-side by its version.
+        for message in await live_db(board_resume)(self.hotel_id, since, self.board_filter):
+            await self._send_direct(message)
+
+    async def _send_direct(self, message):
+        """Send now, past the queue; drops whatever this makes redundant there."""
+        await self.send_json(message)
+        self._out.covered(message)
+
+    def _set_hotel(self, hotel):
+        """The hotel whose board this socket shows (None: overview)."""
+        self.hotel_id = hotel.id if hotel else None
+        self.wire_hotel = hotel_header(hotel) if hotel else None
+
+    async def _existing_hotel(self, raw):
+        try:
+            hotel_id = int(raw)
+        except (TypeError, ValueError):
+            return None
+        return await live_db(
+            Hotel.objects.filter(id=hotel_id).only("id", "name", "staff_whatsapp_group_code").first
+        )()
@@ -0,0 +1,133 @@
+# hotelportal/kitchen.py
+"""
+Kitchen prep queue: open FOOD quantities summed per item, maintained
+incrementally in KitchenQueueItem.
+
+    realtime.request_created        → kitchen_add_request(req, lines)   (+qty per item)
+    realtime.request_status_changed → kitchen_remove_request(req)       (-qty on complete/cancel)
+
+Both run inside the caller's transaction and, after commit, push ONE
+small message to ``hotel_portal_kitchen_<hotel_id>``:
+
+    {"type": "kitchen_update", "items": [<row>, ...], "removed": [item_id, ...]}
+
+Kitchen screens open with {"type": "kitchen_state", "items": [...]} (one
+query on the aggregate table, never on RequestLine).
+"""
+from django.db.models import F, Min
+from django.utils import timezone
+
+from .broadcaster import kitchen_group, live_broadcaster
+from .models import KitchenQueueItem, RequestLine
+
+OPEN_STATUSES = ("NEW", "ACCEPTED")
+
+
+def _row(obj):
+    return {
+        "item_id": obj["item_id"],
+        "name": obj["name"],
+        "qty": obj["qty"],
+        "tickets": obj["tickets"],
+        "oldest_at": obj["oldest_at"].isoformat() if obj["oldest_at"] else None,
+    }
+
+
+def kitchen_state(hotel_id):
+    rows = (
+        KitchenQueueItem.objects.filter(hotel_id=hotel_id, qty__gt=0)
+        .order_by("oldest_at", "name")
+        .values("item_id", "name", "qty", "tickets", "oldest_at")
+    )
+    return {"type": "kitchen_state", "items": [_row(r) for r in rows]}
+
+
+def _publish(hotel_id, item_ids):
+    """Read back the touched rows and push them once the transaction commits."""
+    rows = {
+        r["item_id"]: _row(r)
+        for r in KitchenQueueItem.objects.filter(hotel_id=hotel_id, item_id__in=item_ids)
+        .values("item_id", "name", "qty", "tickets", "oldest_at")
+    }
+    payload = {
+        "type": "kitchen_update",
+        "items": list(rows.values()),
+        "removed": [i for i in item_ids if i not in rows],
+    }
+    live_broadcaster.on_commit(
+        lambda: live_broadcaster.publish(
+            kitchen_group(hotel_id), {"type": "kitchen.push", "payload": payload}
+        )
+    )
+
+
+def kitchen_add_request(req, lines):
+    """+qty / +1 ticket per item for a just-created FOOD request."""
+    now = timezone.now()
+    item_ids = []
+    for ln in lines:
+        item_ids.append(ln.item_id)
+        updated = KitchenQueueItem.objects.filter(hotel_id=req.hotel_id, item_id=ln.item_id).update(
+            qty=F("qty") + ln.qty,
+            tickets=F("tickets") + 1,
+            name=ln.name_snapshot,
+            updated_at=now,
+        )
+        if updated:
+            continue
+        row, created = KitchenQueueItem.objects.get_or_create(
+            hotel_id=req.hotel_id,
+            item_id=ln.item_id,
+            defaults={
+                "name": ln.name_snapshot,
+                "qty": ln.qty,
+                "tickets": 1,
+                "oldest_at": req.created_at,
+            },
+        )
+        if not created:  # lost a race with another order for the same item
+            KitchenQueueItem.objects.filter(pk=row.pk).update(
+                qty=F("qty") + ln.qty, tickets=F("tickets") + 1, updated_at=now
+            )
+    if item_ids:
+        _publish(req.hotel_id, item_ids)
+
+
+def kitchen_remove_request(req):
+    """
+    -qty / -1 ticket per item for a FOOD request leaving NEW/ACCEPTED.
+    Call after req.status has been saved as COMPLETED / CANCELLED.
+    """
+    lines = list(RequestLine.objects.filter(request=req).values_list("item_id", "qty"))
+    if not lines:
+        return
+
+    now = timezone.now()
+    item_ids = [item_id for item_id, _ in lines]
+    for item_id, qty in lines:
+        KitchenQueueItem.objects.filter(hotel_id=req.hotel_id, item_id=item_id).update(
+            qty=F("qty") - qty, tickets=F("tickets") - 1, updated_at=now
+        )
+
+    queue = KitchenQueueItem.objects.filter(hotel_id=req.hotel_id, item_id__in=item_ids)
+    queue.filter(qty__lte=0).delete()
+
+    # Only if this request WAS the oldest ticket for an item, look up the
+    # next-oldest open one for just those items.
+    stale = list(
+        queue.filter(oldest_at__gte=req.created_at).values_list("item_id", flat=True)
+    )
+    if stale:
+        oldest = (
+            RequestLine.objects.filter(
+                item_id__in=stale,
+                request__hotel_id=req.hotel_id,
+                request__status__in=OPEN_STATUSES,
+            )
+            .values("item_id")
+            .annotate(oldest=Min("request__created_at"))
+        )
+        for row in oldest:
+            queue.filter(item_id=row["item_id"]).update(oldest_at=row["oldest"])
+
+    _publish(req.hotel_id, item_ids)
@@ -0,0 +1,43 @@
+# hotelportal/live_db.py
+"""
+Database access for live sockets / streams, off the shared sync thread.
+
+``sync_to_async`` (thread_sensitive=True) and Django 4.2's own async ORM
+methods (``aget``, ``acount`` ... are sync_to_async underneath) run every
+call on ONE thread per process, so a board build for one hotel blocks
+every other socket's connect. ``live_db(fn)`` runs ``fn`` on a small
+dedicated pool instead:
+
+    snapshot = await live_db(get_board_snapshot)(hotel_id)
+
+Each pool thread keeps its own connection; like channels'
+database_sync_to_async, stale / broken ones are closed before and after
+every call (CONN_MAX_AGE applies). Only use it for self-contained work: no
+open transaction, no request-bound state.
+
+LIVE_DB_THREADS = 0 falls back to the shared thread (bench_live_connect
+uses that to compare).
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+
+_pools = {}  # size -> executor
+
+
+def _pool():
+    size = getattr(settings, "LIVE_DB_THREADS", 8)
+    if not size:
+        return None
+    if size not in _pools:
+        _pools[size] = ThreadPoolExecutor(max_workers=size, thread_name_prefix="live-db")
+    return _pools[size]
+
+
+def live_db(fn):
+    """``fn`` as an awaitable running on the live DB pool."""
+    pool = _pool()
+    if pool is None:
+        return database_sync_to_async(fn)
+    return database_sync_to_async(fn, thread_sensitive=False, executor=pool)
@@ -0,0 +1,147 @@
+"""
+Management command: bench_board_encoding
+Compares live board wire sizes per encoding (board_encoding.py): the full
+board_state snapshot and a typical request / room delta, for a synthetic
+hotel of N rooms (default 300, nothing is written) or a real one.
+
+Usage:
+    python manage.py bench_board_encoding
+    python manage.py bench_board_encoding --rooms 300 --open-requests 90
+    python manage.py bench_board_encoding --hotel 8
+"""
+import json
+import random
+import time
+import zlib
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from hotelportal.board import build_board_payload
+from hotelportal.board_encoding import available, encode_frame, hotel_header
+from website.models import Hotel
+
+ENCODINGS = ("json", "compact", "deflate", "msgpack")
+
+
+SYNTHETIC_HOTEL = {
+    "hotel_id": 8,
+    "hotel_name": "Hotel Sea Breeze Residency",
+    "hotel_staff_group_code": "HSB-STAFF-GROUP-01",
+}
+
+
+def _synthetic_board(rooms, open_requests):
+    rnd = random.Random(7)
+    now = timezone.now()
+    lanes = {"free": [], "busy": [], "cleaning": []}
+    for i in range(rooms):
+        status = rnd.choices(("BUSY", "FREE", "CLEANING"), (6, 3, 1))[0]
+        busy = status == "BUSY"
+        lanes[status.lower()].append({
+            "id": 1000 + i,
+            "number": str(100 * (1 + i // 30) + i % 30),
+            "floor": str(1 + i // 30),
+            "status": status,
+            "guest_name": f"Guest {i}" if busy else "",
+            "guest_phone": f"98{rnd.randint(10000000, 99999999)}" if busy else "",
+            "stay_id": 5000 + i if busy else None,
+            "total_due": round(rnd.uniform(0, 9000), 2) if busy else 0.0,
+            "is_paid": False,
+        })
+
+    requests = {"NEW": [], "ACCEPTED": []}
+    for i in range(open_requests):
+        status = "NEW" if i % 3 else "ACCEPTED"
+        food = i % 2 == 0
+        created = now - timedelta(minutes=rnd.randint(1, 90))
+        lines = [
+            {"name": f"Menu item {rnd.randint(1, 40)}", "qty": rnd.randint(1, 3), "price": 180.0}
+            for _ in range(rnd.randint(1, 3))
+        ] if food else []
+        requests[status].append({
+            "id": 20000 + i,
+            "room": str(100 + i),
+            "floor": str(1 + i // 30),
+            "kind": "FOOD" if food else "SERVICE",
+            "status": status,
+            "subtotal": sum(ln["qty"] * ln["price"] for ln in lines),
+            "created_at": created.isoformat(),
+            "accepted_at": (created + timedelta(minutes=2)).isoformat() if status == "ACCEPTED" else None,
+            "completed_at": None,
+            "cancelled_at": None,
+            "note": "" if food else "Extra towels please",
+            "lines": lines,
+            "item_count": sum(ln["qty"] for ln in lines),
+            **SYNTHETIC_HOTEL,
+        })
+    return {
+        "type": "board_state",
+        "version": 1234,
+        "data": {
+            "new": requests["NEW"],
+            "accepted": requests["ACCEPTED"],
+            "counts": {"completed_today": 57, "cancelled_today": 3},
+            "rooms": lanes,
+        },
+    }
+
+
+def _size(frame):
+    text, data = frame
+    return len(text.encode()) if text is not None else len(data)
+
+
+class Command(BaseCommand):
+    help = "Compare live board payload sizes per wire encoding"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hotel", type=int, help="Measure this hotel's real board instead")
+        parser.add_argument("--rooms", type=int, default=300, help="Synthetic hotel size (default 300)")
+        parser.add_argument("--open-requests", type=int, default=90, help="Synthetic NEW + ACCEPTED requests")
+
+    def handle(self, *args, **options):
+        if options.get("hotel"):
+            snapshot = build_board_payload(options["hotel"])
+            hotel = hotel_header(Hotel.objects.get(id=options["hotel"]))
+            label = f"hotel {options['hotel']}"
+        else:
+            snapshot = _synthetic_board(options["rooms"], options["open_requests"])
+            hotel = SYNTHETIC_HOTEL
+            label = "synthetic hotel"
+
+        data = snapshot["data"]
+        rooms = [r for rows in data["rooms"].values() for r in rows]
+        requests = data["new"] + data["accepted"]
+        messages = {"board_state": snapshot}
+        if requests:
+            messages["request delta"] = {
+                "type": "request_status_changed", "version": 1235, "hotel_id": requests[0]["hotel_id"],
+                "request": requests[0], "prev_status": "NEW",
+            }
+        if rooms:
+            messages["room delta"] = {
+                "type": "room_status_changed", "version": 1236, "hotel_id": None,
+                "room": rooms[0], "prev_status": "FREE",
+            }
+
+        self.stdout.write(f"{label}: {len(rooms)} rooms, {len(requests)} open requests")
+        baseline = {name: _size(encode_frame(msg)) for name, msg in messages.items()}
+        header = f"{'encoding':<16}" + "".join(f"{name:>22}" for name in messages) + f"{'encode ms':>11}"
+        self.stdout.write(header)
+
+        for encoding in ENCODINGS + ("json+zlib",):
+            if encoding != "json+zlib" and not available(encoding):
+                self.stdout.write(f"{encoding:<16}  (not installed)")
+                continue
+            cells = []
+            start = time.perf_counter()
+            for name, msg in messages.items():
+                if encoding == "json+zlib":  # what permessage-deflate on plain JSON would give
+                    size = len(zlib.compress(json.dumps(msg).encode(), 6))
+                else:
+                    size = _size(encode_frame(msg, encoding, hotel))
+                cells.append(f"{size:>11} B ({size / baseline[name]:>5.0%})")
+            elapsed = (time.perf_counter() - start) * 1000
+            self.stdout.write(f"{encoding:<16}" + "".join(f"{c:>22}" for c in cells) + f"{elapsed:>11.2f}")
@@ -0,0 +1,100 @@
+"""
+Management command: bench_live_connect
+Opens N live board sockets at the same moment (shift change), spread over
+one or more hotels, and reports connect latency (connect → first
+board_state), throughput and how many sync runs (snapshot builds / version
+reads) they cost. Three modes:
+
+    shared thread       LIVE_DB_THREADS = 0, no single-flight (the old path)
+    + single-flight     concurrent connects of a hotel share one build
+    + live_db pool      ... and different hotels build side by side
+
+The snapshot cache is invalidated before each burst, so every burst starts
+cold. Runs the consumer in-process (channels' WebsocketCommunicator),
+against the configured database and channel layer.
+
+Usage:
+    python manage.py bench_live_connect --hotel 8
+    python manage.py bench_live_connect --hotel 8 9 10 11 --connects 50 --rounds 3
+"""
+import asyncio
+import statistics
+import time
+
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from hotelportal.board import bump_data_version
+from hotelportal.consumers import HotelLiveConsumer
+from hotelportal.singleflight import board_snapshots
+from website.models import User
+
+
+class Command(BaseCommand):
+    help = "Measure live board connect latency / throughput under a burst of sockets"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hotel", type=int, nargs="+", required=True, help="Hotel ID(s)")
+        parser.add_argument("--connects", type=int, default=50, help="Sockets per burst (default 50)")
+        parser.add_argument("--rounds", type=int, default=3, help="Bursts per mode (default 3)")
+
+    def handle(self, *args, **options):
+        users = []
+        for hotel_id in options["hotel"]:
+            user = (
+                User.objects.filter(hotel_id=hotel_id, role__in=("HOTEL_ADMIN", "STAFF"))
+                .select_related("hotel")
+                .first()
+            )
+            if not user:
+                raise CommandError(f"Hotel {hotel_id} has no HOTEL_ADMIN / STAFF user to connect as")
+            users.append(user)
+
+        threads = getattr(settings, "LIVE_DB_THREADS", 8) or 8
+        modes = (
+            ("shared thread  ", 0, False),
+            ("+ single-flight", 0, True),
+            ("+ live_db pool ", threads, True),
+        )
+        n = options["connects"]
+        self.stdout.write(f"{n} connects per burst over {len(users)} hotel(s), {options['rounds']} burst(s)")
+
+        for label, pool_size, single_flight in modes:
+            board_snapshots.enabled = single_flight
+            latencies, runs, wall = [], 0, 0.0
+            with override_settings(LIVE_DB_THREADS=pool_size):
+                for _ in range(options["rounds"]):
+                    for user in users:
+                        bump_data_version(user.hotel_id)  # cold snapshot cache
+                    before = board_snapshots.stats()["runs"]
+                    start = time.perf_counter()
+                    latencies += asyncio.run(self._burst(users, n))
+                    wall += time.perf_counter() - start
+                    runs += board_snapshots.stats()["runs"] - before
+            board_snapshots.enabled = True
+
+            latencies.sort()
+            p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+            self.stdout.write(
+                f"{label}: p50 {statistics.median(latencies) * 1000:.0f} ms, "
+                f"p95 {p95 * 1000:.0f} ms, max {latencies[-1] * 1000:.0f} ms, "
+                f"{len(latencies) / wall:.0f} connects/s, "
+                f"{runs / options['rounds']:.0f} sync run(s) per burst"
+            )
+
+    async def _burst(self, users, n):
+        async def one(user):
+            comm = WebsocketCommunicator(HotelLiveConsumer.as_asgi(), "/ws/portal/live/")
+            comm.scope["user"] = user
+            start = time.perf_counter()
+            connected, _ = await comm.connect(timeout=30)
+            if not connected:
+                raise CommandError("Socket was refused")
+            await comm.receive_json_from(timeout=30)
+            elapsed = time.perf_counter() - start
+            await comm.disconnect()
+            return elapsed
+
+        return await asyncio.gather(*(one(users[i % len(users)]) for i in range(n)))
@@ -0,0 +1,57 @@
+"""
+Management command: check_board_queries
+Builds the live board snapshot for each hotel (and the all-hotels board)
+and fails if any build takes more than BOARD_MAX_QUERIES queries. The
+board must not get more expensive as rooms / requests grow; run this
+after touching board.py or board_queries.py, or from CI.
+
+Usage:
+    python manage.py check_board_queries
+    python manage.py check_board_queries --hotel 8 -v 2
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from hotelportal.board import build_board_payload
+from website.models import Hotel
+
+# version + request lanes + rooms + counters
+BOARD_MAX_QUERIES = 4
+
+
+class Command(BaseCommand):
+    help = "Assert the live board builds in a fixed number of queries"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hotel", type=int, help="Hotel ID (default: every hotel)")
+
+    def handle(self, *args, **options):
+        if options.get("hotel"):
+            hotel_ids = [options["hotel"]]
+        else:
+            hotel_ids = list(Hotel.objects.values_list("id", flat=True)) + [None]
+
+        failed = []
+        for hotel_id in hotel_ids:
+            with CaptureQueriesContext(connection) as ctx:
+                payload = build_board_payload(hotel_id)
+            n = len(ctx.captured_queries)
+            data = payload["data"]
+            rooms = sum(len(v) for v in data["rooms"].values())
+            requests = len(data["new"]) + len(data["accepted"])
+            label = hotel_id or "all"
+
+            if options["verbosity"] >= 2:
+                for q in ctx.captured_queries:
+                    self.stdout.write(f"  {q['sql'][:160]}")
+            self.stdout.write(f"hotel {label}: {n} queries ({rooms} rooms, {requests} open requests)")
+            if n > BOARD_MAX_QUERIES:
+                failed.append(label)
+
+        if failed:
+            raise CommandError(
+                f"Board build exceeded {BOARD_MAX_QUERIES} queries for hotel(s): {failed}"
+            )
+        self.stdout.write(self.style.SUCCESS("Board query count OK"))
@@ -0,0 +1,57 @@
+"""
+Management command: prune_draft_carts
+Deletes abandoned guest carts: DRAFT carts (and their items) not touched
+for --hours (cart_add / cart_update move updated_at). Carts are only
+created by cart_add, so what's left here is guests who never ordered.
+Works in batches so it can run while guests are ordering, and drops the
+deleted carts' cache markers (guest_cart:<room>:<stay>).
+
+Usage:
+    python manage.py prune_draft_carts
+    python manage.py prune_draft_carts --hours 12 --batch 1000
+    python manage.py prune_draft_carts --dry-run
+"""
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from guest.views import cart_marker_key
+from hotelportal.models import Cart, CartItem
+
+
+class Command(BaseCommand):
+    help = "Delete DRAFT carts older than --hours (default 48), in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hours", type=int, default=48)
+        parser.add_argument("--batch", type=int, default=500, help="Carts per delete batch")
+        parser.add_argument("--dry-run", action="store_true", help="Only count what would be deleted")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timezone.timedelta(hours=options["hours"])
+        qs = Cart.objects.filter(status="DRAFT", updated_at__lt=cutoff)
+
+        if options["dry_run"]:
+            self.stdout.write(f"Would delete {qs.count()} carts")
+            return
+
+        carts = items = 0
+        while True:
+            with transaction.atomic():
+                # locked: a cart_add on one of these waits, finds it gone
+                # and starts a new cart
+                rows = list(
+                    qs.select_for_update()
+                    .order_by("id")
+                    .values_list("id", "room_id", "stay_id")[: options["batch"]]
+                )
+                if not rows:
+                    break
+                ids = [cart_id for cart_id, _, _ in rows]
+                items += CartItem.objects.filter(cart_id__in=ids).delete()[0]
+                carts += Cart.objects.filter(id__in=ids).delete()[0]
+            cache.delete_many([cart_marker_key(room_id, stay_id) for _, room_id, stay_id in rows])
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {carts} carts, {items} cart items"))
@@ -0,0 +1,42 @@
+"""
+Management command: prune_idempotency_keys
+Reports how many guest submits were deduplicated by their idempotency key
+(double taps / retries answered with the original request_id), then
+deletes keys older than IDEMPOTENCY_KEY_TTL_HOURS.
+
+Usage:
+    python manage.py prune_idempotency_keys
+    python manage.py prune_idempotency_keys --hours 6
+    python manage.py prune_idempotency_keys --stats
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from hotelportal.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Report deduplicated guest submits and delete expired idempotency keys"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hours", type=int, help="Key TTL (default IDEMPOTENCY_KEY_TTL_HOURS)")
+        parser.add_argument("--stats", action="store_true", help="Only report, delete nothing")
+
+    def handle(self, *args, **options):
+        agg = IdempotencyKey.objects.aggregate(keys=Count("id"), replays=Sum("replays"))
+        keys, replays = agg["keys"], agg["replays"] or 0
+        submits = keys + replays
+        share = replays / submits if submits else 0.0
+        self.stdout.write(
+            f"{submits} keyed submits, {replays} deduplicated ({share:.1%}) over {keys} live keys"
+        )
+        if options["stats"]:
+            return
+
+        hours = options["hours"] or getattr(settings, "IDEMPOTENCY_KEY_TTL_HOURS", 24)
+        cutoff = timezone.now() - timezone.timedelta(hours=hours)
+        deleted, _ = IdempotencyKey.objects.filter(created_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} idempotency keys older than {hours}h"))
@@ -0,0 +1,34 @@
+"""
+Management command: prune_request_events
+Deletes old RequestEvent outbox rows that every known consumer has
+already acknowledged.
+
+Usage:
+    python manage.py prune_request_events
+    python manage.py prune_request_events --days 3
+"""
+
+from django.core.management.base import BaseCommand
+from django.db.models import Min
+from django.utils import timezone
+
+from hotelportal.models import EventCursor, RequestEvent
+
+
+class Command(BaseCommand):
+    help = "Delete acknowledged request events older than --days (default 7)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=7)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timezone.timedelta(days=options["days"])
+        qs = RequestEvent.objects.filter(created_at__lt=cutoff)
+
+        # never drop what a consumer has not acknowledged yet
+        min_ack = EventCursor.objects.aggregate(m=Min("position"))["m"]
+        if min_ack is not None:
+            qs = qs.filter(seq__lte=min_ack)
+
+        deleted, _ = qs.delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} request events"))
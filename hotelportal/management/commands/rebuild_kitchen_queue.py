@@ -0,0 +1,62 @@
+"""
+Management command: rebuild_kitchen_queue
+Recomputes KitchenQueueItem (open FOOD quantity per item per hotel) from
+the NEW / ACCEPTED requests' lines. Run once after deploying the kitchen
+screen, or any time the numbers look off.
+
+Usage:
+    python manage.py rebuild_kitchen_queue
+    python manage.py rebuild_kitchen_queue --hotel 8
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+
+from hotelportal.kitchen import OPEN_STATUSES
+from hotelportal.models import KitchenQueueItem, RequestLine
+
+
+class Command(BaseCommand):
+    help = "Rebuild the kitchen prep queue from open food orders"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hotel", type=int, help="Hotel ID (default: all hotels)")
+
+    def handle(self, *args, **options):
+        hotel_id = options.get("hotel")
+
+        lines = RequestLine.objects.filter(
+            request__kind="FOOD", request__status__in=OPEN_STATUSES
+        )
+        if hotel_id:
+            lines = lines.filter(request__hotel_id=hotel_id)
+
+        rows = (
+            lines.values("request__hotel_id", "item_id")
+            .annotate(
+                qty=Sum("qty"),
+                tickets=Count("request_id", distinct=True),
+                oldest_at=Min("request__created_at"),
+                name=Max("name_snapshot"),
+            )
+        )
+
+        with transaction.atomic():
+            old = KitchenQueueItem.objects.all()
+            if hotel_id:
+                old = old.filter(hotel_id=hotel_id)
+            old.delete()
+            KitchenQueueItem.objects.bulk_create([
+                KitchenQueueItem(
+                    hotel_id=r["request__hotel_id"],
+                    item_id=r["item_id"],
+                    name=r["name"],
+                    qty=r["qty"],
+                    tickets=r["tickets"],
+                    oldest_at=r["oldest_at"],
+                )
+                for r in rows
+            ])
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(rows)} kitchen queue rows"))
@@ -0,0 +1,130 @@
+# hotelportal/menu_cache.py
+"""
+Per-hotel guest menu tree, cached.
+
+Every QR scan used to query all active categories and available items and
+regroup them in Python. The menu only changes when an admin edits it, so
+the grouped tree is built once per hotel and version:
+
+    menu_version:<hotel_id>        catalog change stamp (time of the last
+                                   Category / Item / ImageAsset save or
+                                   delete, incl. item_toggle_available)
+    menu_tree:<hotel_id>:<stamp>   the tree below
+
+Saves / deletes move the stamp (signals.py), so the next scan misses and
+rebuilds ("warmed on first use"); old trees just expire. Tree:
+
+    {"version": stamp,
+     "items": {item_id: Item},                 available items (+ category, image)
+     "items_by_cat": {category_id: [Item]},
+     "children": {category_id: [Category]},
+     "top_food": [...], "top_service": [...],   active top-level categories
+     "food_categories": [...], "service_categories": [...]}
+
+Objects are model instances, so templates use them as before; treat them
+as read-only. With more than one server process the default LocMem cache
+only invalidates in the process that saved: set REDIS_URL.
+
+The guest page's menu markup (guest/_menu_sections.html, _menu_bars.html)
+is the same for every room, so it is rendered once per hotel and stamp too
+(``get_menu_html``, key ``menu_html:<hotel_id>:<stamp>``); room_view only
+renders the per-room / per-stay parts around it.
+"""
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .models import Category, Item
+
+
+def _version_key(hotel_id):
+    return f"menu_version:{hotel_id}"
+
+
+def _timeout():
+    return getattr(settings, "MENU_CACHE_TIMEOUT", 24 * 3600)
+
+
+def bump_menu_version(hotel_id):
+    """Invalidate the hotel's cached menu. Called from model signals."""
+    if not hotel_id:
+        return
+    cache.set(_version_key(hotel_id), time.time_ns(), None)
+
+
+def menu_version(hotel_id):
+    """The hotel's catalog change stamp (a fresh one if the cache lost it)."""
+    stamp = cache.get(_version_key(hotel_id))
+    if stamp is None:
+        stamp = time.time_ns()
+        if not cache.add(_version_key(hotel_id), stamp, None):
+            stamp = cache.get(_version_key(hotel_id), stamp)
+    return stamp
+
+
+def build_menu_tree(hotel_id):
+    cats = list(
+        Category.objects.filter(hotel_id=hotel_id, is_active=True)
+        .select_related("parent")
+        .order_by("position", "name")
+    )
+    items = (
+        Item.objects.filter(hotel_id=hotel_id, is_available=True)
+        .select_related("category", "image")
+        .order_by("position", "name")
+    )
+
+    items_by_cat = defaultdict(list)
+    by_id = {}
+    for it in items:
+        items_by_cat[it.category_id].append(it)
+        by_id[it.id] = it
+
+    children = defaultdict(list)
+    top_food, top_service = [], []
+    for c in cats:
+        if c.parent_id:
+            children[c.parent_id].append(c)
+        else:
+            (top_food if c.kind == "FOOD" else top_service).append(c)
+
+    return {
+        "items": by_id,
+        "items_by_cat": dict(items_by_cat),
+        "children": dict(children),
+        "top_food": top_food,
+        "top_service": top_service,
+        "food_categories": [c for c in cats if c.kind == "FOOD"],
+        "service_categories": [c for c in cats if c.kind == "SERVICE"],
+    }
+
+
+def get_menu_tree(hotel_id):
+    """The hotel's menu tree, from cache when the catalog hasn't changed."""
+    stamp = menu_version(hotel_id)
+    key = f"menu_tree:{hotel_id}:{stamp}"
+    tree = cache.get(key)
+    if tree is None:
+        tree = build_menu_tree(hotel_id)
+        tree["version"] = stamp
+        cache.set(key, tree, _timeout())
+    return tree
+
+
+def get_menu_html(hotel_id):
+    """{"sections": ..., "bars": ...}: the guest page's menu markup, rendered once per version."""
+    stamp = menu_version(hotel_id)
+    key = f"menu_html:{hotel_id}:{stamp}"
+    html = cache.get(key)
+    if html is None:
+        menu = get_menu_tree(hotel_id)
+        html = {
+            "sections": render_to_string("guest/_menu_sections.html", menu),
+            "bars": render_to_string("guest/_menu_bars.html", menu),
+        }
+        cache.set(key, html, _timeout())
+    return {part: mark_safe(markup) for part, markup in html.items()}
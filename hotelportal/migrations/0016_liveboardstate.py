@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0005_hotelpayment_gateway_hotelpayment_gateway_payment_id'),
+        ('hotelportal', '0015_stay_optional_guest_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LiveBoardState',
+            fields=[
+                ('hotel', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='live_board_state', serialize=False, to='website.hotel')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
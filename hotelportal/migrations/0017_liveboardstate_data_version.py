@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotelportal', '0016_liveboardstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='liveboardstate',
+            name='data_version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0005_hotelpayment_gateway_hotelpayment_gateway_payment_id'),
+        ('hotelportal', '0017_liveboardstate_data_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('position', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RequestEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event', models.CharField(choices=[('created', 'Created'), ('accepted', 'Accepted'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=12)),
+                ('staff_whatsapp_group_code', models.CharField(blank=True, max_length=64)),
+                ('payload', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('hotel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='website.hotel')),
+                ('request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='hotelportal.request')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0005_hotelpayment_gateway_hotelpayment_gateway_payment_id'),
+        ('hotelportal', '0018_requestevent_eventcursor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRequestCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('completed', models.PositiveIntegerField(default=0)),
+                ('cancelled', models.PositiveIntegerField(default=0)),
+                ('hotel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='website.hotel')),
+            ],
+            options={
+                'unique_together': {('hotel', 'day')},
+            },
+        ),
+    ]
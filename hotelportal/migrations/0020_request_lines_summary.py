@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:25
+
+from django.db import migrations, models
+
+
+def backfill_lines_summary(apps, schema_editor):
+    Request = apps.get_model("hotelportal", "Request")
+    batch = []
+    qs = Request.objects.filter(kind="FOOD").prefetch_related("lines").order_by("id")
+    for req in qs.iterator(chunk_size=500):
+        lines = list(req.lines.all())
+        req.lines_summary = [{"name": ln.name_snapshot, "qty": ln.qty} for ln in lines]
+        req.item_count = sum(ln.qty for ln in lines)
+        batch.append(req)
+        if len(batch) >= 500:
+            Request.objects.bulk_update(batch, ["lines_summary", "item_count"])
+            batch = []
+    if batch:
+        Request.objects.bulk_update(batch, ["lines_summary", "item_count"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotelportal', '0019_dailyrequestcounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='request',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='request',
+            name='lines_summary',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(backfill_lines_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0005_hotelpayment_gateway_hotelpayment_gateway_payment_id'),
+        ('hotelportal', '0020_request_lines_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KitchenQueueItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=120)),
+                ('qty', models.IntegerField(default=0)),
+                ('tickets', models.IntegerField(default=0)),
+                ('oldest_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('hotel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='kitchen_queue', to='website.hotel')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='hotelportal.item')),
+            ],
+            options={
+                'ordering': ['oldest_at'],
+                'unique_together': {('hotel', 'item')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0005_hotelpayment_gateway_hotelpayment_gateway_payment_id'),
+        ('hotelportal', '0021_kitchenqueueitem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64)),
+                ('replays', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('hotel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='website.hotel')),
+                ('request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='hotelportal.request')),
+            ],
+            options={
+                'unique_together': {('hotel', 'key')},
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotelportal', '0022_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestEventLock',
+            fields=[
+                ('id', models.PositiveSmallIntegerField(default=1, primary_key=True, serialize=False)),
+            ],
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:30
+
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def seed_sequence(apps, schema_editor):
+    # existing events keep their id as cursor, so acknowledged positions stay valid
+    RequestEvent = apps.get_model("hotelportal", "RequestEvent")
+    RequestEventSequence = apps.get_model("hotelportal", "RequestEventSequence")
+    RequestEvent.objects.update(seq=F("id"))
+    last = RequestEvent.objects.aggregate(m=Max("id"))["m"] or 0
+    RequestEventSequence.objects.create(id=1, last_seq=last)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotelportal', '0023_requesteventlock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestEventSequence',
+            fields=[
+                ('id', models.PositiveSmallIntegerField(default=1, primary_key=True, serialize=False)),
+                ('last_seq', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.DeleteModel(
+            name='RequestEventLock',
+        ),
+        migrations.AddField(
+            model_name='requestevent',
+            name='seq',
+            field=models.PositiveBigIntegerField(blank=True, null=True, unique=True),
+        ),
+        migrations.RunPython(seed_sequence, migrations.RunPython.noop),
+    ]
@@ -420,6 +420,11 @@ class Request(models.Model):
 
     note = models.CharField(max_length=200, blank=True)
 
+    # Denormalized copy of the lines ([{"name", "qty"}, ...]) so the live
+    # board never has to touch RequestLine. Written once at submit time.
+    lines_summary = models.JSONField(default=list, blank=True)
+    item_count = models.PositiveIntegerField(default=0)
+
     class Meta:
         indexes = [
             models.Index(fields=["hotel", "status", "updated_at"]),
@@ -431,6 +436,11 @@ class Request(models.Model):
     def __str__(self):
         return f"{self.get_kind_display()} #{self.id} — R{self.room.number} — {self.get_status_display()}"
 
+    def set_lines_summary(self, lines):
+        """Fill lines_summary / item_count from RequestLine objects (saved or not)."""
+        self.lines_summary = [{"name": ln.name_snapshot, "qty": ln.qty} for ln in lines]
+        self.item_count = sum(ln.qty for ln in lines)
+
     def clean(self):
         if self.room and self.room.hotel_id != self.hotel_id:
             raise ValidationError("Request.hotel must match Request.room.hotel")
@@ -474,6 +484,165 @@ class RequestLine(models.Model):
         return f"{self.name_snapshot} × {self.qty} (₹{self.price_snapshot})"
 
 
+# --------------------------------------
+# Live board delta version (per hotel)
+# --------------------------------------
+class LiveBoardState(models.Model):
+    """
+    Per-hotel live board counters.
+
+    - version:      bumped once for every delta pushed to the hotel's board
+                    sockets; snapshots carry it so clients can detect gaps.
+    - data_version: bumped on every Request / Room / Stay write (signals);
+                    keys the shared board snapshot cache.
+    """
+    hotel = models.OneToOneField(
+        Hotel,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="live_board_state",
+    )
+    version = models.PositiveBigIntegerField(default=0)
+    data_version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Live board v{self.version} for {self.hotel.name}"
+
+
+# --------------------------------------
+# Daily request counters (live board)
+# --------------------------------------
+class DailyRequestCounter(models.Model):
+    """
+    Requests completed / cancelled per hotel per business day. Incremented
+    in the same transaction as the live_action transition so the board
+    reads today's numbers from one row instead of scanning Request history.
+    Rebuild with `manage.py rebuild_daily_counters`.
+    """
+    hotel = models.ForeignKey(Hotel, on_delete=models.CASCADE)
+    day = models.DateField()
+    completed = models.PositiveIntegerField(default=0)
+    cancelled = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = (("hotel", "day"),)
+
+    def __str__(self):
+        return f"{self.hotel.name} {self.day}: {self.completed} done / {self.cancelled} cancelled"
+
+
+# --------------------------------------
+# Kitchen prep queue (open FOOD quantities per item)
+# --------------------------------------
+class KitchenQueueItem(models.Model):
+    """
+    Open (NEW + ACCEPTED) FOOD quantity per item per hotel: "7 × Masala Dosa,
+    4 tickets, oldest since 10:42". Kept up to date by order_submit_stub and
+    live_action (see hotelportal/kitchen.py); a row is deleted when its
+    quantity reaches zero. Rebuild with `manage.py rebuild_kitchen_queue`.
+    """
+    hotel = models.ForeignKey(Hotel, on_delete=models.CASCADE, related_name="kitchen_queue")
+    item = models.ForeignKey(Item, on_delete=models.CASCADE)
+    name = models.CharField(max_length=120)
+    qty = models.IntegerField(default=0)
+    tickets = models.IntegerField(default=0)
+    oldest_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = (("hotel", "item"),)
+        ordering = ["oldest_at"]
+
+    def __str__(self):
+        return f"{self.qty} × {self.name} ({self.tickets} tickets)"
+
+
+# --------------------------------------
+# Request event outbox (staff bot feed)
+# --------------------------------------
+class RequestEvent(models.Model):
+    """
+    Append-only outbox of request lifecycle events. ``seq`` is the cursor:
+    consumers read ``seq > cursor`` in order and acknowledge what they
+    processed (see EventCursor).
+
+    ``seq`` is not the id: ids are taken at insert, so two transactions
+    could take 7 and 8 and commit 8 first, and a bot that acked 8 would
+    never see 7. Writers insert with seq NULL and never lock anything;
+    after commit, outbox.assign_cursors() numbers the committed rows under
+    the RequestEventSequence row lock, so cursors only grow in the order
+    events become visible.
+    """
+    EVENT_CHOICES = (
+        ("created", "Created"),
+        ("accepted", "Accepted"),
+        ("completed", "Completed"),
+        ("cancelled", "Cancelled"),
+    )
+
+    hotel = models.ForeignKey(Hotel, on_delete=models.CASCADE, db_index=True)
+    request = models.ForeignKey(Request, on_delete=models.CASCADE, related_name="events")
+    event = models.CharField(max_length=12, choices=EVENT_CHOICES)
+    staff_whatsapp_group_code = models.CharField(max_length=64, blank=True)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    seq = models.PositiveBigIntegerField(null=True, blank=True, unique=True)
+
+    class Meta:
+        ordering = ["id"]
+
+    def __str__(self):
+        return f"#{self.id} (cursor {self.seq}) {self.event} — request {self.request_id}"
+
+
+class RequestEventSequence(models.Model):
+    """
+    Last RequestEvent.seq handed out. One row (id 1, created by the
+    migration), locked only by assign_cursors for its short numbering
+    transaction, never by the writers.
+    """
+    id = models.PositiveSmallIntegerField(primary_key=True, default=1)
+    last_seq = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"request event cursor @ {self.last_seq}"
+
+
+class EventCursor(models.Model):
+    """Last RequestEvent seq acknowledged by a named consumer (e.g. the staff bot)."""
+    name = models.CharField(max_length=50, unique=True)
+    position = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.position}"
+
+
+# --------------------------------------
+# Guest submit idempotency keys
+# --------------------------------------
+class IdempotencyKey(models.Model):
+    """
+    Client key sent with a guest order / service request submit. A retried
+    POST with the same key (double tap, flaky Wi-Fi) gets the original
+    request_id back instead of creating another Request. Stored in the
+    same transaction as the Request; ``replays`` counts the retries
+    answered from here. Old keys are removed by `manage.py
+    prune_idempotency_keys` (IDEMPOTENCY_KEY_TTL_HOURS).
+    """
+    hotel = models.ForeignKey(Hotel, on_delete=models.CASCADE)
+    key = models.CharField(max_length=64)
+    request = models.ForeignKey(Request, on_delete=models.CASCADE, related_name="+")
+    replays = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        unique_together = (("hotel", "key"),)
+
+    def __str__(self):
+        return f"{self.key} → request {self.request_id}"
+
+
 # --- Billing/Invoice settings tied to a Hotel ---
 class HotelBillingSettings(models.Model):
     hotel = models.OneToOneField(Hotel, on_delete=models.CASCADE, related_name="billing_settings")
@@ -0,0 +1,98 @@
+# hotelportal/outbox.py
+"""
+Request event outbox for the staff WhatsApp bot.
+
+Every request transition appends one RequestEvent row and, once the change
+commits, notifies the ``hotel_portal_events`` group so connected bots get it
+right away. Delivery is at-least-once: on (re)connect a bot is replayed
+everything after its cursor (given in the URL, or the last one it
+acknowledged), then streamed new events. It acks with
+{"type": "ack", "cursor": <seq>}.
+
+The cursor is ``RequestEvent.seq``, handed out AFTER commit by
+``assign_cursors`` (see the model): writers only insert, so order and
+status transactions of different hotels never wait on each other, and a
+row that commits late simply gets a later cursor instead of slipping in
+behind one a bot already acknowledged.
+"""
+from django.db import transaction
+
+from .board import serialize_requests
+from .broadcaster import EVENTS_GROUP, live_broadcaster
+from .models import EventCursor, RequestEvent, RequestEventSequence
+
+REPLAY_BATCH = 200
+
+
+def event_message(ev):
+    return {
+        "type": "request_event",
+        "cursor": ev.seq,
+        "event": ev.event,
+        "hotel_id": ev.hotel_id,
+        "staff_whatsapp_group_code": ev.staff_whatsapp_group_code,
+        "request": ev.payload,
+        "created_at": ev.created_at.isoformat(),
+    }
+
+
+def record_request_event(req, event):
+    """
+    Append one event for this request ("created" or the new status in lower
+    case); once it commits it gets its cursor and bots are notified.
+    """
+    hotel = req.hotel
+    ev = RequestEvent.objects.create(
+        hotel=hotel,
+        request=req,
+        event=event,
+        staff_whatsapp_group_code=hotel.staff_whatsapp_group_code or "",
+        payload=serialize_requests([req], hotel=hotel)[0],
+    )
+    live_broadcaster.on_commit(_publish_new_events)
+    return ev
+
+
+def assign_cursors(limit=REPLAY_BATCH):
+    """
+    Number committed events that have no cursor yet, in id order, and
+    return them. Whoever calls this first after a commit numbers (and
+    publishes) the rows of every transaction committed so far.
+    """
+    if not RequestEvent.objects.filter(seq__isnull=True).exists():
+        return []
+    with transaction.atomic():
+        sequence = RequestEventSequence.objects.select_for_update().get(pk=1)
+        pending = list(RequestEvent.objects.filter(seq__isnull=True).order_by("id")[:limit])
+        for ev in pending:
+            sequence.last_seq += 1
+            ev.seq = sequence.last_seq
+        RequestEvent.objects.bulk_update(pending, ["seq"])
+        sequence.save(update_fields=["last_seq"])
+    return pending
+
+
+def _publish_new_events():
+    for ev in assign_cursors():
+        live_broadcaster.publish(
+            EVENTS_GROUP, {"type": "outbox.event", "message": event_message(ev)}
+        )
+
+
+def events_after(cursor, limit=REPLAY_BATCH):
+    assign_cursors()  # rows whose own after-commit numbering didn't run
+    return list(RequestEvent.objects.filter(seq__gt=cursor).order_by("seq")[:limit])
+
+
+def get_cursor(name):
+    return (
+        EventCursor.objects.filter(name=name)
+        .values_list("position", flat=True)
+        .first()
+    ) or 0
+
+
+def ack_cursor(name, position):
+    """Move the named cursor forward (never backwards)."""
+    cursor, _ = EventCursor.objects.get_or_create(name=name)
+    EventCursor.objects.filter(pk=cursor.pk, position__lt=position).update(position=position)
@@ -1,25 +1,93 @@
 # hotelportal/realtime.py
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
-
-
-def push_live_board(hotel):
-    """
-    Tell all LiveBoardConsumer clients for this hotel to refresh their board state.
-    Called from normal Django views after any change.
-    """
-    layer = get_channel_layer()
-    if not layer:
-        return
-
-    if hotel is not None:
-        group_name = f"hotel_{hotel.id}_live"
-    else:
-        group_name = "platform_live"
-
-    async_to_sync(layer.group_send)(
-        group_name,
-        {
-            "type": "live_board_update",   # maps to LiveBoardConsumer.live_board_update
-        },
-    )
+"""
+Realtime event bus: the ONE call a view makes after a change.
+
+Views say what happened; this module decides who hears about it. Call
+inside the transaction that made the change — everything is sent only
+once it commits:
+
+    request_created(req, lines=None)        guest order / service request
+    request_status_changed(req, prev)       accept / complete / cancel
+    room_status_changed(room, prev)         check-in / mark ready,
+                                            payment (same lane, fresh row),
+                                            room added or edited (prev None /
+                                            unchanged)
+    rooms_added(hotel_id, rooms)            rooms bulk-created (room generator)
+    stay_checked_out(stay, room, prev)      check-out (room already CLEANING)
+
+Fan-out per event (group names: see broadcaster.py):
+
+    request_created          board delta, guest stream, kitchen queue (FOOD),
+                             bot outbox, overview tile
+    request_status_changed   board delta (+ counters on COMPLETED /
+                             CANCELLED), guest stream, kitchen queue
+                             (FOOD leaving the queue), bot outbox,
+                             overview tile
+    room_status_changed      board delta, overview tile
+    rooms_added              one rooms_reset board delta, overview tile
+    stay_checked_out         guest stream closed, board delta, overview tile
+
+``stats()`` gives, per event type, how many happened and how many group
+messages they fanned out to (overview tiles are coalesced separately by
+the broadcaster, see ``live_broadcaster.stats()``).
+"""
+from .board import (
+    publish_request_created,
+    publish_request_status_changed,
+    publish_room_status_changed,
+    publish_rooms_reset,
+    publish_stay_closed,
+)
+from .broadcaster import live_broadcaster
+from .kitchen import kitchen_add_request, kitchen_remove_request
+from .outbox import record_request_event
+
+
+def _refresh_overview(hotel_id):
+    live_broadcaster.on_commit(lambda: live_broadcaster.mark_dirty(hotel_id))
+
+
+def request_created(req, lines=None):
+    """A guest placed a FOOD order (``lines``: its RequestLines) or a SERVICE request."""
+    with live_broadcaster.event("request_created"):
+        if lines:
+            kitchen_add_request(req, lines)
+        record_request_event(req, "created")
+        publish_request_created(req)
+        _refresh_overview(req.hotel_id)
+
+
+def request_status_changed(req, prev_status):
+    """Staff moved a request on (req.status already saved)."""
+    with live_broadcaster.event("request_status_changed"):
+        if req.kind == "FOOD" and req.status in ("COMPLETED", "CANCELLED"):
+            kitchen_remove_request(req)
+        publish_request_status_changed(req, prev_status)
+        record_request_event(req, req.status.lower())
+        _refresh_overview(req.hotel_id)
+
+
+def room_status_changed(room, prev_status):
+    """Check-in, mark ready, payment or room add / edit (room already saved)."""
+    with live_broadcaster.event("room_status_changed"):
+        publish_room_status_changed(room, prev_status)
+        _refresh_overview(room.hotel_id)
+
+
+def rooms_added(hotel_id, rooms):
+    """Rooms bulk-created: boards resync once instead of getting a delta per room."""
+    with live_broadcaster.event("rooms_added"):
+        publish_rooms_reset(hotel_id, rooms)
+        _refresh_overview(hotel_id)
+
+
+def stay_checked_out(stay, room, prev_status):
+    """The stay checked out and its room left ``prev_status`` (both already saved)."""
+    with live_broadcaster.event("stay_checked_out"):
+        publish_stay_closed(stay.id)
+        publish_room_status_changed(room, prev_status)
+        _refresh_overview(room.hotel_id)
+
+
+def stats():
+    return live_broadcaster.event_stats()
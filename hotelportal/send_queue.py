@@ -0,0 +1,131 @@
+# hotelportal/send_queue.py
+"""
+Per-socket outgoing queue for live board fan-out (board_push).
+
+Group messages used to go straight to ``send_json``; a tablet on a bad
+link just piled them up. Now each browser socket owns a SendQueue:
+
+  * bounded (LIVE_SEND_QUEUE_MAX); on overflow everything queued is
+    dropped and the socket gets ONE fresh snapshot instead
+  * coalescing: a snapshot (board_state / overview_state) replaces every
+    queued snapshot and every delta it already covers; a hotel_tile
+    replaces the queued tile of the same hotel
+  * pausable: the consumer pauses it while the client is behind on
+    heartbeats (see HotelLiveConsumer), so a slow client's backlog
+    collapses here instead of growing in the transport
+
+Process-wide counters (``stats()``): queued, sent, merged (superseded
+messages never sent), dropped (overflow), reaped (sockets closed for
+missed heartbeats).
+"""
+import asyncio
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_TYPES = ("board_state", "overview_state")
+
+_stats = {"queued": 0, "sent": 0, "merged": 0, "dropped": 0, "reaped": 0}
+
+
+def stats():
+    return dict(_stats)
+
+
+def count(name, n=1):
+    _stats[name] += n
+
+
+def _superseded(old, new):
+    """Does ``new`` make the queued message ``old`` pointless to send?"""
+    new_type, old_type = new.get("type"), old.get("type")
+    if new_type == "overview_state":
+        return old_type in ("overview_state", "hotel_tile")
+    if new_type == "board_state":
+        version = new.get("version") or 0
+        return old_type == "board_state" or (old.get("version") or 0) <= version
+    if new_type == "hotel_tile" and old_type == "hotel_tile":
+        return (old.get("tile") or {}).get("hotel_id") == (new.get("tile") or {}).get("hotel_id")
+    return False
+
+
+class SendQueue:
+    """
+    ``send(message)``  coroutine that writes one message to the socket
+    ``resync()``       coroutine that sends a fresh snapshot (after overflow)
+    """
+
+    def __init__(self, send, resync, max_size):
+        self._send = send
+        self._resync = resync
+        self._max = max_size
+        self._items = deque()
+        self._wake = asyncio.Event()
+        self._needs_resync = False
+        self.paused = False
+        self._task = asyncio.ensure_future(self._run())
+
+    def put(self, message):
+        self._drop_superseded(message)
+        if len(self._items) >= self._max:
+            count("dropped", len(self._items) + 1)
+            self._items.clear()
+            self._needs_resync = True
+        elif not self._needs_resync:
+            self._items.append(message)
+            count("queued")
+        self._wake.set()
+
+    def covered(self, message):
+        """``message`` went out directly (e.g. a requested snapshot)."""
+        self._drop_superseded(message)
+        if message.get("type") in SNAPSHOT_TYPES:
+            self._needs_resync = False
+
+    def clear(self):
+        """Groups / filter changed: what's queued is for the old view."""
+        self._items.clear()
+        self._needs_resync = False
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+        self._wake.set()
+
+    def close(self):
+        self._task.cancel()
+
+    def __len__(self):
+        return len(self._items)
+
+    def _drop_superseded(self, message):
+        if not self._items:
+            return
+        kept = deque(m for m in self._items if not _superseded(m, message))
+        if len(kept) != len(self._items):
+            count("merged", len(self._items) - len(kept))
+            self._items = kept
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            try:
+                while not self.paused:
+                    if self._needs_resync:
+                        self._needs_resync = False
+                        await self._resync()
+                    elif self._items:
+                        await self._send(self._items.popleft())
+                        count("sent")
+                    else:
+                        break
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Socket already gone; the consumer's disconnect cleans up.
+                logger.debug("live send failed", exc_info=True)
+                return
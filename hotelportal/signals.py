@@ -0,0 +1,39 @@
+# hotelportal/signals.py
+"""
+Model signal receivers. Connected from HotelportalConfig.ready().
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .board import bump_data_version
+from .menu_cache import bump_menu_version
+from .models import Category, ImageAsset, Item, Request, Room, Stay
+
+
+# Any write that can change what the live board shows invalidates the
+# hotel's cached snapshot (see board.get_board_snapshot). bulk_create and
+# queryset .update() / .delete() send no signals: views doing those call
+# bump_data_version themselves (room_generator, stay_mark_paid).
+@receiver(post_save, sender=Request)
+@receiver(post_delete, sender=Request)
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+@receiver(post_save, sender=Stay)
+@receiver(post_delete, sender=Stay)
+def _board_data_changed(sender, instance, **kwargs):
+    bump_data_version(instance.hotel_id)
+
+
+# Catalog edits (incl. item_toggle_available) invalidate the hotel's cached
+# guest menu (see menu_cache.get_menu_tree). After commit, so a scan racing
+# the edit can't cache the old menu under the new version.
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+@receiver(post_save, sender=ImageAsset)
+@receiver(post_delete, sender=ImageAsset)
+def _menu_changed(sender, instance, **kwargs):
+    hotel_id = instance.hotel_id
+    transaction.on_commit(lambda: bump_menu_version(hotel_id))
@@ -0,0 +1,64 @@
+# hotelportal/singleflight.py
+"""
+Single-flight for async callers: concurrent calls with the same key share
+ONE in-flight run and its result, instead of each doing the work.
+
+Used for live board snapshots (``board_snapshots``): at shift change a
+few dozen tablets connect within seconds and would otherwise each queue
+a snapshot build on the single thread_sensitive worker thread.
+
+    snapshot, started_at = await board_snapshots.run(hotel_id, build)
+
+``started_at`` (loop.time()) tells a caller whether the shared run began
+before or after it did something (e.g. joined its groups); a run that
+started earlier may be missing the newest deltas.
+"""
+import asyncio
+
+
+class SingleFlight:
+    def __init__(self):
+        self.enabled = True  # off: every caller runs fn() itself (bench_live_connect)
+        self._flights = {}  # key -> (future, started_at)
+        self._stats = {"runs": 0, "shared": 0}
+
+    async def run(self, key, fn, not_before=None):
+        """
+        Await ``fn()`` for ``key``, or the run already in flight for it.
+        ``not_before``: only share a run that started at or after this time.
+        """
+        if not self.enabled:
+            self._stats["runs"] += 1
+            started_at = asyncio.get_running_loop().time()
+            return await fn(), started_at
+
+        flight = self._flights.get(key)
+        if (
+            flight is None
+            or flight[0].done()
+            or (not_before is not None and flight[1] < not_before)
+        ):
+            loop = asyncio.get_running_loop()
+            future = asyncio.ensure_future(fn())
+            flight = (future, loop.time())
+            self._flights[key] = flight
+            self._stats["runs"] += 1
+
+            def forget(_f, key=key, flight=flight):
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+            future.add_done_callback(forget)
+        else:
+            self._stats["shared"] += 1
+
+        # shield: a caller that goes away (socket closed) doesn't cancel the
+        # run for everybody else waiting on it.
+        result = await asyncio.shield(flight[0])
+        return result, flight[1]
+
+    def stats(self):
+        return dict(self._stats)
+
+
+board_snapshots = SingleFlight()
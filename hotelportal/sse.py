@@ -0,0 +1,95 @@
+# hotelportal/sse.py
+"""
+Server-Sent Events over the channel layer.
+
+``group_event_stream`` subscribes one anonymous channel to a group (the same
+groups the WebSocket consumers join) and turns what arrives there into
+``text/event-stream`` frames. It is meant for async views running under
+Daphne: one idle coroutine per open screen, no thread held.
+
+Frames:
+    retry: <ms>              sent first, how long the browser waits to reconnect
+    id: <n>                  optional, echoed back by EventSource as Last-Event-ID
+    data: <json>             the same JSON a WebSocket client would get
+    : keepalive              comment line, keeps proxies from timing out
+"""
+import asyncio
+import json
+import logging
+
+from channels.layers import get_channel_layer
+from django.http import StreamingHttpResponse
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE_SECONDS = 15
+# Streams end after this long; EventSource reconnects with Last-Event-ID.
+MAX_STREAM_SECONDS = 300
+RETRY_MS = 3000
+
+
+def sse_frame(data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append("data: " + json.dumps(data, separators=(",", ":")))
+    return "\n".join(lines) + "\n\n"
+
+
+def last_event_id(request):
+    """Last-Event-ID header (EventSource reconnect) or ?last_event_id=, as int."""
+    raw = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id") or ""
+    try:
+        return int(raw)
+    except ValueError:
+        return None
+
+
+async def group_event_stream(groups, opening, render):
+    """
+    Async generator of SSE frames for one group (or a list of groups).
+
+    ``opening()``   awaited once AFTER joining the group; returns the first
+                    frames (e.g. a snapshot). Anything published meanwhile
+                    is queued on the channel, so nothing falls in between.
+    ``render(msg)`` maps one channel-layer message to a frame, or None to skip.
+    A message with ``"close": True`` ends the stream after its frame.
+    """
+    if isinstance(groups, str):
+        groups = [groups]
+    layer = get_channel_layer()
+    channel = await layer.new_channel()
+    for group in groups:
+        await layer.group_add(group, channel)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + MAX_STREAM_SECONDS
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        for frame in await opening():
+            yield frame
+
+        while loop.time() < deadline:
+            try:
+                message = await asyncio.wait_for(layer.receive(channel), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            frame = render(message)
+            if frame:
+                yield frame
+            if message.get("close"):
+                break
+    finally:
+        for group in groups:
+            try:
+                await layer.group_discard(group, channel)
+            except Exception:
+                logger.exception("SSE group_discard failed for %s", group)
+
+
+def sse_response(stream):
+    resp = StreamingHttpResponse(stream, content_type="text/event-stream")
+    resp["Cache-Control"] = "no-cache"
+    resp["X-Accel-Buffering"] = "no"  # nginx: don't buffer the stream
+    return resp
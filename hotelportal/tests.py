@@ -1,3 +1,1069 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import os
+import subprocess
+import sys
+import textwrap
+import threading
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from hotelportal import realtime
+from hotelportal.board import (
+    board_resume,
+    build_board_payload,
+    build_overview_payload,
+    bump_daily_counter,
+    current_board_version,
+    get_board_snapshot,
+    get_hotel_tile,
+    publish_request_created,
+)
+from hotelportal.board_filters import filtered_joined, filtered_left, has_filtered_subscribers, parse_filter
+from hotelportal.board_queries import today_counts
+from hotelportal.board_replay import _slot_key, missed_deltas
+from hotelportal.broadcaster import LiveBoardBroadcaster, live_broadcaster
+from hotelportal.consumers import HotelLiveConsumer
+from hotelportal.live_db import live_db
+from hotelportal.management.commands.check_board_queries import BOARD_MAX_QUERIES
+from hotelportal.models import (
+    Category,
+    DailyRequestCounter,
+    Item,
+    KitchenQueueItem,
+    Request,
+    RequestEvent,
+    RequestLine,
+    Room,
+    Stay,
+)
+from hotelportal.outbox import ack_cursor, events_after, get_cursor, record_request_event
+from hotelportal.send_queue import SendQueue
+from hotelportal.singleflight import SingleFlight
+from website.models import Hotel, User
+
+try:
+    from fakeredis import TcpFakeServer
+except ImportError:  # test-only dependency
+    TcpFakeServer = None
+
+
+def make_hotel(name="Hotel", rooms=3, status="ACTIVE", **fields):
+    """Hotel with ``rooms`` rooms (floor = index // 10), a STAFF and a HOTEL_ADMIN user, one FOOD and one SERVICE item."""
+    hotel = Hotel.objects.create(name=name, status=status, **fields)
+    for i in range(rooms):
+        Room.objects.create(hotel=hotel, number=str(100 + i), floor=str(i // 10))
+    User.objects.create_user(username=f"staff-{hotel.id}", password="x", role="STAFF", hotel=hotel)
+    User.objects.create_user(username=f"admin-{hotel.id}", password="x", role="HOTEL_ADMIN", hotel=hotel)
+    food = Category.objects.create(hotel=hotel, name="Food", kind="FOOD")
+    service = Category.objects.create(hotel=hotel, name="Service", kind="SERVICE")
+    Item.objects.create(hotel=hotel, category=food, name="Dosa", price=Decimal("50.00"))
+    Item.objects.create(hotel=hotel, category=service, name="Towel", price=Decimal("0.00"))
+    return hotel
+
+
+def mute_overview(test):
+    """
+    Skip the overview tile refresh for this test: it reads the DB from the
+    broadcaster's own thread, which a TestCase transaction keeps locked.
+    """
+    patcher = mock.patch.object(live_broadcaster, "mark_dirty")
+    patcher.start()
+    test.addCleanup(patcher.stop)
+
+
+def seed_board(hotel, stays):
+    """Active stays in the first ``stays`` rooms, each with a NEW order, an ACCEPTED order and a NEW service request."""
+    towel = Item.objects.get(hotel=hotel, name="Towel")
+    for room in hotel.room_set.order_by("id")[:stays]:
+        stay = Stay.objects.create(hotel=hotel, room=room, guest_name=f"Guest {room.number}", phone="99")
+        for status in ("NEW", "ACCEPTED"):
+            Request.objects.create(
+                hotel=hotel, room=room, stay=stay, kind="FOOD", status=status,
+                subtotal=Decimal("100.00"), lines_summary=[{"name": "Dosa", "qty": 2}], item_count=2,
+            )
+        Request.objects.create(hotel=hotel, room=room, stay=stay, kind="SERVICE", service_item=towel)
+
+
+class BoardQueryCountTests(TestCase):
+    """The board snapshot costs the same fixed number of queries whatever the hotel's size."""
+
+    def setUp(self):
+        self.small = make_hotel("Small", rooms=2)
+        seed_board(self.small, stays=1)
+        self.large = make_hotel("Large", rooms=60)
+        seed_board(self.large, stays=40)
+
+    def _count(self, build):
+        with CaptureQueriesContext(connection) as ctx:
+            payload = build()
+        return len(ctx.captured_queries), payload
+
+    def test_build_board_payload_is_constant(self):
+        small, _ = self._count(lambda: build_board_payload(self.small.id))
+        self.assertLessEqual(small, BOARD_MAX_QUERIES)
+        with self.assertNumQueries(small):
+            payload = build_board_payload(self.large.id)
+        self.assertEqual(len(payload["data"]["new"]), 80)
+        self.assertEqual(len(payload["data"]["rooms"]["busy"]), 40)
+
+    def test_get_board_snapshot_is_constant(self):
+        cold, _ = self._count(lambda: get_board_snapshot(self.small.id))
+        warm, _ = self._count(lambda: get_board_snapshot(self.small.id))
+        self.assertLess(warm, cold)
+        with self.assertNumQueries(cold):
+            get_board_snapshot(self.large.id)
+        with self.assertNumQueries(warm):
+            get_board_snapshot(self.large.id)
+
+
+class BoardReplayTests(TestCase):
+    """A reconnecting screen gets exactly the missed deltas, or one snapshot when any is gone."""
+
+    def setUp(self):
+        mute_overview(self)
+        self.hotel = make_hotel(rooms=12)
+        self.since = current_board_version(self.hotel.id)
+
+    def _orders(self, *numbers):
+        ids = []
+        with self.captureOnCommitCallbacks(execute=True):
+            for number in numbers:
+                room = Room.objects.get(hotel=self.hotel, number=number)
+                req = Request.objects.create(hotel=self.hotel, room=room, kind="FOOD")
+                publish_request_created(req)
+                ids.append(req.id)
+        return ids
+
+    def _resume(self, board_filter=None):
+        return board_resume(self.hotel.id, self.since, board_filter)
+
+    def _resume_from_current(self):
+        return board_resume(self.hotel.id, current_board_version(self.hotel.id))
+
+    def test_replays_missed_deltas_in_order(self):
+        ids = self._orders("100", "101", "102")
+        messages = self._resume()
+        self.assertEqual([m["request"]["id"] for m in messages], ids)
+        self.assertEqual([m["version"] for m in messages], [self.since + 1, self.since + 2, self.since + 3])
+        self.assertEqual(self._resume_from_current(), [])
+
+    def test_evicted_delta_falls_back_to_snapshot(self):
+        self._orders("100", "101", "102")
+        cache.delete(_slot_key(self.hotel.id, self.since + 2))
+        messages = self._resume()
+        self.assertEqual([m["type"] for m in messages], ["board_state"])
+        self.assertEqual(messages[0]["version"], self.since + 3)
+        self.assertEqual(len(messages[0]["data"]["new"]), 3)
+
+    @override_settings(LIVE_BOARD_REPLAY_SIZE=2)
+    def test_too_far_behind_falls_back_to_snapshot(self):
+        self._orders("100", "101", "102")
+        self.assertEqual([m["type"] for m in self._resume()], ["board_state"])
+        self.since += 1
+        self.assertEqual([m["type"] for m in self._resume()], ["request_created"] * 2)
+
+    @override_settings(LIVE_BOARD_REPLAY_SIZE=2)
+    def test_slot_overwritten_by_newer_lap_is_a_gap(self):
+        self._orders("100", "101", "102")
+        # version since+1 shares its slot with since+3
+        self.assertIsNone(missed_deltas(self.hotel.id, self.since, self.since + 2))
+
+    def test_filtered_screen_gets_only_its_deltas(self):
+        # floor "0": rooms 100-109, floor "1": 110-111
+        _, match = self._orders("100", "110")
+        messages = self._resume(parse_filter({"floors": ["1"]}))
+        self.assertEqual([m["request"]["id"] for m in messages], [match])
+
+
+class LinesSummaryBackfillTests(TestCase):
+    """Migration 0020 fills lines_summary / item_count of existing orders from their RequestLines."""
+
+    def test_backfill_matches_the_lines(self):
+        backfill = importlib.import_module("hotelportal.migrations.0020_request_lines_summary").backfill_lines_summary
+        hotel = make_hotel()
+        room = hotel.room_set.first()
+        dosa = Item.objects.get(hotel=hotel, name="Dosa")
+        tea = Item.objects.create(hotel=hotel, category=dosa.category, name="Tea", price=Decimal("20.00"))
+        order = Request.objects.create(hotel=hotel, room=room, kind="FOOD")
+        for item, qty in ((dosa, 2), (tea, 3)):
+            RequestLine.objects.create(
+                request=order, item=item, name_snapshot=item.name, price_snapshot=item.price,
+                qty=qty, line_total=item.price * qty,
+            )
+        empty = Request.objects.create(hotel=hotel, room=room, kind="FOOD")
+        service = Request.objects.create(hotel=hotel, room=room, kind="SERVICE")
+
+        backfill(django_apps, None)
+
+        order.refresh_from_db()
+        self.assertEqual(order.lines_summary, [{"name": "Dosa", "qty": 2}, {"name": "Tea", "qty": 3}])
+        self.assertEqual(order.item_count, 5)
+        self.assertEqual(
+            Request.objects.filter(pk__in=[empty.pk, service.pk]).values_list("lines_summary", "item_count").distinct().get(),
+            ([], 0),
+        )
+
+
+class LivePollInvalidationTests(TestCase):
+    def setUp(self):
+        self.hotel = make_hotel()
+        self.client.force_login(User.objects.get(username=f"admin-{self.hotel.id}"))
+
+    def _poll(self, etag=None):
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+        return self.client.get(reverse("live_poll"), **headers)
+
+    def test_bulk_room_create_changes_etag(self):
+        first = self._poll()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(self._poll(first["ETag"]).status_code, 304)
+
+        self.client.post(reverse("room_generator"), {
+            "method": "range", "range_floor": "5", "range_start": "500", "range_end": "504",
+        })
+
+        after = self._poll(first["ETag"])
+        self.assertEqual(after.status_code, 200)
+        numbers = {r["number"] for lane in after.json()["rooms"].values() for r in lane}
+        self.assertTrue({"500", "504"} <= numbers)
+
+
+class RoomDeltaTests(TestCase):
+    """Room changes outside check-in / check-out still reach connected boards as deltas."""
+
+    def setUp(self):
+        self.hotel = make_hotel()
+        self.client.force_login(User.objects.get(username=f"admin-{self.hotel.id}"))
+        mute_overview(self)
+
+    def _deltas(self, action):
+        since = current_board_version(self.hotel.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            action()
+        return missed_deltas(self.hotel.id, since, current_board_version(self.hotel.id))
+
+    def test_mark_paid_pushes_room_row(self):
+        room = self.hotel.room_set.first()
+        stay = Stay.objects.create(hotel=self.hotel, room=room, guest_name="Asha", phone="99")
+
+        deltas = self._deltas(lambda: self.client.post(
+            reverse("portal_stay_mark_paid", args=[stay.id]), {"payment_mode": "CASH"}
+        ))
+
+        self.assertEqual([d["type"] for d in deltas], ["room_status_changed"])
+        row = deltas[0]["room"]
+        self.assertEqual((row["id"], row["status"], row["is_paid"]), (room.id, "BUSY", True))
+
+    def test_checkout_confirm_pushes_room_to_cleaning(self):
+        room = self.hotel.room_set.first()
+        stay = Stay.objects.create(hotel=self.hotel, room=room, guest_name="Asha", phone="99")
+
+        deltas = self._deltas(lambda: self.client.post(
+            reverse("portal_stay_checkout_confirm"), {"room_id": room.id}
+        ))
+
+        self.assertEqual(
+            [(d["type"], d["prev_status"], d["room"]["status"]) for d in deltas],
+            [("room_status_changed", "BUSY", "CLEANING")],
+        )
+        stay.refresh_from_db()
+        self.assertEqual(stay.status, "CHECKED_OUT")
+
+    def test_bulk_room_create_sends_one_reset(self):
+        since = current_board_version(self.hotel.id)
+        deltas = self._deltas(lambda: self.client.post(reverse("room_generator"), {
+            "method": "range", "range_floor": "5", "range_start": "500", "range_end": "502",
+        }))
+
+        self.assertEqual([(d["type"], d["version"]) for d in deltas], [("rooms_reset", since + 1)])
+        # the snapshot boards re-fetch already has the new rooms
+        free = get_board_snapshot(self.hotel.id)["data"]["rooms"]["free"]
+        self.assertTrue({"500", "501", "502"} <= {r["number"] for r in free})
+
+
+# Worker A: its own process and database, same Redis. Places a guest order
+# for hotel HOTEL_ID through the real views, then waits for the publish.
+GUEST_WORKER = textwrap.dedent("""
+    import os, sys, time, django
+    sys.path.insert(0, os.getcwd())
+    django.setup()
+    from django.test import Client
+    from django.test.utils import setup_databases, setup_test_environment
+    setup_test_environment()
+    setup_databases(verbosity=0, interactive=False)
+
+    from hotelportal.broadcaster import LiveBoardBroadcaster, live_broadcaster
+    from hotelportal.models import Item
+    from hotelportal.tests import make_hotel
+
+    hotel = make_hotel(id=int(sys.argv[1]))
+    room = hotel.room_set.first()
+    dosa = Item.objects.get(hotel=hotel, name="Dosa")
+    base = f"/h/{hotel.id}/r/{room.id}"
+    client = Client()
+    client.post(base + "/cart/add/", {"item_id": dosa.id, "qty": 2})
+    print(client.post(base + "/order/submit/").json()["request_id"], flush=True)
+    deadline = time.time() + 10
+    while live_broadcaster._tails and time.time() < deadline:
+        time.sleep(0.05)
+    time.sleep(0.5)
+""")
+
+
+@skipUnless(TcpFakeServer, "needs fakeredis")
+class CrossProcessDeliveryTests(TransactionTestCase):
+    """
+    Two workers sharing one Redis channel layer (REDIS_URL): a board socket
+    held by this process (worker B) gets the request_created delta of a
+    guest order placed in a separate process (worker A).
+    """
+    HOTEL_ID = 4242
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.redis = TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+        threading.Thread(target=cls.redis.serve_forever, daemon=True).start()
+        host, port = cls.redis.server_address
+        cls.redis_url = f"redis://{host}:{port}/0"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.redis.shutdown()
+        cls.redis.server_close()
+        super().tearDownClass()
+
+    def test_guest_order_reaches_board_socket_in_other_process(self):
+        hotel = make_hotel(id=self.HOTEL_ID)
+        staff = User.objects.get(username=f"staff-{hotel.id}")
+        layers = {
+            "default": {
+                "BACKEND": "channels_redis.core.RedisChannelLayer",
+                "CONFIG": {"hosts": [self.redis_url]},
+            }
+        }
+        with override_settings(CHANNEL_LAYERS=layers):
+            received = asyncio.run(self._board_socket(staff))
+        self.assertEqual(received["type"], "request_created")
+        self.assertEqual(received["hotel_id"], self.HOTEL_ID)
+        self.assertEqual(received["request"]["kind"], "FOOD")
+        self.assertEqual(received["request"]["id"], self.request_id)
+
+    async def _board_socket(self, staff):
+        comm = WebsocketCommunicator(HotelLiveConsumer.as_asgi(), "/ws/portal/live/")
+        comm.scope["user"] = staff
+        connected, _ = await comm.connect(timeout=10)
+        self.assertTrue(connected)
+        self.assertEqual((await comm.receive_json_from(timeout=10))["type"], "board_state")
+        try:
+            env = {**os.environ, "REDIS_URL": self.redis_url, "DJANGO_SETTINGS_MODULE": "scan2service.settings"}
+            worker = await asyncio.to_thread(
+                subprocess.run,
+                [sys.executable, "-c", GUEST_WORKER, str(self.HOTEL_ID)],
+                cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, timeout=120,
+            )
+            self.assertEqual(worker.returncode, 0, worker.stderr)
+            self.request_id = int(worker.stdout.split()[-1])
+            while True:
+                message = await comm.receive_json_from(timeout=10)
+                if message["type"] != "ping":
+                    return message
+        finally:
+            await comm.disconnect()
+
+
+class FilteredBoardSocketTests(TransactionTestCase):
+    """A board socket narrowed to floors / kinds only gets the deltas that match."""
+
+    def setUp(self):
+        # floor "0": rooms 100-109, floor "1": 110-111
+        self.hotel = make_hotel(rooms=12)
+        self.staff = User.objects.get(username=f"staff-{self.hotel.id}")
+
+    def _order(self, number, kind="FOOD"):
+        room = Room.objects.get(hotel=self.hotel, number=number)
+        req = Request.objects.create(hotel=self.hotel, room=room, kind=kind, note=f"{kind} {number}")
+        publish_request_created(req)
+        return req.id
+
+    async def _socket(self, query=""):
+        comm = WebsocketCommunicator(HotelLiveConsumer.as_asgi(), "/ws/portal/live/?" + query)
+        comm.scope["user"] = self.staff
+        connected, _ = await comm.connect(timeout=10)
+        self.assertTrue(connected)
+        self.assertEqual((await comm.receive_json_from(timeout=10))["type"], "board_state")
+        return comm
+
+    async def _request_ids(self, comm):
+        ids = []
+        while not await comm.receive_nothing(timeout=0.5):
+            message = await comm.receive_json_from()
+            if message["type"] == "request_created":
+                ids.append(message["request"]["id"])
+        return ids
+
+    def test_floor_and_kind_filter(self):
+        async def run():
+            full = await self._socket()
+            self.assertFalse(has_filtered_subscribers(self.hotel.id))
+            narrow = await self._socket("floors=1&kinds=FOOD")
+            self.assertTrue(has_filtered_subscribers(self.hotel.id))
+            try:
+                order = database_sync_to_async(self._order)
+                other_floor = await order("100")
+                service = await order("110", kind="SERVICE")
+                match = await order("111")
+                return await self._request_ids(full), await self._request_ids(narrow), (other_floor, service, match)
+            finally:
+                await full.disconnect()
+                await narrow.disconnect()
+
+        full, narrow, (other_floor, service, match) = asyncio.run(run())
+        self.assertEqual(full, [other_floor, service, match])
+        self.assertEqual(narrow, [match])
+        self.assertFalse(has_filtered_subscribers(self.hotel.id))
+
+    def test_subscribe_message_narrows_an_open_socket(self):
+        async def run():
+            comm = await self._socket()
+            try:
+                await comm.send_json_to({"type": "subscribe", "kinds": ["SERVICE"], "lanes": ["new"]})
+                snapshot = await comm.receive_json_from(timeout=10)
+                order = database_sync_to_async(self._order)
+                await order("100")
+                service = await order("101", kind="SERVICE")
+                return snapshot, await self._request_ids(comm), service
+            finally:
+                await comm.disconnect()
+
+        snapshot, ids, service = asyncio.run(run())
+        self.assertEqual(snapshot["type"], "board_state")
+        self.assertEqual(ids, [service])
+
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        self.flight = SingleFlight()
+        self.calls = 0
+        self.release = None
+
+    async def _build(self):
+        self.calls += 1
+        n = self.calls
+        await self.release.wait()
+        return f"snapshot {n}"
+
+    def _run(self, main):
+        async def wrapper():
+            self.release = asyncio.Event()
+            return await main()
+        return asyncio.run(wrapper())
+
+    def test_concurrent_callers_share_one_run(self):
+        async def main():
+            callers = [asyncio.ensure_future(self.flight.run(8, self._build)) for _ in range(5)]
+            await asyncio.sleep(0)
+            self.release.set()
+            return await asyncio.gather(*callers)
+
+        results = self._run(main)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual({r for r, _ in results}, {"snapshot 1"})
+        self.assertEqual(self.flight.stats(), {"runs": 1, "shared": 4})
+
+    def test_other_key_and_finished_run_start_anew(self):
+        async def main():
+            self.release.set()
+            a = await self.flight.run(8, self._build)
+            b = await self.flight.run(9, self._build)
+            c = await self.flight.run(8, self._build)
+            return a[0], b[0], c[0]
+
+        self.assertEqual(self._run(main), ("snapshot 1", "snapshot 2", "snapshot 3"))
+
+    def test_not_before_skips_a_run_that_started_earlier(self):
+        async def main():
+            early = asyncio.ensure_future(self.flight.run(8, self._build))
+            await asyncio.sleep(0)
+            joined_at = asyncio.get_running_loop().time() + 1
+            late = asyncio.ensure_future(self.flight.run(8, self._build, not_before=joined_at))
+            await asyncio.sleep(0)
+            self.release.set()
+            return await early, await late
+
+        (early, early_at), (late, late_at) = self._run(main)
+        self.assertEqual((early, late), ("snapshot 1", "snapshot 2"))
+        self.assertLess(early_at, late_at)
+
+    def test_cancelled_caller_does_not_cancel_the_run(self):
+        async def main():
+            leaver = asyncio.ensure_future(self.flight.run(8, self._build))
+            stayer = asyncio.ensure_future(self.flight.run(8, self._build))
+            await asyncio.sleep(0)
+            leaver.cancel()
+            self.release.set()
+            return await stayer
+
+        self.assertEqual(self._run(main)[0], "snapshot 1")
+
+    def test_error_reaches_every_caller_and_is_not_kept(self):
+        async def fail():
+            self.calls += 1
+            await self.release.wait()
+            raise RuntimeError("db down")
+
+        async def main():
+            callers = [asyncio.ensure_future(self.flight.run(8, fail)) for _ in range(3)]
+            await asyncio.sleep(0)
+            self.release.set()
+            errors = await asyncio.gather(*callers, return_exceptions=True)
+            retry = await self.flight.run(8, self._build)
+            return errors, retry
+
+        errors, retry = self._run(main)
+        self.assertTrue(all(isinstance(e, RuntimeError) for e in errors))
+        self.assertEqual(retry[0], "snapshot 2")
+
+    def test_disabled_runs_every_caller(self):
+        self.flight.enabled = False
+
+        async def main():
+            callers = [asyncio.ensure_future(self.flight.run(8, self._build)) for _ in range(3)]
+            await asyncio.sleep(0)
+            self.release.set()
+            return await asyncio.gather(*callers)
+
+        self._run(main)
+        self.assertEqual(self.calls, 3)
+
+
+class SendQueueTests(SimpleTestCase):
+    """A paused queue collects what a slow socket would get; resume() shows what is actually sent."""
+
+    def _run(self, fill, max_size=10):
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        async def resync():
+            sent.append({"type": "board_state", "version": "resync"})
+
+        async def main():
+            queue = SendQueue(send, resync, max_size)
+            queue.pause()
+            fill(queue)
+            queue.resume()
+            for _ in range(5):
+                await asyncio.sleep(0)
+            queue.close()
+
+        asyncio.run(main())
+        return [(m["type"], m.get("version") or m.get("tile", {}).get("hotel_id")) for m in sent]
+
+    def test_delta_order_is_kept(self):
+        def fill(queue):
+            for v in (1, 2, 3):
+                queue.put({"type": "request_created", "version": v})
+
+        self.assertEqual(self._run(fill), [("request_created", 1), ("request_created", 2), ("request_created", 3)])
+
+    def test_snapshot_supersedes_older_snapshot_and_covered_deltas(self):
+        def fill(queue):
+            queue.put({"type": "board_state", "version": 1})
+            queue.put({"type": "request_created", "version": 2})
+            queue.put({"type": "request_status_changed", "version": 4})
+            queue.put({"type": "board_state", "version": 3})
+
+        self.assertEqual(self._run(fill), [("request_status_changed", 4), ("board_state", 3)])
+
+    def test_hotel_tile_replaces_same_hotel_only(self):
+        def fill(queue):
+            queue.put({"type": "hotel_tile", "tile": {"hotel_id": 1}})
+            queue.put({"type": "hotel_tile", "tile": {"hotel_id": 2}})
+            queue.put({"type": "hotel_tile", "tile": {"hotel_id": 1, "new": 5}})
+
+        self.assertEqual(self._run(fill), [("hotel_tile", 2), ("hotel_tile", 1)])
+
+    def test_overview_state_replaces_tiles(self):
+        def fill(queue):
+            queue.put({"type": "hotel_tile", "tile": {"hotel_id": 1}})
+            queue.put({"type": "overview_state", "version": 7})
+
+        self.assertEqual(self._run(fill), [("overview_state", 7)])
+
+    def test_overflow_drops_backlog_for_one_resync(self):
+        def fill(queue):
+            for v in range(1, 6):
+                queue.put({"type": "request_created", "version": v})
+
+        self.assertEqual(self._run(fill, max_size=3), [("board_state", "resync")])
+
+    def test_direct_snapshot_cancels_pending_resync(self):
+        def fill(queue):
+            for v in range(1, 5):
+                queue.put({"type": "request_created", "version": v})
+            queue.covered({"type": "board_state", "version": 4})
+            queue.put({"type": "request_created", "version": 5})
+
+        self.assertEqual(self._run(fill, max_size=3), [("request_created", 5)])
+
+    def test_clear_forgets_backlog_and_resync(self):
+        def fill(queue):
+            for v in range(1, 5):
+                queue.put({"type": "request_created", "version": v})
+            queue.clear()
+
+        self.assertEqual(self._run(fill, max_size=3), [])
+
+
+class CompactBoardSocketTests(TransactionTestCase):
+    """The compact board_state carries the hotel header even with no open request."""
+
+    def test_hotel_header_without_open_requests(self):
+        hotel = make_hotel(name="Sea Breeze", staff_whatsapp_group_code="SB-01")
+        staff = User.objects.get(username=f"staff-{hotel.id}")
+
+        async def run():
+            comm = WebsocketCommunicator(
+                HotelLiveConsumer.as_asgi(), "/ws/portal/live/", subprotocols=["scan2service.compact.v1"]
+            )
+            comm.scope["user"] = staff
+            connected, _ = await comm.connect(timeout=10)
+            self.assertTrue(connected)
+            try:
+                return [await comm.receive_json_from(timeout=10) for _ in range(2)]
+            finally:
+                await comm.disconnect()
+
+        encoding, board = asyncio.run(run())
+        self.assertEqual(encoding["type"], "encoding")
+        self.assertEqual((board["type"], board["enc"], board["data"]["new"]), ("board_state", "compact", []))
+        self.assertEqual(board["hotel"], {
+            "hotel_id": hotel.id, "hotel_name": "Sea Breeze", "hotel_staff_group_code": "SB-01",
+        })
+
+
+@override_settings(LIVE_BOARD_BROADCAST_WINDOW=0.05)
+class LiveDbPoolTests(SimpleTestCase):
+    """live_db runs calls on its own LIVE_DB_THREADS-sized pool, not the shared sync thread."""
+
+    async def _run(self, calls, barrier=None):
+        def work():
+            if barrier:
+                barrier.wait(timeout=5)
+            return threading.current_thread().name
+
+        return await asyncio.gather(*(live_db(work)() for _ in range(calls)))
+
+    @override_settings(LIVE_DB_THREADS=3)
+    async def test_calls_run_on_the_dedicated_pool(self):
+        # 3 at a time must be in flight together, or the barrier times out
+        names = await self._run(6, threading.Barrier(3))
+
+        self.assertTrue(all(name.startswith("live-db") for name in names))
+        self.assertEqual(len(set(names)), 3)
+
+    @override_settings(LIVE_DB_THREADS=0)
+    async def test_zero_threads_falls_back_to_the_shared_thread(self):
+        names = await self._run(3)
+
+        self.assertFalse(any(name.startswith("live-db") for name in names))
+        self.assertEqual(len(set(names)), 1)
+
+
+class BroadcasterCoalescingTests(SimpleTestCase):
+    """Signals inside one window fold into one flush, one tile build per hotel."""
+
+    def setUp(self):
+        self.broadcaster = LiveBoardBroadcaster()
+        patcher = mock.patch("hotelportal.board.get_hotel_tile", side_effect=lambda hotel_id: {"hotel_id": hotel_id})
+        self.get_tile = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _flushed(self, hotels):
+        """Stats once the flush has built ``hotels`` tiles (plus a moment for stray flushes)."""
+        for _ in range(200):
+            stats = self.broadcaster.stats()
+            if stats["builds"] + stats["errors"] >= hotels:
+                threading.Event().wait(2 * self.broadcaster.window)
+                return self.broadcaster.stats()
+            threading.Event().wait(0.01)
+        self.fail(f"no flush: {self.broadcaster.stats()}")
+
+    def test_signals_for_one_hotel_build_once(self):
+        for _ in range(10):
+            self.broadcaster.mark_dirty(8)
+        stats = self._flushed(1)
+        self.assertEqual(stats, {"signals": 10, "merged": 9, "flushes": 1, "builds": 1, "errors": 0})
+        self.get_tile.assert_called_once_with(8)
+
+    def test_one_flush_builds_each_hotel(self):
+        for hotel_id in (8, 9, 8, 9, 8):
+            self.broadcaster.mark_dirty(hotel_id)
+        stats = self._flushed(2)
+        self.assertEqual((stats["merged"], stats["flushes"], stats["builds"]), (3, 1, 2))
+        self.assertEqual(sorted(c.args[0] for c in self.get_tile.call_args_list), [8, 9])
+
+
+class LiveStatsViewTests(TestCase):
+    def test_platform_admin_only(self):
+        hotel = make_hotel()
+        self.client.force_login(User.objects.get(username=f"admin-{hotel.id}"))
+        self.assertEqual(self.client.get(reverse("live_stats")).status_code, 403)
+
+        admin = User.objects.create_user(username="platform", password="x", role="PLATFORM_ADMIN")
+        self.client.force_login(admin)
+        body = self.client.get(reverse("live_stats")).json()
+        self.assertEqual(body["pid"], os.getpid())
+        self.assertEqual(set(body["broadcaster"]), {"signals", "merged", "flushes", "builds", "errors"})
+        self.assertEqual(body["events"], realtime.stats())
+
+
+class FanOutTests(TestCase):
+    """realtime.stats() pins how many group messages one event costs."""
+
+    def setUp(self):
+        cache.clear()  # filtered-screen counts of a rolled-back hotel with the same id
+        mute_overview(self)
+        self.hotel = make_hotel()
+        room = self.hotel.room_set.first()
+        stay = Stay.objects.create(hotel=self.hotel, room=room, guest_name="Asha", phone="99")
+        self.request = Request.objects.create(
+            hotel=self.hotel, room=room, stay=stay, kind="SERVICE", status="ACCEPTED"
+        )
+        self.client.force_login(User.objects.get(username=f"staff-{self.hotel.id}"))
+
+    def _complete(self):
+        """(events, messages) that completing the request adds to the request_status_changed stats."""
+        Request.objects.filter(pk=self.request.pk).update(status="ACCEPTED")
+        empty = {"events": 0, "messages": 0}
+        before = realtime.stats().get("request_status_changed", empty)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("live_action", args=[self.request.id]), {"action": "complete"})
+        after = realtime.stats()["request_status_changed"]
+        return after["events"] - before["events"], after["messages"] - before["messages"]
+
+    def test_hotel_without_filtered_screens_skips_sub_groups(self):
+        # board delta + counters delta (hotel group only), guest stream, bot outbox
+        self.assertEqual(self._complete(), (1, 4))
+
+    def test_filtered_screen_gets_the_sub_groups(self):
+        async_to_sync(filtered_joined)(self.hotel.id)
+        # + 8 sub-groups (floor / kind / accepted lane, each exact or "any") + counters group
+        self.assertEqual(self._complete(), (1, 13))
+
+        async_to_sync(filtered_left)(self.hotel.id)
+        self.assertEqual(self._complete(), (1, 4))
+
+
+class OutboxTests(TestCase):
+    """Bot cursors follow the order events become visible, not their ids."""
+
+    def setUp(self):
+        self.hotel = make_hotel()
+        self.room = self.hotel.room_set.first()
+        patcher = mock.patch.object(live_broadcaster, "publish")
+        self.publish = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _request(self):
+        return Request.objects.create(hotel=self.hotel, room=self.room, kind="SERVICE")
+
+    def _record(self, req, event="created"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return record_request_event(req, event)
+
+    def _published_cursors(self):
+        return [c.args[1]["message"]["cursor"] for c in self.publish.call_args_list]
+
+    def test_events_get_consecutive_cursors_after_commit(self):
+        req = self._request()
+        first = self._record(req)
+        second = self._record(req, "accepted")
+
+        replay = events_after(0)
+        self.assertEqual([(e.id, e.event) for e in replay], [(first.id, "created"), (second.id, "accepted")])
+        self.assertEqual(replay[1].seq, replay[0].seq + 1)
+        self.assertEqual(self._published_cursors(), [replay[0].seq, replay[1].seq])
+
+    def test_lower_id_committed_late_is_not_skipped(self):
+        req = self._request()
+        # a slow writer takes the lower id, the next event commits (and is acked) first
+        slow_id = RequestEvent.objects.create(hotel=self.hotel, request=req, event="created").id
+        RequestEvent.objects.filter(pk=slow_id).delete()
+        fast = self._record(req, "accepted")
+        acked = RequestEvent.objects.get(pk=fast.pk).seq
+
+        RequestEvent.objects.create(id=slow_id, hotel=self.hotel, request=req, event="created")
+
+        replay = events_after(acked)
+        self.assertLess(slow_id, fast.id)
+        self.assertEqual([(e.id, e.seq) for e in replay], [(slow_id, acked + 1)])
+
+    def test_ack_cursor_only_moves_forward(self):
+        self.assertEqual(get_cursor("bot"), 0)
+        ack_cursor("bot", 5)
+        ack_cursor("bot", 3)
+        self.assertEqual(get_cursor("bot"), 5)
+        ack_cursor("bot", 9)
+        self.assertEqual(get_cursor("bot"), 9)
+
+
+class KitchenQueueTests(TestCase):
+    """KitchenQueueItem follows open FOOD orders and matches rebuild_kitchen_queue."""
+
+    def setUp(self):
+        cache.clear()  # menu cached for a rolled-back hotel with the same id
+        mute_overview(self)
+        self.hotel = make_hotel()
+        self.room = self.hotel.room_set.first()
+        self.dosa = Item.objects.get(hotel=self.hotel, name="Dosa")
+        self.tea = Item.objects.create(hotel=self.hotel, category=self.dosa.category, name="Tea", price=20)
+        self.client.force_login(User.objects.get(username=f"staff-{self.hotel.id}"))
+
+    def _order(self, *lines):
+        base = f"/h/{self.hotel.id}/r/{self.room.id}"
+        for item, qty in lines:
+            self.client.post(base + "/cart/add/", {"item_id": item.id, "qty": qty})
+        return Request.objects.get(pk=self.client.post(base + "/order/submit/").json()["request_id"])
+
+    def _act(self, req, action):
+        response = self.client.post(reverse("live_action", args=[req.id]), {"action": action})
+        self.assertEqual(response.json(), {"ok": True})
+
+    def _queue(self):
+        return {
+            row[0]: row[1:]
+            for row in KitchenQueueItem.objects.filter(hotel=self.hotel)
+            .values_list("name", "qty", "tickets", "oldest_at")
+        }
+
+    def test_orders_enter_and_leave_the_queue(self):
+        first = self._order((self.dosa, 2))
+        self.assertEqual(self._queue(), {"Dosa": (2, 1, first.created_at)})
+
+        second = self._order((self.dosa, 3), (self.tea, 1))
+        self._act(first, "accept")
+        self.assertEqual(self._queue(), {
+            "Dosa": (5, 2, first.created_at),
+            "Tea": (1, 1, second.created_at),
+        })
+
+        # the oldest ticket leaves: Dosa now waits since the second order
+        self._act(first, "complete")
+        self.assertEqual(self._queue(), {
+            "Dosa": (3, 1, second.created_at),
+            "Tea": (1, 1, second.created_at),
+        })
+
+        self._act(second, "cancel")
+        self.assertEqual(self._queue(), {})
+
+    def test_rebuild_matches_the_incremental_queue(self):
+        first = self._order((self.dosa, 2), (self.tea, 2))
+        self._order((self.dosa, 1))
+        third = self._order((self.tea, 4))
+        self._act(first, "accept")
+        self._act(third, "cancel")
+        incremental = self._queue()
+
+        KitchenQueueItem.objects.filter(hotel=self.hotel).update(qty=99, tickets=99)
+        call_command("rebuild_kitchen_queue", stdout=StringIO())
+
+        self.assertEqual(self._queue(), incremental)
+
+
+class OverviewTileTests(TestCase):
+    """A hotel's overview tile is marked dirty and rebuilt after orders, status changes and check-ins."""
+
+    def setUp(self):
+        cache.clear()  # menu cached for a rolled-back hotel with the same id
+        mute_overview(self)
+        self.hotel = make_hotel()
+        self.room = self.hotel.room_set.first()
+        self.dosa = Item.objects.get(hotel=self.hotel, name="Dosa")
+        self.client.force_login(User.objects.get(username=f"staff-{self.hotel.id}"))
+
+    def _tile(self):
+        return {k: v for k, v in get_hotel_tile(self.hotel.id).items() if k != "name"}
+
+    def _post(self, url, data=None):
+        """POST, run the on-commit hooks and check the tile was marked for a refresh."""
+        live_broadcaster.mark_dirty.reset_mock()
+        with self.captureOnCommitCallbacks(execute=True):
+            body = self.client.post(url, data or {}).json()
+        live_broadcaster.mark_dirty.assert_called_with(self.hotel.id)
+        return body
+
+    def test_tile_follows_orders_and_rooms(self):
+        self.assertEqual(self._tile(), {
+            "hotel_id": self.hotel.id, "new": 0, "accepted": 0, "oldest_new_at": None,
+            "rooms": {"free": 3, "busy": 0, "cleaning": 0},
+        })
+
+        base = f"/h/{self.hotel.id}/r/{self.room.id}"
+        self.client.post(base + "/cart/add/", {"item_id": self.dosa.id})
+        order = Request.objects.get(pk=self._post(base + "/order/submit/")["request_id"])
+        tile = self._tile()
+        self.assertEqual((tile["new"], tile["accepted"]), (1, 0))
+        self.assertEqual(tile["oldest_new_at"], order.created_at.isoformat())
+
+        self._post(reverse("live_action", args=[order.id]), {"action": "accept"})
+        tile = self._tile()
+        self.assertEqual((tile["new"], tile["accepted"], tile["oldest_new_at"]), (0, 1, None))
+
+        self._post(reverse("portal_stay_checkin"), {"room_id": self.room.id, "guest_name": "Asha", "phone": "99"})
+        self.assertEqual(self._tile()["rooms"], {"free": 2, "busy": 1, "cleaning": 0})
+        self.assertIn(get_hotel_tile(self.hotel.id), build_overview_payload()["tiles"])
+
+
+class DailyCounterTests(TestCase):
+    """Staff actions bump one row per hotel per day; rebuild_daily_counters arrives at the same rows."""
+
+    def setUp(self):
+        mute_overview(self)
+        self.hotel = make_hotel()
+        self.other = make_hotel("Other")
+        self.room = self.hotel.room_set.first()
+        self.client.force_login(User.objects.get(username=f"staff-{self.hotel.id}"))
+
+    def _rows(self):
+        return set(DailyRequestCounter.objects.values_list("hotel_id", "day", "completed", "cancelled"))
+
+    def _act(self, req, action):
+        response = self.client.post(reverse("live_action", args=[req.id]), {"action": action})
+        self.assertEqual(response.json(), {"ok": True})
+
+    def _finish(self, action):
+        req = Request.objects.create(hotel=self.hotel, room=self.room, kind="SERVICE", status="ACCEPTED")
+        self._act(req, action)
+        return req
+
+    def test_bump_creates_then_increments_todays_row(self):
+        today = timezone.localdate()
+        yesterday = today - timezone.timedelta(days=1)
+        DailyRequestCounter.objects.create(hotel=self.hotel, day=yesterday, completed=4)
+
+        bump_daily_counter(self.hotel.id, "completed")
+        bump_daily_counter(self.hotel.id, "completed")
+        bump_daily_counter(self.hotel.id, "cancelled")
+        bump_daily_counter(self.other.id, "cancelled")
+
+        self.assertEqual(self._rows(), {
+            (self.hotel.id, yesterday, 4, 0),
+            (self.hotel.id, today, 2, 1),
+            (self.other.id, today, 0, 1),
+        })
+
+    def test_today_counts_reads_the_counters(self):
+        DailyRequestCounter.objects.create(
+            hotel=self.hotel, day=timezone.localdate() - timezone.timedelta(days=1), completed=9
+        )
+        self._finish("complete")
+        self._finish("cancel")
+        bump_daily_counter(self.other.id, "completed")
+
+        self.assertEqual(today_counts(self.hotel.id), {"completed_today": 1, "cancelled_today": 1})
+        self.assertEqual(today_counts(None), {"completed_today": 2, "cancelled_today": 1})
+
+    def test_rebuild_matches_the_incremental_counters(self):
+        yesterday = timezone.now() - timezone.timedelta(days=1)
+        for action in ("complete", "complete", "cancel"):
+            self._finish(action)
+        Request.objects.create(
+            hotel=self.hotel, room=self.room, kind="SERVICE", status="COMPLETED", completed_at=yesterday
+        )
+        DailyRequestCounter.objects.create(hotel=self.hotel, day=timezone.localdate(yesterday), completed=1)
+        incremental = self._rows()
+        today_row = DailyRequestCounter.objects.get(hotel=self.hotel, day=timezone.localdate())
+
+        DailyRequestCounter.objects.update(completed=7, cancelled=7)
+        stale = DailyRequestCounter.objects.create(
+            hotel=self.other, day=timezone.localdate() - timezone.timedelta(days=3), completed=5
+        )
+        call_command("rebuild_daily_counters", stdout=StringIO())
+
+        stale.refresh_from_db()
+        self.assertEqual((stale.completed, stale.cancelled), (0, 0))
+        stale.delete()
+        # every hotel gets a row for today, so later bumps only ever UPDATE
+        self.assertEqual(self._rows(), incremental | {(self.other.id, timezone.localdate(), 0, 0)})
+        # rewritten in place, not deleted and re-inserted under concurrent bumps
+        self.assertTrue(DailyRequestCounter.objects.filter(pk=today_row.pk, completed=2).exists())
+
+
+@mock.patch.dict(os.environ, {"STAFF_BOT_KEY": "test-bot-key"})
+class BotSocketTests(TransactionTestCase):
+    """The bot socket replays from its cursor, streams new events and resumes from its ack."""
+    serialized_rollback = True  # keeps the RequestEventSequence row seeded by migration 0024
+
+    def setUp(self):
+        self.hotel = make_hotel()
+        self.req = Request.objects.create(hotel=self.hotel, room=self.hotel.room_set.first(), kind="SERVICE")
+
+    def _record(self, event):
+        with transaction.atomic():
+            record_request_event(self.req, event)
+
+    async def _bot(self, query=""):
+        comm = WebsocketCommunicator(
+            HotelLiveConsumer.as_asgi(), "/ws/portal/live/?bot_key=test-bot-key&bot_name=bot" + query
+        )
+        connected, _ = await comm.connect(timeout=10)
+        self.assertTrue(connected)
+        return comm
+
+    async def _events(self, comm):
+        out = []
+        while not await comm.receive_nothing(timeout=0.5):
+            message = await comm.receive_json_from()
+            out.append((message["cursor"], message["event"]))
+        return out
+
+    def test_replay_stream_ack_and_resume(self):
+        self._record("created")
+        self._record("accepted")
+
+        async def first_session():
+            comm = await self._bot("&cursor=0")
+            try:
+                replayed = await self._events(comm)
+                await database_sync_to_async(self._record)("completed")
+                streamed = await self._events(comm)
+                await comm.send_json_to({"type": "ack", "cursor": streamed[-1][0]})
+                await comm.receive_nothing(timeout=0.3)
+                return replayed, streamed
+            finally:
+                await comm.disconnect()
+
+        replayed, streamed = asyncio.run(first_session())
+        self.assertEqual([e for _, e in replayed], ["created", "accepted"])
+        self.assertEqual(streamed, [(replayed[-1][0] + 1, "completed")])
+        self.assertEqual(get_cursor("bot"), streamed[-1][0])
+
+        self._record("cancelled")  # while the bot is away
+
+        async def second_session():
+            comm = await self._bot()
+            try:
+                return await self._events(comm)
+            finally:
+                await comm.disconnect()
+
+        self.assertEqual(asyncio.run(second_session()), [(streamed[-1][0] + 1, "cancelled")])
@@ -3,6 +3,7 @@ from . import views
 from django.urls import path
 from . import views_live  # NEW file below
 from . import views_billing
+from . import views_kitchen
 from . import consumers
 
 
@@ -38,9 +39,16 @@ urlpatterns = [
     # --- Live Board (relative paths; project urls.py prefixes with 'portal/') ---
     path("live/", views_live.live_board, name="live_board"),
     path("live/poll/", views_live.live_poll, name="live_poll"),
+    path("live/stream/", views_live.live_stream, name="live_stream"),
+    path("live/overview/", views_live.live_overview, name="live_overview"),
+    path("live/stats/", views_live.live_stats, name="live_stats"),
     path("live/<int:request_id>/action/", views_live.live_action, name="live_action"),
     path("live/<int:request_id>/detail/", views_live.live_detail, name="live_detail"),
 
+    # Kitchen display (aggregated prep queue)
+    path("kitchen/", views_kitchen.kitchen_board, name="kitchen_board"),
+    path("kitchen/stream/", views_kitchen.kitchen_stream, name="kitchen_stream"),
+
     # History page (stub for now)
    
     path("requests/history/", views_live.history_view, name="portal_requests_history"),
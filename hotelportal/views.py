@@ -12,6 +12,8 @@ from django.conf import settings
 from django.db.models import Prefetch
 from .forms import CategoryForm, ItemForm, InvoiceSettingsForm
 from .models import Category, Item, ImageAsset
+from . import realtime
+from .board import bump_data_version
 from django.db import IntegrityError, transaction
 from hotelportal.decorators import portal_required
 from django.urls import reverse
@@ -115,6 +117,7 @@ def room_create(request):
             room.hotel = request.user.hotel
             try:
                 room.save()
+                realtime.room_status_changed(room, None)
                 messages.success(request, f"Room {room.number} created successfully.")
                 return redirect("rooms_list")
             except IntegrityError:
@@ -133,7 +136,8 @@ def room_edit(request, pk):
     if request.method == "POST":
         form = RoomForm(request.POST, instance=room)
         if form.is_valid():
-            form.save()
+            room = form.save()
+            realtime.room_status_changed(room, room.status)
             return redirect("rooms_list")
     else:
         form = RoomForm(instance=room)
@@ -152,6 +156,8 @@ def room_delete(request, pk):
         messages.error(request, "Cannot delete: room has an active stay. Check out first.")
         return redirect("rooms_list")
     number = room.number
+    # No delta removes a room: boards drop it on their next snapshot (the
+    # delete bumps the data version, so their background poll gets a 200)
     room.delete()  # CASCADE wipes related Stays (and later Requests)
     messages.success(request, f"Room {number} deleted permanently.")
     return redirect("rooms_list")
@@ -275,10 +281,14 @@ def room_generator(request):
 
     # ── Bulk create inside a transaction ──────────────────
     with transaction.atomic():
-        Room.objects.bulk_create([
+        created = Room.objects.bulk_create([
             Room(hotel=hotel, number=r["number"], floor=r["floor"], is_active=is_active)
             for r in to_create
         ])
+        # bulk_create sends no post_save: invalidate the live board by hand,
+        # then tell boards to re-fetch it once (not one delta per room)
+        bump_data_version(hotel.id)
+        realtime.rooms_added(hotel.id, created)
 
     msg = f"{len(to_create)} room(s) created successfully."
     if skipped:
@@ -0,0 +1,63 @@
+# hotelportal/views_kitchen.py  (Kitchen display — aggregated prep queue)
+
+import json
+
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponseForbidden, HttpResponseNotAllowed
+from django.shortcuts import render
+
+from hotelportal.decorators import is_portal_user, portal_required
+from hotelportal.broadcaster import kitchen_group
+from hotelportal.kitchen import kitchen_state
+from hotelportal.sse import group_event_stream, sse_frame, sse_response
+
+
+def _kitchen_hotel_id(request):
+    user = request.user
+    if not user.is_authenticated or not is_portal_user(user):
+        return None
+    hotel = getattr(user, "hotel", None)
+    return hotel.id if hotel else None
+
+
+@login_required
+@portal_required
+def kitchen_board(request):
+    """
+    Kitchen screen: one card per item with the open quantity across NEW and
+    ACCEPTED food orders ("7 × Masala Dosa, oldest 6 min").
+    """
+    hotel = getattr(request.user, "hotel", None)
+    if not hotel:
+        return HttpResponseForbidden("No hotel set")
+
+    state = kitchen_state(hotel.id)
+    return render(request, "hotelportal/kitchen.html", {
+        "hotel": hotel,
+        "kitchen_initial_json": json.dumps(state["items"]),
+    })
+
+
+async def kitchen_stream(request):
+    """
+    SSE for the kitchen screen: kitchen_state on connect, then one
+    kitchen_update per order change. (Async view: auth checked inline.)
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+
+    hotel_id = await sync_to_async(_kitchen_hotel_id)(request)
+    if not hotel_id:
+        return HttpResponseForbidden("Not allowed")
+
+    async def opening():
+        return [sse_frame(await database_sync_to_async(kitchen_state)(hotel_id))]
+
+    def render_message(message):
+        if message.get("type") != "kitchen.push":
+            return None
+        return sse_frame(message.get("payload") or {})
+
+    return sse_response(group_event_stream(kitchen_group(hotel_id), opening, render_message))
@@ -1,13 +1,16 @@
 # Day 5.3 — Staff Live Board (polling), with detail popup and today counters.
-from django.views.decorators.http import require_POST, require_GET
+import asyncio
+import os
+from contextlib import aclosing
+from django.views.decorators.http import require_POST, require_GET, condition
 import json
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.http import JsonResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponse
+from django.http import JsonResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponse, HttpResponseNotAllowed
 from django.shortcuts import render, get_object_or_404, redirect
 from django.template.loader import render_to_string
 from django.utils import timezone
 from .models import Request,Room, Stay, WhatsAppTemplate 
-from hotelportal.decorators import portal_required
+from hotelportal.decorators import is_portal_user, portal_required
 from django.core.paginator import Paginator
 from django.db.models import Q, Sum, Prefetch, Count
 import csv
@@ -15,9 +18,32 @@ from django.db import transaction
 from django.contrib import messages
 from decimal import Decimal, ROUND_HALF_UP
 from hotelportal.models import Stay, Request, HotelBillingSettings,Room
-from hotelportal.realtime import push_live_board
-from hotelportal.sockets import broadcast_portal_board
-from asgiref.sync import async_to_sync
+from hotelportal import realtime
+from hotelportal.broadcaster import ALL_HOTELS_GROUP, hotel_group, live_broadcaster
+from hotelportal.board_filters import (
+    FilterError,
+    describe,
+    filter_snapshot,
+    filtered_joined,
+    filtered_left,
+    parse_filter,
+    subscription_groups,
+)
+from hotelportal.live_db import live_db
+from hotelportal.singleflight import board_snapshots
+from hotelportal.sse import group_event_stream, last_event_id, sse_frame, sse_response
+from hotelportal.board import (
+    board_etag,
+    board_resume,
+    build_overview_payload,
+    bump_daily_counter,
+    current_board_version,
+    board_versions,
+    bump_data_version,
+    get_board_snapshot,
+)
+from website.models import Hotel
+from asgiref.sync import async_to_sync, sync_to_async
 from channels.layers import get_channel_layer
 # hotelportal/views_live.py
 from urllib.parse import urlencode, quote
@@ -85,144 +111,16 @@ def _hotel_or_403(request):
         return None
     return hotel
 
-def _serialize_requests(qs, hotel=None):
+def _board_hotel(request):
     """
-    Serialize Request queryset for Live Board / polling.
-
-    Day-14 addition:
-      - include hotel_id
-      - include hotel_staff_group_code (for external WhatsApp sender script)
-    """
-    # Resolve hotel once, if not provided
-    if hotel is None:
-        # If qs is non-empty, take hotel from the first row
-        first = qs[0] if qs else None
-        hotel = getattr(first, "hotel", None)
-
-    hotel_id = hotel.id if hotel else None
-    staff_group_code = ""
-
-    if hotel and hasattr(hotel, "staff_whatsapp_group_code"):
-        staff_group_code = hotel.staff_whatsapp_group_code or ""
-
-    out = []
-    for r in qs:
-        row_hotel_id = hotel_id or getattr(r.hotel, "id", None)
-        row_group_code = staff_group_code
-        if not row_group_code and hasattr(r.hotel, "staff_whatsapp_group_code"):
-            row_group_code = r.hotel.staff_whatsapp_group_code or ""
-
-        out.append(
-            {
-                "id": r.id,
-                "room": r.room.number if r.room else "",
-                "kind": r.kind,
-                "status": r.status,
-                "subtotal": float(r.subtotal or 0),
-                "created_at": r.created_at.isoformat(),
-                "accepted_at": r.accepted_at.isoformat() if r.accepted_at else None,
-                "completed_at": r.completed_at.isoformat() if r.completed_at else None,
-                "cancelled_at": r.cancelled_at.isoformat() if r.cancelled_at else None,
-                "note": r.note or "",
-                "lines": [
-                    {"name": ln.name_snapshot, "qty": ln.qty}
-                    for ln in r.lines.all()
-                ],
-                # 👇 extra for the bot script
-                "hotel_id": row_hotel_id,
-                "hotel_staff_group_code": row_group_code,
-            }
-        )
-    return out
-
-
-
-
-def _serialize_rooms(qs):
-    # expect qs = Room.objects.filter(hotel=...).select_related("current_stay")
-    out = []
-    for rm in qs:
-        st = rm.current_stay
-        out.append({
-            "id": rm.id,
-            "number": rm.number,
-            "floor": rm.floor,
-            "status": rm.status,  # FREE / BUSY / CLEANING
-            "guest_name": st.guest_name if st else "",
-            "guest_phone": st.phone if st else "",
-
-            # Billing info for live board (Day-10)
-            "stay_id": st.id if st else None,
-            "total_due": float(st.total_due or 0) if st else 0.0,
-            "is_paid": bool(st.is_paid) if st else False,
-        })
-    return out
-
-
-def _broadcast_live_board(hotel):
+    Hotel whose live board this request is about: the user's own hotel, or
+    for a PLATFORM_ADMIN the drill-down ?hotel=<id> (None = overview).
     """
-    Build a fresh board_state snapshot and push it via WebSocket
-    to the correct hotel group (or 'all' for platform admin).
-    """
-    channel_layer = get_channel_layer()
-    if not channel_layer:
-        return  # channel layer misconfigured or disabled
-
-    qs = Request.objects.all()
-    room_qs = Room.objects.all()
-    if hotel:
-        qs = qs.filter(hotel=hotel)
-        room_qs = room_qs.filter(hotel=hotel)
-
-    new_qs = qs.filter(status="NEW").select_related("room").order_by("-created_at")[:100]
-    acc_qs = qs.filter(status="ACCEPTED").select_related("room").order_by("-updated_at")[:100]
-
-    today = timezone.localdate()
-    counts = {
-        "completed_today": qs.filter(status="COMPLETED", completed_at__date=today).count(),
-        "cancelled_today": qs.filter(status="CANCELLED", cancelled_at__date=today).count(),
-    }
-
-    room_qs = room_qs.select_related("current_stay").order_by("floor", "number")
-    free_rooms     = [r for r in room_qs if r.status == "FREE"]
-    busy_rooms     = [r for r in room_qs if r.status == "BUSY"]
-    cleaning_rooms = [r for r in room_qs if r.status == "CLEANING"]
-
-    payload = {
-        "type": "board_state",
-        "data": {
-            "new": _serialize_requests(new_qs,  hotel=hotel),
-            "accepted": _serialize_requests(acc_qs,  hotel=hotel),
-            "counts": counts,
-            "rooms": {
-                "free": _serialize_rooms(free_rooms),
-                "busy": _serialize_rooms(busy_rooms),
-                "cleaning": _serialize_rooms(cleaning_rooms),
-            }
-        }
-    }
-
-    # Per-hotel group (portal UI)
-    if hotel:
-        async_to_sync(channel_layer.group_send)(
-            f"hotel_portal_live_{hotel.id}",
-            {
-                "type": "board.push",
-                "payload": payload,
-            },
-        )
-
-    # Global group for staff-bot / platform listeners
-    async_to_sync(channel_layer.group_send)(
-        "hotel_portal_live_all",
-        {
-            "type": "board.push",
-            "payload": payload,
-        },
-    )
-
-
-
+    hotel = getattr(request.user, "hotel", None)
+    if hotel or getattr(request.user, "role", None) != "PLATFORM_ADMIN":
+        return hotel
+    raw = request.GET.get("hotel") or ""
+    return Hotel.objects.filter(id=raw).first() if raw.isdigit() else None
 
 
 @login_required
@@ -234,35 +132,23 @@ def live_board(request):
       - 3 lanes for rooms: FREE, BUSY, CLEANING
     This is our operations screen, different from layout page.
     """
-    hotel = _hotel_or_403(request)
-    if not hotel and getattr(request.user, "role", None) != "PLATFORM_ADMIN":
+    hotel = _board_hotel(request)
+    if not hotel:
+        if getattr(request.user, "role", None) == "PLATFORM_ADMIN":
+            return redirect("live_overview")  # pick a hotel first
         return HttpResponseForbidden("No hotel set")
 
-    # -----------------------
-    # Requests (existing)
-    # -----------------------
-    qs = Request.objects.all()
-    if hotel:
-        qs = qs.filter(hotel=hotel)
+    # Optional ?floors=&kinds=&lanes= (floor supervisor / kitchen / housekeeping)
+    board_filter = _board_filter_or_none(request, hotel)
 
-    new_qs = qs.filter(status="NEW").select_related("room").order_by("-created_at")[:100]
-    acc_qs = qs.filter(status="ACCEPTED").select_related("room").order_by("-updated_at")[:100]
-
-    today = timezone.localdate()
-    completed_today = qs.filter(status="COMPLETED", completed_at__date=today).count()
-    cancelled_today = qs.filter(status="CANCELLED", cancelled_at__date=today).count()
-
-    # -----------------------
-    # Rooms (existing)
-    # -----------------------
-    room_qs = Room.objects.all()
-    if hotel:
-        room_qs = room_qs.filter(hotel=hotel)
-    room_qs = room_qs.select_related("current_stay").order_by("floor", "number")
+    # Same query string for the socket / stream / poll URLs
+    live_qs = {k: ",".join(v) for k, v in (describe(board_filter) or {}).items() if v}
+    if not getattr(request.user, "hotel", None):
+        live_qs["hotel"] = hotel.id  # platform admin drill-down
 
-    free_rooms     = [r for r in room_qs if r.status == "FREE"]
-    busy_rooms     = [r for r in room_qs if r.status == "BUSY"]
-    cleaning_rooms = [r for r in room_qs if r.status == "CLEANING"]
+    # Shared, cached snapshot (same one live_poll and the sockets serve)
+    snapshot = filter_snapshot(get_board_snapshot(hotel.id), board_filter)
+    board = snapshot["data"]
 
     # -----------------------
     # 13.1B — WhatsApp templates
@@ -277,15 +163,18 @@ def live_board(request):
 
     from django.conf import settings as django_settings
     ctx = {
-        "new_initial_json": json.dumps(_serialize_requests(new_qs, hotel=hotel)),
-        "accepted_initial_json": json.dumps(_serialize_requests(acc_qs, hotel=hotel)),
-        "completed_today": completed_today,
-        "cancelled_today": cancelled_today,
+        "new_initial_json": json.dumps(board["new"]),
+        "accepted_initial_json": json.dumps(board["accepted"]),
+        "completed_today": board["counts"]["completed_today"],
+        "cancelled_today": board["counts"]["cancelled_today"],
 
         # rooms initial json
-        "free_rooms_json": json.dumps(_serialize_rooms(free_rooms)),
-        "busy_rooms_json": json.dumps(_serialize_rooms(busy_rooms)),
-        "cleaning_rooms_json": json.dumps(_serialize_rooms(cleaning_rooms)),
+        "free_rooms_json": json.dumps(board["rooms"]["free"]),
+        "busy_rooms_json": json.dumps(board["rooms"]["busy"]),
+        "cleaning_rooms_json": json.dumps(board["rooms"]["cleaning"]),
+        "board_version": snapshot["version"],
+        "board_filter_json": json.dumps(describe(board_filter)),
+        "live_qs": ("?" + urlencode(live_qs)) if live_qs else "",
 
         # 13.1B: WhatsApp templates for JS
         "wa_templates_json": json.dumps(wa_templates),
@@ -300,47 +189,185 @@ def live_board(request):
 
 
 
+def _board_filter_or_none(request, hotel):
+    """Board filter from the query string; ignored without a hotel or when invalid."""
+    if not hotel:
+        return None
+    try:
+        return parse_filter(request.GET)
+    except FilterError:
+        return None
+
+
 # -----------------------------
-# 7.2 — LIVE POLL (AJAX)
+# PLATFORM OVERVIEW — one tile per hotel, drill down to a board
 # -----------------------------
+@login_required
+@portal_required
+def live_overview(request):
+    """
+    PLATFORM_ADMIN landing for the live screens: per-hotel tiles (open
+    requests, oldest NEW, room counts). Hotel users go to their own board.
+    """
+    if getattr(request.user, "hotel", None) or request.user.role != "PLATFORM_ADMIN":
+        return redirect("live_board")
+
+    overview = build_overview_payload()
+    return render(request, "hotelportal/live_overview.html", {
+        "tiles_initial_json": json.dumps(overview["tiles"]),
+    })
+
+
 @login_required
 @portal_required
 @require_GET
-def live_poll(request):
-    hotel = _hotel_or_403(request)
-    if not hotel and request.user.role != "PLATFORM_ADMIN":
-        return JsonResponse({"ok": False, "error": "no-hotel"}, status=403)
+def live_stats(request):
+    """
+    PLATFORM_ADMIN: this worker process's live broadcaster counters
+    (signals, merged, flushes, builds, errors; see broadcaster.py) and the
+    per-event fan-out (realtime.stats). Each Daphne worker keeps its own,
+    so ``pid`` says which one answered.
+    """
+    if request.user.role != "PLATFORM_ADMIN":
+        return HttpResponseForbidden("Platform admins only.")
+    return JsonResponse({
+        "pid": os.getpid(),
+        "broadcaster": live_broadcaster.stats(),
+        "events": realtime.stats(),
+    })
 
-    qs = Request.objects.filter(hotel=hotel) if hotel else Request.objects.all()
 
-    new_qs = qs.filter(status="NEW").select_related("room").order_by("-created_at")[:100]
-    acc_qs = qs.filter(status="ACCEPTED").select_related("room").order_by("-updated_at")[:100]
+# -----------------------------
+# 7.2 — LIVE POLL (AJAX)
+# -----------------------------
+def _live_poll_etag(request):
+    # Platform overview has no single counter → no validator
+    hotel = _board_hotel(request)
+    return board_etag(hotel.id) if hotel else None
 
-    today = timezone.localdate()
-    counts = {
-        "completed_today": qs.filter(status="COMPLETED", completed_at__date=today).count(),
-        "cancelled_today": qs.filter(status="CANCELLED", cancelled_at__date=today).count(),
-    }
 
-    # rooms
-    room_qs = Room.objects.filter(hotel=hotel) if hotel else Room.objects.all()
-    room_qs = room_qs.select_related("current_stay").order_by("floor", "number")
+@login_required
+@portal_required
+@require_GET
+@condition(etag_func=_live_poll_etag)
+def live_poll(request):
+    """
+    Board JSON for the 8 s poll. Answers 304 Not Modified when the
+    client's If-None-Match still matches the hotel's change counters.
+    """
+    hotel = _board_hotel(request)
+    if not hotel and request.user.role != "PLATFORM_ADMIN":
+        return JsonResponse({"ok": False, "error": "no-hotel"}, status=403)
 
-    free_rooms     = [r for r in room_qs if r.status == "FREE"]
-    busy_rooms     = [r for r in room_qs if r.status == "BUSY"]
-    cleaning_rooms = [r for r in room_qs if r.status == "CLEANING"]
+    if not hotel:
+        # platform overview: tiles only, never every hotel's rows
+        return JsonResponse({"ok": True, **build_overview_payload()})
 
-    return JsonResponse({
+    # Re-read: the body and its ETag must come from the same counters
+    versions = board_versions(hotel.id)
+    snapshot = filter_snapshot(
+        get_board_snapshot(hotel.id, versions), _board_filter_or_none(request, hotel)
+    )
+    resp = JsonResponse({
         "ok": True,
-        "new": _serialize_requests(new_qs, hotel=hotel),
-        "accepted": _serialize_requests(acc_qs, hotel=hotel),
-        "counts": counts,
-        "rooms": {
-            "free": _serialize_rooms(free_rooms),
-            "busy": _serialize_rooms(busy_rooms),
-            "cleaning": _serialize_rooms(cleaning_rooms),
-        }
+        "version": snapshot["version"],
+        **snapshot["data"],
     })
+    resp["ETag"] = board_etag(hotel.id, versions)
+    resp["Cache-Control"] = "private, no-cache"
+    return resp
+
+
+# -----------------------------
+# LIVE STREAM (SSE) — for screens whose WebSocket is blocked
+# -----------------------------
+def _stream_hotel_id(request):
+    """(allowed, hotel_id, filter) for the SSE stream; hotel_id None = all hotels."""
+    user = request.user
+    if not user.is_authenticated or not is_portal_user(user):
+        return False, None, None
+    hotel = _board_hotel(request)
+    if not hotel and user.role != "PLATFORM_ADMIN":
+        return False, None, None
+    return True, (hotel.id if hotel else None), _board_filter_or_none(request, hotel)
+
+
+async def live_stream(request):
+    """
+    Server-Sent Events twin of the /ws/portal/live/ socket: same group,
+    same JSON. Opens with a board_state, or on reconnect (Last-Event-ID)
+    with just the deltas missed since then, then streams the deltas.
+    Takes the same ?floors=&kinds=&lanes= filter as the socket.
+    (Async view: Django 4.2's login_required / require_GET can't wrap it,
+    so both checks are inline.)
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    allowed, hotel_id, board_filter = await sync_to_async(_stream_hotel_id)(request)
+    if not allowed:
+        return HttpResponseForbidden("Not allowed")
+
+    if board_filter:
+        groups = subscription_groups(hotel_id, board_filter)
+    else:
+        groups = [hotel_group(hotel_id) if hotel_id else ALL_HOTELS_GROUP]
+    resume_from = last_event_id(request)
+    seen = {"version": 0}
+
+    async def opening():
+        if not hotel_id:
+            return [sse_frame(await live_db(build_overview_payload)())]
+        if resume_from is None:
+            # Shared with concurrent sockets / streams of this hotel (single-flight)
+            joined_at = asyncio.get_running_loop().time()
+            snapshot, started_at = await board_snapshots.run(
+                hotel_id, lambda: live_db(get_board_snapshot)(hotel_id)
+            )
+            messages = [filter_snapshot(snapshot, board_filter)]
+            if started_at < joined_at:
+                # build began before we joined: anything published in between?
+                current, _ = await board_snapshots.run(
+                    ("version", hotel_id),
+                    lambda: live_db(current_board_version)(hotel_id),
+                    not_before=joined_at,
+                )
+                if current > snapshot["version"]:
+                    messages += await live_db(board_resume)(
+                        hotel_id, snapshot["version"], board_filter
+                    )
+        else:
+            # Reconnect: only the missed deltas (or a snapshot if too far behind)
+            messages = await live_db(board_resume)(hotel_id, resume_from, board_filter)
+            seen["version"] = resume_from
+        if messages:
+            seen["version"] = max(seen["version"], messages[-1]["version"])
+        return [sse_frame(m, m["version"]) for m in messages]
+
+    def render(message):
+        if message.get("type") != "board.push":
+            return None
+        payload = message.get("payload") or {}
+        version = payload.get("version")
+        if not hotel_id:
+            return sse_frame(payload)
+        if not isinstance(version, int) or version <= seen["version"]:
+            return None  # already covered by the opening snapshot
+        seen["version"] = version
+        return sse_frame(payload, version)
+
+    stream = group_event_stream(groups, opening, render)
+    return sse_response(_counted_filtered(hotel_id, stream) if board_filter else stream)
+
+
+async def _counted_filtered(hotel_id, stream):
+    """A filtered stream, counted in board_filters' per-hotel count while it is open."""
+    await filtered_joined(hotel_id)
+    try:
+        async with aclosing(stream):
+            async for frame in stream:
+                yield frame
+    finally:
+        await filtered_left(hotel_id)
 
 
 
@@ -366,37 +393,39 @@ def live_action(request, request_id):
     if action not in ("accept", "complete", "cancel"):
         return HttpResponseBadRequest("Invalid action")
 
-    # lock the row to avoid race conditions
-    qs = Request.objects.select_for_update()
-    if hotel:
-        qs = qs.filter(hotel=hotel)
-    req = get_object_or_404(qs, id=request_id)
-
-    now = timezone.now()
-    if action == "accept":
-        if req.status != "NEW":
-            return JsonResponse({"ok": False, "error": "bad_state"}, status=409)
-        req.status = "ACCEPTED"
-        req.accepted_at = now
-        req.save(update_fields=["status", "accepted_at", "updated_at"])
-    elif action == "complete":
-        if req.status != "ACCEPTED":
-            return JsonResponse({"ok": False, "error": "bad_state"}, status=409)
-        req.status = "COMPLETED"
-        req.completed_at = now
-        req.save(update_fields=["status", "completed_at", "updated_at"])
-    else:  # cancel
-        if req.status not in ("NEW", "ACCEPTED"):
-            return JsonResponse({"ok": False, "error": "bad_state"}, status=409)
-        req.status = "CANCELLED"
-        req.cancelled_at = now
-        req.save(update_fields=["status", "cancelled_at", "updated_at"])
-        # NEW: push live update
-    push_live_board(hotel)
-        # 11.2 — push live update
-    # 🔔 PUSH live board update
-    _broadcast_live_board(hotel)    
-    broadcast_portal_board(hotel.id if hotel else None)
+    # lock the row, transition it, bump today's counter and append the
+    # outbox event in ONE transaction
+    with transaction.atomic():
+        qs = Request.objects.select_for_update()
+        if hotel:
+            qs = qs.filter(hotel=hotel)
+        req = get_object_or_404(qs, id=request_id)
+
+        now = timezone.now()
+        prev_status = req.status
+        if action == "accept":
+            if req.status != "NEW":
+                return JsonResponse({"ok": False, "error": "bad_state"}, status=409)
+            req.status = "ACCEPTED"
+            req.accepted_at = now
+            req.save(update_fields=["status", "accepted_at", "updated_at"])
+        elif action == "complete":
+            if req.status != "ACCEPTED":
+                return JsonResponse({"ok": False, "error": "bad_state"}, status=409)
+            req.status = "COMPLETED"
+            req.completed_at = now
+            req.save(update_fields=["status", "completed_at", "updated_at"])
+            bump_daily_counter(req.hotel_id, "completed")
+        else:  # cancel
+            if req.status not in ("NEW", "ACCEPTED"):
+                return JsonResponse({"ok": False, "error": "bad_state"}, status=409)
+            req.status = "CANCELLED"
+            req.cancelled_at = now
+            req.save(update_fields=["status", "cancelled_at", "updated_at"])
+            bump_daily_counter(req.hotel_id, "cancelled")
+
+        # 🔔 board delta, guest stream, kitchen queue, bot outbox, overview
+        realtime.request_status_changed(req, prev_status)
 
     return JsonResponse({"ok": True})
     
@@ -647,9 +676,7 @@ def stay_checkin(request):
         stay.id_proof = request.FILES["id_proof"]
     stay.save()
 
-    push_live_board(hotel)
-    _broadcast_live_board(hotel)
-    broadcast_portal_board(hotel.id if hotel else None)
+    realtime.room_status_changed(room, "FREE")
     return JsonResponse({
         "ok": True,
         "stay_id": stay.id,
@@ -724,10 +751,8 @@ def stay_checkout(request):
     room.current_stay = None
     room.status = "CLEANING"
     room.save(update_fields=["current_stay", "status"])
-    push_live_board(hotel)
-        # 11.2 — push live update
-    _broadcast_live_board(hotel)    
-    broadcast_portal_board(hotel.id if hotel else None)
+    # 11.2 — push live update
+    realtime.stay_checked_out(stay, room, "BUSY")
     return JsonResponse({"ok": True})
 
 
@@ -750,11 +775,8 @@ def room_mark_ready(request):
 
     room.status = "FREE"
     room.save(update_fields=["status"])
-    push_live_board(hotel)
-
-        # 11.2 — push live update
-    _broadcast_live_board(hotel)    
-    broadcast_portal_board(hotel.id if hotel else None)
+    # 11.2 — push live update
+    realtime.room_status_changed(room, "CLEANING")
     return JsonResponse({"ok": True})
 
 
@@ -849,7 +871,7 @@ def stay_detail_popup(request):
 def _get_open_stay(room):
     # Fallback helper if room.current_stay isn’t set on ORM side
     return (getattr(room, "current_stay", None)
-            or Stay.objects.filter(room=room, checkout_at__isnull=True).order_by("-id").first())
+            or Stay.objects.filter(room=room, status="ACTIVE").order_by("-id").first())
 
 
 
@@ -920,33 +942,36 @@ def stay_checkout_confirm(request):
     if not room_id:
         return JsonResponse({"ok": False, "error": "missing_room"}, status=400)
 
-    room_qs = Room.objects.select_for_update()
-    if hotel:
-        room_qs = room_qs.filter(hotel=hotel)
-    room = get_object_or_404(room_qs, id=room_id)
+    # Close stay + flip room; keep in a transaction to be safe (the room row
+    # lock is only held inside one)
+    with transaction.atomic():
+        room_qs = Room.objects.select_for_update()
+        if hotel:
+            room_qs = room_qs.filter(hotel=hotel)
+        room = get_object_or_404(room_qs, id=room_id)
 
-    stay = _get_open_stay(room)
-    if not stay:
-        return JsonResponse({"ok": False, "error": "no_active_stay"}, status=404)
+        stay = _get_open_stay(room)
+        if not stay:
+            return JsonResponse({"ok": False, "error": "no_active_stay"}, status=404)
 
-    # Totals (exclude cancelled)
-    reqs = Request.objects.filter(hotel=room.hotel, room=room, stay=stay)
-    food_total = reqs.filter(kind="FOOD").exclude(status="CANCELLED").aggregate(Sum("subtotal"))["subtotal__sum"] or 0
-    svc_total  = reqs.filter(kind="SERVICE").exclude(status="CANCELLED").aggregate(Sum("subtotal"))["subtotal__sum"] or 0
-    grand = food_total + svc_total
+        # Totals (exclude cancelled)
+        reqs = Request.objects.filter(hotel=room.hotel, room=room, stay=stay)
+        food_total = reqs.filter(kind="FOOD").exclude(status="CANCELLED").aggregate(Sum("subtotal"))["subtotal__sum"] or 0
+        svc_total  = reqs.filter(kind="SERVICE").exclude(status="CANCELLED").aggregate(Sum("subtotal"))["subtotal__sum"] or 0
+        grand = food_total + svc_total
 
-    # Close stay + flip room; keep in a transaction to be safe
-    from django.db import transaction
-    with transaction.atomic():
         # mark stay closed
-        if not getattr(stay, "checkout_at", None):
-            stay.checkout_at = timezone.now()
-            stay.save(update_fields=["checkout_at"])
+        if stay.status != "CHECKED_OUT":
+            stay.status = "CHECKED_OUT"
+            stay.check_out_at = timezone.now()
+            stay.save(update_fields=["status", "check_out_at"])
         # room → CLEANING, detach current_stay if you store it explicitly
+        prev_status = room.status
         room.status = "CLEANING"
         if hasattr(room, "current_stay_id"):
             room.current_stay = None
         room.save(update_fields=["status", *(["current_stay"] if hasattr(room, "current_stay_id") else [])])
+        realtime.stay_checked_out(stay, room, prev_status)
 
     return JsonResponse({
         "ok": True,
@@ -1237,12 +1262,20 @@ def stay_mark_paid(request, pk):
 
     # NEW: mark all current non-cancelled requests for this stay as paid
     Request.objects.filter(stay=stay).exclude(status="CANCELLED").update(is_paid=True)
+    # queryset .update() sends no post_save: invalidate the live board by hand
+    bump_data_version(stay.hotel_id)
 
     # Existing logic (invoice, flags, etc.)
     stay.mark_paid(mode)
 
+    # The board's room tile shows the stay's total_due / is_paid: same lane,
+    # fresh row
+    room = stay.room
+    if room.current_stay_id == stay.id:
+        room.current_stay = stay
+        realtime.room_status_changed(room, room.status)
+
     messages.success(request, f"Marked Stay #{stay.id} as paid ({mode}).")
-    broadcast_portal_board(stay.hotel_id)
     return redirect("portal_stay_detail", pk=pk)
 
 
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 
@@ -166,3 +167,56 @@ CHANNEL_LAYERS = {
         "BACKEND": "channels.layers.InMemoryChannelLayer",
     },
 }
+
+# Several Daphne workers: the in-memory layer only reaches sockets held by
+# the same process. Set REDIS_URL (e.g. redis://127.0.0.1:6379/0) and every
+# worker shares groups through Redis; see DEPLOYMENT.md.
+REDIS_URL = os.environ.get("REDIS_URL", "")
+if REDIS_URL:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {"hosts": [REDIS_URL]},
+        },
+    }
+
+# Live board broadcasts: signals arriving within this many seconds are
+# merged into one snapshot build + one group_send per hotel.
+LIVE_BOARD_BROADCAST_WINDOW = 0.5
+
+# Shared board snapshots are cached per hotel under its change counters;
+# entries are replaced on every change, the timeout only bounds memory.
+# Use a shared backend (e.g. Redis) when running several processes.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+}
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        },
+    }
+LIVE_BOARD_CACHE_TIMEOUT = 300
+# Per-hotel replay buffer of recent deltas for reconnecting screens
+# (board_replay.py); further behind than this → a snapshot instead.
+LIVE_BOARD_REPLAY_SIZE = 200
+LIVE_BOARD_REPLAY_TIMEOUT = 900
+# Threads for live socket / stream DB work (hotelportal/live_db.py), each
+# with its own DB connection; 0 = the single shared sync thread.
+LIVE_DB_THREADS = 8
+# Live sockets: per-socket send queue cap (send_queue.py) and heartbeats;
+# a socket that misses LIVE_PING_MISSES pings in a row is closed.
+LIVE_SEND_QUEUE_MAX = 50
+LIVE_PING_INTERVAL = 20
+LIVE_PING_MISSES = 2
+# Guest menu tree per hotel (hotelportal/menu_cache.py); catalog edits
+# invalidate it right away, this only bounds how long old versions linger.
+MENU_CACHE_TIMEOUT = 24 * 3600
+# Guest submit idempotency keys are kept this long (prune_idempotency_keys);
+# a retry after that creates a new request.
+IDEMPOTENCY_KEY_TTL_HOURS = 24
+# "deflate" socket encoding: frames at least this big go out zlib-compressed
+LIVE_WS_DEFLATE_MIN_BYTES = 1024